@@ -3,6 +3,9 @@ ASGI config for app project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+O endpoint /bot/chat/async/ só libera o worker durante a chamada ao LLM
+quando a aplicação é servida por aqui (ex.: uvicorn app.asgi:application).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -77,11 +78,76 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite em modo WAL: leitores não bloqueiam o escritor nem são bloqueados por ele.
+# Os PRAGMAs valem por conexão e são aplicados ao abri-la; CONN_MAX_AGE mantém a conexão
+# aberta entre requisições. 'leitura' abre o mesmo arquivo só para consultas e recebe as
+# leituras das views somente leitura (bot.roteador_banco.RoteadorLeitura).
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL;'
+    'PRAGMA synchronous=NORMAL;'
+    'PRAGMA cache_size=-20000;'
+    'PRAGMA mmap_size=134217728;'
+    'PRAGMA busy_timeout=5000;'
+    'PRAGMA temp_store=MEMORY;'
+)
+
+SQLITE_CONN_MAX_AGE = int(os.environ.get('SQLITE_CONN_MAX_AGE', '600'))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': SQLITE_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': SQLITE_PRAGMAS,
+            # Escritas pegam o lock de escrita no BEGIN, em vez de falhar ao promover uma leitura
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 5,
+        },
+    },
+    'leitura': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': SQLITE_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': SQLITE_PRAGMAS + 'PRAGMA query_only=ON;',
+            'timeout': 5,
+        },
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+# Modo shard das conversas: com BOT_SHARDS_CONVERSA=N as conversas ficam em N arquivos
+# (conversas_0.sqlite3, ...), escolhidos pelo crc32 do sessao_id; cada arquivo tem seu
+# próprio lock de escrita. Criar as tabelas com "python manage.py migrate --database conversas_<i>".
+# Ao mudar N, as sessões já gravadas passam a apontar para outro shard.
+BOT_SHARDS_CONVERSA = [f'conversas_{indice}' for indice in range(int(os.environ.get('BOT_SHARDS_CONVERSA', '0')))]
+
+for alias in BOT_SHARDS_CONVERSA:
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / f'{alias}.sqlite3',
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
     }
+
+DATABASE_ROUTERS = ['bot.roteador_banco.RoteadorConversas', 'bot.roteador_banco.RoteadorLeitura']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Compartilhado entre workers; criar a tabela com "python manage.py createcachetable"
+    'respostas_llm': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'bot_cache_respostas_llm',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
 }
 
 
@@ -125,3 +191,91 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Bot
+# Motor usado pelo chat: 'regras' (BotRestauranteParaenseSimples), 'llm' (BotRestauranteParaense)
+# ou 'hibrido' (regras primeiro, LLM só quando a classificação tem baixa confiança)
+BOT_MOTOR = os.environ.get('BOT_MOTOR', 'regras')
+
+# Argumentos de construção de cada motor
+BOT_OPCOES_MOTOR = {
+    'llm': {
+        # Reaproveita o cardápio formatado enquanto a versão do catálogo não muda
+        'usar_cache_prompt': True,
+        # Envia ao LLM só os pratos mais relevantes para a mensagem (BM25)
+        'usar_recuperacao': True,
+        'pratos_no_prompt': 4,
+        # Chamadas concorrentes idênticas compartilham a resposta e as distintas que chegam
+        # dentro de espera_ms vão juntas num chain.batch de até max_lote. None desliga.
+        'coalescer': {'max_lote': 8, 'espera_ms': 5},
+        # Até max_simultaneas chamadas ao LLM, cada uma com prazo_s segundos. O disjuntor abre
+        # após falhas_para_abrir falhas seguidas (respostas acima de limite_lentidao_s contam
+        # como falha) e tenta de novo após tempo_aberto_s; enquanto isso o motor de regras responde.
+        'protecao': {
+            'max_simultaneas': 8,
+            'prazo_s': 10,
+            'limite_lentidao_s': 6,
+            'falhas_para_abrir': 5,
+            'tempo_aberto_s': 30,
+        },
+        # Orçamento (tokens estimados) do histórico da sessão enviado no prompt
+        'tokens_historico': 600,
+    },
+    'hibrido': {
+        # Confiança mínima do classificador para responder pelas regras sem chamar o LLM
+        'limiar_confianca': 0.6,
+    },
+}
+
+# Cache das respostas do LLM, chaveado pela mensagem normalizada e pelo cardápio.
+# BACKEND 'memoria' guarda no processo (LRU + TTL); 'django' usa CACHES[ALIAS],
+# que pode ser compartilhado entre workers. None desliga o cache.
+BOT_CACHE_RESPOSTAS_LLM = {
+    'BACKEND': 'memoria',
+    'MAX_ITENS': 1000,
+    'TTL': 3600,
+    'ALIAS': 'respostas_llm',
+}
+
+# Gravação das conversas do chat fora da requisição: uma thread junta até MAX_LOTE conversas
+# ou espera INTERVALO_S segundos e grava com bulk_create; a fila é descarregada ao encerrar
+# o processo. Um lote que falha é repetido até TENTATIVAS vezes, esperando ESPERA_S, depois o
+# dobro, e assim por diante; depois disso as conversas são gravadas uma a uma. SINCRONO grava
+# cada conversa na hora (testes e scripts).
+BOT_REGISTRO_CONVERSAS = {
+    'SINCRONO': os.environ.get('BOT_REGISTRO_SINCRONO', '0') == '1',
+    'MAX_LOTE': 50,
+    'INTERVALO_S': 1.0,
+    'TENTATIVAS': 3,
+    'ESPERA_S': 0.5,
+}
+
+# Memória por sessão do chat: últimos MAX_TURNOS turnos de cada sessão em memória do processo,
+# descartando as sessões ociosas (LRU) além de MAX_SESSOES ou MAX_BYTES. Na falta de uma sessão
+# o histórico é reconstruído a partir de Conversa. None desliga.
+BOT_MEMORIA_SESSOES = {
+    'MAX_TURNOS': 6,
+    'MAX_SESSOES': 2000,
+    'MAX_BYTES': 4 * 1024 * 1024,
+}
+
+# Arquivamento (python manage.py arquivar_historico [--continuo]): conversas e pedidos finalizados
+# com mais de RETENCAO_DIAS dias vão para segmentos gzip JSONL por dia em DIRETORIO e saem do
+# banco em lotes de TAMANHO_LOTE. No modo contínuo o comando repete a cada INTERVALO_S segundos.
+BOT_ARQUIVO_HISTORICO = {
+    'DIRETORIO': BASE_DIR / 'arquivo',
+    'RETENCAO_DIAS': 90,
+    'TAMANHO_LOTE': 500,
+    'INTERVALO_S': 3600,
+}
+
+# Constrói os bots na inicialização da aplicação, fora do caminho das requisições
+BOT_AQUECER_NA_INICIALIZACAO = True
+
+# Recarrega o cardápio e recompila os bots logo após a alteração de um prato
+BOT_RECARREGAR_CARDAPIO = True
+
+# Intervalo, em segundos, entre as conferências da versão do cardápio gravada no banco, que
+# revelam mudanças feitas por outros processos ou fora do ORM. None desliga a conferência.
+BOT_VERIFICAR_CARDAPIO_S = 1.0
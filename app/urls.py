@@ -9,6 +9,8 @@ urlpatterns = [
     
     # Bot endpoints
     path('bot/chat/', views.BotChatView.as_view(), name='bot_chat'),
+    path('bot/chat/async/', views.bot_chat_async, name='bot_chat_async'),
+    path('bot/chat/stream/', views.bot_chat_stream, name='bot_chat_stream'),
     
     # Cardápio endpoints
     path('cardapio/', views.CardapioListView.as_view(), name='cardapio_list'),
@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class BotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bot'
+
+    def ready(self):
+        from django.conf import settings
+        from pratos_paraenses import definir_provedor_catalogo
+        from . import signals
+        from .catalogo import catalogo_compartilhado
+        from .registro_bots import registro_bots
+
+        # Os bots passam a consultar o cardápio carregado do banco
+        definir_provedor_catalogo(catalogo_compartilhado.obter)
+
+        # O cardápio é carregado só na primeira mensagem: nada de consultas no ready()
+        if settings.BOT_AQUECER_NA_INICIALIZACAO:
+            registro_bots.aquecer(carregar_cardapio=False)
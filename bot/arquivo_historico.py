@@ -0,0 +1,200 @@
+import gzip
+import json
+import os
+from contextlib import contextmanager
+from itertools import groupby
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Conversa, Pedido, RespostaBot
+from .projecoes import ProjecaoConversa, ProjecaoPedido
+
+# Pedidos ainda em andamento nunca são arquivados, por mais antigos que sejam
+STATUS_FINAIS = ('entregue', 'cancelado')
+
+NOME_INDICE = 'indice.json'
+NOME_TRAVA = '.trava'
+
+
+class ArquivamentoEmAndamento(Exception):
+    """Outro processo já está arquivando no mesmo diretório"""
+
+
+def _travar(arquivo):
+    """Trava exclusiva, sem esperar, no arquivo aberto; False se outro processo já a tem"""
+    # fcntl só existe no Unix; no Windows a trava é a de msvcrt sobre o primeiro byte
+    if os.name == 'nt':
+        import msvcrt
+        arquivo.seek(0)
+        try:
+            msvcrt.locking(arquivo.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    import fcntl
+    try:
+        fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+def _destravar(arquivo):
+    """Solta a trava obtida por _travar"""
+    if os.name == 'nt':
+        import msvcrt
+        arquivo.seek(0)
+        msvcrt.locking(arquivo.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+
+def _apagar(linhas):
+    """Apaga as linhas já arquivadas"""
+    linhas.delete()
+
+
+def _apagar_conversas(conversas):
+    """Apaga as conversas já arquivadas e as RespostaBot que ficaram sem nenhuma conversa"""
+    respostas = set(conversas.exclude(resposta=None).values_list('resposta_id', flat=True))
+    conversas.delete()
+    RespostaBot.objects.using(conversas.db).filter(id__in=respostas, conversas__isnull=True).delete()
+
+
+class TabelaArquivavel:
+    """Como arquivar um modelo: consultas de origem (uma por banco), campo de data e projeção das linhas"""
+
+    def __init__(self, nome, campo_data, projecao, consultas, apagar=_apagar):
+        self.nome = nome
+        self.campo_data = campo_data
+        self.projecao = projecao
+        self.consultas = consultas
+        self.apagar = apagar
+
+
+TABELAS = {
+    'conversa': TabelaArquivavel(
+        'conversa', 'timestamp', ProjecaoConversa(), lambda: Conversa.objects.all().por_shard(), _apagar_conversas
+    ),
+    'pedido': TabelaArquivavel(
+        'pedido', 'criado_em', ProjecaoPedido(), lambda: [Pedido.objects.filter(status__in=STATUS_FINAIS)]
+    ),
+}
+
+
+def config_arquivo():
+    """Configuração atual de BOT_ARQUIVO_HISTORICO"""
+    return getattr(settings, 'BOT_ARQUIVO_HISTORICO', None) or {}
+
+
+class ArquivoHistorico:
+    """Segmentos gzip JSONL por tabela e dia (<tabela>/<AAAA-MM-DD>.jsonl.gz) com um índice em JSON"""
+    # Cada lote arquivado é um novo membro gzip anexado ao segmento do dia: o arquivo só cresce
+    # e gzip lê os membros em sequência. O índice guarda o tamanho de cada segmento até o último
+    # lote completo; o que passar disso é resto de uma execução interrompida e é descartado antes
+    # do próximo lote. As linhas têm o mesmo formato das listagens da API.
+
+    def __init__(self, diretorio=None):
+        self.diretorio = Path(diretorio or config_arquivo().get('DIRETORIO') or Path(settings.BASE_DIR) / 'arquivo')
+
+    def arquivar(self, tabela, limite, tamanho_lote=500):
+        """Move para os segmentos as linhas anteriores a limite, apagando-as do banco em lotes"""
+        with self._travado():
+            return self._arquivar(TABELAS[tabela], limite, tamanho_lote)
+
+    def _arquivar(self, tabela, limite, tamanho_lote):
+        indice = self.indice()
+        arquivadas = 0
+        for consulta in tabela.consultas():
+            consulta = consulta.filter(**{f'{tabela.campo_data}__lt': limite}).order_by(tabela.campo_data, 'id')
+            while True:
+                linhas = list(tabela.projecao.consulta(consulta)[:tamanho_lote])
+                if not linhas:
+                    break
+
+                # Primeiro o segmento chega ao disco, depois as linhas saem do banco: uma falha
+                # no meio do lote pode repetir linhas no arquivo, mas nunca perdê-las
+                for dia, grupo in groupby(linhas, key=lambda linha: linha[tabela.campo_data].date()):
+                    self._anexar(indice, tabela, dia, tabela.projecao.projetar(list(grupo)))
+                self._salvar_indice(indice)
+
+                with transaction.atomic(using=consulta.db):
+                    tabela.apagar(consulta.model.objects.using(consulta.db).filter(id__in=[linha['id'] for linha in linhas]))
+                arquivadas += len(linhas)
+        return arquivadas
+
+    def indice(self):
+        """Índice dos segmentos: {tabela: {dia: {arquivo, linhas, bytes, primeiro, ultimo}}}"""
+        try:
+            with open(self.diretorio / NOME_INDICE, encoding='utf-8') as arquivo:
+                return json.load(arquivo)
+        except FileNotFoundError:
+            return {}
+
+    def segmentos(self, tabela, de=None, ate=None):
+        """Entradas do índice da tabela, em ordem de dia, entre as datas de e ate (inclusive)"""
+        segmentos = self.indice().get(tabela, {})
+        return [
+            dict(segmentos[dia], dia=dia)
+            for dia in sorted(segmentos)
+            if (de is None or dia >= de.isoformat()) and (ate is None or dia <= ate.isoformat())
+        ]
+
+    def ler(self, tabela, de=None, ate=None, sessao_id=None):
+        """Itera as linhas arquivadas da tabela (para auditoria), sem carregar os segmentos inteiros"""
+        for segmento in self.segmentos(tabela, de, ate):
+            with gzip.open(self.diretorio / segmento['arquivo'], 'rt', encoding='utf-8') as arquivo:
+                for texto in arquivo:
+                    linha = json.loads(texto)
+                    if sessao_id is None or linha.get('sessao_id') == sessao_id:
+                        yield linha
+
+    @contextmanager
+    def _travado(self):
+        """Impede dois arquivamentos simultâneos no diretório; o sistema solta a trava se o processo morrer"""
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        with open(self.diretorio / NOME_TRAVA, 'a') as trava:
+            if not _travar(trava):
+                raise ArquivamentoEmAndamento(f'Outro processo está arquivando em {self.diretorio}')
+            try:
+                yield
+            finally:
+                _destravar(trava)
+
+    def _anexar(self, indice, tabela, dia, linhas):
+        """Anexa as linhas do dia ao segmento como um novo membro gzip e atualiza o índice em memória"""
+        relativo = Path(tabela.nome) / f'{dia.isoformat()}.jsonl.gz'
+        caminho = self.diretorio / relativo
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+
+        # O membro é comprimido inteiro em memória e entra no segmento numa única escrita
+        membro = gzip.compress(b''.join(json.dumps(linha, ensure_ascii=False).encode('utf-8') + b'\n' for linha in linhas))
+        completo = indice.get(tabela.nome, {}).get(dia.isoformat(), {}).get('bytes', 0)
+        with open(caminho, 'ab') as arquivo:
+            arquivo.truncate(completo)
+            arquivo.write(membro)
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+
+        datas = [linha[tabela.campo_data] for linha in linhas]
+        segmento = indice.setdefault(tabela.nome, {}).setdefault(dia.isoformat(), {
+            'arquivo': relativo.as_posix(), 'linhas': 0, 'primeiro': min(datas), 'ultimo': max(datas),
+        })
+        segmento['linhas'] += len(linhas)
+        segmento['bytes'] = caminho.stat().st_size
+        segmento['primeiro'] = min(segmento['primeiro'], *datas)
+        segmento['ultimo'] = max(segmento['ultimo'], *datas)
+
+    def _salvar_indice(self, indice):
+        """Grava o índice num arquivo temporário e o troca de lugar, para nunca ficar pela metade"""
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        temporario = self.diretorio / f'{NOME_INDICE}.tmp'
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump(indice, arquivo, ensure_ascii=False, indent=1, sort_keys=True)
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+        os.replace(temporario, self.diretorio / NOME_INDICE)
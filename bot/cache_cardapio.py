@@ -0,0 +1,74 @@
+import hashlib
+import threading
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+
+from .catalogo import catalogo_compartilhado
+
+
+class RespostaCardapio:
+    """Corpo JSON já codificado de uma resposta do cardápio, com seus validadores"""
+
+    def __init__(self, dados, ultima_alteracao=None):
+        self.corpo = JSONRenderer().render(dados) if dados is not None else None
+        self.etag = f'"{hashlib.sha1(self.corpo).hexdigest()}"' if self.corpo is not None else None
+        self.ultima_alteracao = int(ultima_alteracao.timestamp()) if ultima_alteracao else None
+
+
+class CacheCardapio:
+    """Respostas do cardápio por (versão do catálogo, chave), conferida com a versão compartilhada no banco"""
+    # Um prato alterado em qualquer processo troca a versão em todos eles, no máximo após
+    # BOT_VERIFICAR_CARDAPIO_S. As chaves vêm só de valores limitados (categorias conhecidas, ids existentes)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versao = None
+        self._respostas = {}
+
+    def obter(self, chave, montar):
+        """Retorna a resposta guardada para a chave ou a monta com montar() -> (dados, ultima_alteracao)"""
+        versao = catalogo_compartilhado.versao_conferida()
+        with self._lock:
+            if self._versao != versao:
+                self._versao = versao
+                self._respostas = {}
+            resposta = self._respostas.get(chave)
+        if resposta is not None:
+            return resposta
+
+        resposta = RespostaCardapio(*montar())
+        if resposta.corpo is None:
+            # Respostas vazias (404) não são guardadas: ids inexistentes não ocupam memória
+            return resposta
+        with self._lock:
+            # Só guarda se o cardápio não mudou enquanto a resposta era montada
+            if self._versao == versao:
+                self._respostas[chave] = resposta
+        return resposta
+
+    def limpar(self):
+        """Descarta todas as respostas guardadas"""
+        with self._lock:
+            self._respostas = {}
+
+    def responder(self, request, resposta):
+        """Responde 304 se o cliente já tem esta versão; senão envia os bytes guardados"""
+        nao_modificado = get_conditional_response(
+            request, etag=resposta.etag, last_modified=resposta.ultima_alteracao
+        )
+        if nao_modificado is not None:
+            return nao_modificado
+
+        http_resposta = HttpResponse(resposta.corpo, content_type='application/json')
+        http_resposta['ETag'] = resposta.etag
+        if resposta.ultima_alteracao:
+            http_resposta['Last-Modified'] = http_date(resposta.ultima_alteracao)
+        # Clientes podem guardar a resposta, mas revalidam a cada uso
+        http_resposta['Cache-Control'] = 'no-cache'
+        return http_resposta
+
+
+cache_cardapio = CacheCardapio()
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.cache import caches
+
+from bot_langchain.cache_respostas import BackendMemoria, CacheRespostasLLM
+
+
+class BackendCacheDjango:
+    """Backend que usa um cache do Django (ex.: DatabaseCache compartilhado entre workers)"""
+
+    def __init__(self, alias='default', ttl=3600):
+        self.alias = alias
+        self.ttl = ttl
+
+    def obter(self, chave):
+        """Retorna o valor guardado ou None"""
+        return caches[self.alias].get(chave)
+
+    def guardar(self, chave, valor):
+        """Guarda o valor com o TTL configurado"""
+        caches[self.alias].set(chave, valor, self.ttl)
+
+    async def aobter(self, chave):
+        """Versão assíncrona de obter (o DatabaseCache não pode consultar o banco no event loop)"""
+        return await caches[self.alias].aget(chave)
+
+    async def aguardar(self, chave, valor):
+        """Versão assíncrona de guardar"""
+        await caches[self.alias].aset(chave, valor, self.ttl)
+
+    def limpar(self):
+        """Remove todos os itens do cache"""
+        caches[self.alias].clear()
+
+
+def criar_cache_respostas():
+    """Monta o cache de respostas do LLM conforme BOT_CACHE_RESPOSTAS_LLM (None desliga)"""
+    config = getattr(settings, 'BOT_CACHE_RESPOSTAS_LLM', None)
+    if not config:
+        return None
+
+    ttl = config.get('TTL', 3600)
+    if config.get('BACKEND', 'memoria') == 'django':
+        backend = BackendCacheDjango(config.get('ALIAS', 'default'), ttl)
+    else:
+        backend = BackendMemoria(config.get('MAX_ITENS', 1000), ttl)
+    return CacheRespostasLLM(backend)
@@ -0,0 +1,113 @@
+import threading
+import time
+from types import MappingProxyType
+
+from django.conf import settings
+
+from pratos_paraenses import PRATOS_PARAENSES, MenuCatalog
+from .models import Prato, VersaoCardapio
+from .serializers import PratoSerializer
+
+# Chaves já usadas pelo bot para os pratos da base estática
+CHAVES_POR_NOME = {prato['nome']: key for key, prato in PRATOS_PARAENSES.items()}
+
+
+def _chave_prato(nome):
+    """Gera a chave do prato no mesmo formato de PRATOS_PARAENSES"""
+    return CHAVES_POR_NOME.get(nome) or nome.lower().replace(' ', '_')
+
+
+class CatalogoDoBanco(MenuCatalog):
+    """Catálogo com os pratos também no formato da API, serializados uma vez ao carregar o snapshot"""
+
+    def __init__(self, pratos, dados_api, versao=0):
+        super().__init__(pratos, versao=versao)
+        self.__dict__['dados_api'] = MappingProxyType(dados_api)
+
+
+class CatalogoCompartilhado:
+    """Snapshot do cardápio carregado do banco e compartilhado por todo o processo"""
+    # Os signals de Prato invalidam o snapshot na hora neste processo; mudanças feitas por outros
+    # processos ou fora do ORM aparecem pela VersaoCardapio, conferida a cada BOT_VERIFICAR_CARDAPIO_S
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versao = 1
+        self._catalogo = None
+        self._versao_banco = None
+        self._verificado_em = 0.0
+
+    @property
+    def versao(self):
+        return self._versao
+
+    def versao_conferida(self):
+        """Versão atual depois de conferir a versão compartilhada no banco (sem carregar o snapshot)"""
+        self._verificar()
+        return self._versao
+
+    def obter(self):
+        """Retorna o snapshot atual, recarregando-o se a versão mudou"""
+        self._verificar()
+        catalogo = self._catalogo
+        if catalogo is not None and catalogo.versao == self._versao:
+            return catalogo
+
+        with self._lock:
+            versao = self._versao
+            if self._catalogo is None or self._catalogo.versao != versao:
+                # O novo catálogo só fica visível depois de montado por completo
+                self._catalogo = self._carregar(versao)
+            return self._catalogo
+
+    def invalidar(self):
+        """Marca o snapshot como desatualizado (chamado pelos signals de Prato)"""
+        with self._lock:
+            self._versao += 1
+
+    def _verificar(self):
+        """Invalida o snapshot se a versão compartilhada no banco mudou (no máximo uma consulta por intervalo)"""
+        intervalo = getattr(settings, 'BOT_VERIFICAR_CARDAPIO_S', None)
+        if intervalo is None:
+            return
+        agora = time.monotonic()
+        if self._versao_banco is not None and agora - self._verificado_em < intervalo:
+            return
+        self._verificado_em = agora
+        versao_banco = VersaoCardapio.atual()
+        if self._versao_banco is None:
+            # Primeira conferência num processo que ainda não carregou o snapshot
+            self._versao_banco = versao_banco
+        elif versao_banco != self._versao_banco:
+            self._versao_banco = versao_banco
+            self.invalidar()
+
+    def _carregar(self, versao):
+        """Carrega todos os pratos do banco em uma única consulta"""
+        # A versão é lida antes dos pratos: uma mudança entre as duas leituras só causa uma recarga a mais
+        self._versao_banco = VersaoCardapio.atual()
+        self._verificado_em = time.monotonic()
+        pratos = {}
+        dados_api = {}
+        for prato in Prato.objects.order_by('id'):
+            key = _chave_prato(prato.nome)
+            pratos[key] = {
+                'id': prato.id,
+                'nome': prato.nome,
+                'categoria': prato.categoria.replace('_', ' '),
+                'ingredientes': prato.get_ingredientes_list(),
+                'descricao': prato.descricao,
+                'preco': float(prato.preco),
+                'tempo_preparo': prato.tempo_preparo,
+                'disponivel': prato.disponivel,
+            }
+            # Resposta da busca por nome pronta no snapshot: a view não volta ao banco
+            dados_api[key] = PratoSerializer(prato).data
+
+        # Banco ainda não populado (ver popular_banco.py): usa a base estática
+        if not pratos:
+            pratos = dados_api = PRATOS_PARAENSES
+        return CatalogoDoBanco(pratos, dados_api, versao=versao)
+
+
+catalogo_compartilhado = CatalogoCompartilhado()
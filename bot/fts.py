@@ -0,0 +1,69 @@
+import re
+
+from pratos_paraenses import normalizar_texto
+
+# Índice de texto completo (SQLite FTS5) sobre nome, descrição e ingredientes dos pratos
+TABELA_FTS = 'bot_prato_fts'
+
+# Peso de cada coluna no bm25: nome, descricao, ingredientes
+PESOS_BM25 = (10.0, 2.0, 5.0)
+
+SQL_CRIAR_INDICE = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_FTS} USING fts5(
+        nome, descricao, ingredientes,
+        content='bot_prato', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    # Triggers mantêm o índice igual à tabela mesmo em updates feitos fora do ORM
+    f"""CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ai AFTER INSERT ON bot_prato BEGIN
+        INSERT INTO {TABELA_FTS}(rowid, nome, descricao, ingredientes)
+        VALUES (new.id, new.nome, new.descricao, new.ingredientes);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ad AFTER DELETE ON bot_prato BEGIN
+        INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, nome, descricao, ingredientes)
+        VALUES ('delete', old.id, old.nome, old.descricao, old.ingredientes);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_au AFTER UPDATE ON bot_prato BEGIN
+        INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, nome, descricao, ingredientes)
+        VALUES ('delete', old.id, old.nome, old.descricao, old.ingredientes);
+        INSERT INTO {TABELA_FTS}(rowid, nome, descricao, ingredientes)
+        VALUES (new.id, new.nome, new.descricao, new.ingredientes);
+    END""",
+    f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('rebuild')",
+]
+
+SQL_REMOVER_INDICE = [
+    f"DROP TRIGGER IF EXISTS {TABELA_FTS}_ai",
+    f"DROP TRIGGER IF EXISTS {TABELA_FTS}_ad",
+    f"DROP TRIGGER IF EXISTS {TABELA_FTS}_au",
+    f"DROP TABLE IF EXISTS {TABELA_FTS}",
+]
+
+
+def fts_disponivel(connection):
+    """Indica se o banco da conexão suporta o índice FTS5"""
+    return connection.vendor == 'sqlite'
+
+
+def criar_indice_textual(connection):
+    """Cria (ou recria) a tabela FTS5 e os triggers e reconstrói o índice"""
+    if not fts_disponivel(connection) or 'bot_prato' not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        for sql in SQL_CRIAR_INDICE:
+            cursor.execute(sql)
+
+
+def remover_indice_textual(connection):
+    """Remove a tabela FTS5 e os triggers"""
+    if not fts_disponivel(connection):
+        return
+    with connection.cursor() as cursor:
+        for sql in SQL_REMOVER_INDICE:
+            cursor.execute(sql)
+
+
+def consulta_fts(texto):
+    """Converte o texto do usuário em uma consulta FTS5 segura (prefixo em cada palavra)"""
+    palavras = re.findall(r'\w+', normalizar_texto(texto))
+    return ' '.join(f'"{palavra}"*' for palavra in palavras)
@@ -0,0 +1,48 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+
+from bot.arquivo_historico import TABELAS, ArquivamentoEmAndamento, ArquivoHistorico, config_arquivo
+
+
+class Command(BaseCommand):
+    help = 'Move conversas e pedidos finalizados mais antigos que a retenção para segmentos gzip JSONL por dia'
+
+    def add_arguments(self, parser):
+        config = config_arquivo()
+        parser.add_argument('--dias', type=int, default=config.get('RETENCAO_DIAS', 90),
+                            help='Retenção nas tabelas, em dias')
+        parser.add_argument('--tabela', choices=sorted(TABELAS), action='append',
+                            help='Tabela a arquivar (pode repetir); padrão: todas')
+        parser.add_argument('--lote', type=int, default=config.get('TAMANHO_LOTE', 500),
+                            help='Linhas por lote gravado e apagado')
+        parser.add_argument('--diretorio', help='Diretório dos segmentos (padrão: BOT_ARQUIVO_HISTORICO["DIRETORIO"])')
+        parser.add_argument('--continuo', action='store_true',
+                            help='Repete o arquivamento a cada --intervalo segundos')
+        parser.add_argument('--intervalo', type=float, default=config.get('INTERVALO_S', 3600),
+                            help='Segundos entre execuções no modo contínuo')
+
+    def handle(self, *args, **options):
+        arquivo = ArquivoHistorico(options['diretorio'])
+        tabelas = options['tabela'] or sorted(TABELAS)
+
+        while True:
+            limite = timezone.now() - timedelta(days=options['dias'])
+            for tabela in tabelas:
+                try:
+                    arquivadas = arquivo.arquivar(tabela, limite, options['lote'])
+                except ArquivamentoEmAndamento as erro:
+                    if not options['continuo']:
+                        raise CommandError(str(erro))
+                    # No modo contínuo a rodada é pulada e a próxima tenta de novo
+                    self.stderr.write(str(erro))
+                    break
+                self.stdout.write(f'{tabela}: {arquivadas} linhas anteriores a {limite:%Y-%m-%d %H:%M} arquivadas')
+
+            if not options['continuo']:
+                return
+            close_old_connections()
+            time.sleep(options['intervalo'])
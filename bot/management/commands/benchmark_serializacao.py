@@ -0,0 +1,109 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from bot.models import Prato, Conversa, Pedido, ItemPedido, RespostaBot
+from bot.projecoes import ProjecaoPrato, ProjecaoConversa, ProjecaoPedido
+from bot.serializers import PratoSerializer, ConversaSerializer, PedidoSerializer
+
+# Banco SQLite em memória criado só para a execução: a massa de teste nunca toca os bancos
+# configurados nem segura a trava de escrita deles
+ALIAS_BENCHMARK = 'benchmark_serializacao'
+MODELOS = [Prato, RespostaBot, Conversa, Pedido, ItemPedido]
+
+
+class Command(BaseCommand):
+    help = (
+        'Ferramenta de desenvolvimento: compara linhas/segundo dos ModelSerializers e das projeções rápidas, '
+        'página a página, sobre uma massa de teste num banco SQLite temporário em memória'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, default=10000, help='Linhas por modelo na massa de teste')
+        parser.add_argument('--repeticoes', type=int, default=3, help='Repetições; vale a melhor')
+        parser.add_argument('--pagina', type=int, default=100, help='Linhas por página, como nas listagens')
+
+    def handle(self, *args, **options):
+        linhas = options['linhas']
+        repeticoes = options['repeticoes']
+        pagina = options['pagina']
+
+        try:
+            banco = self._criar_banco()
+            self._criar_massa(banco, linhas)
+            casos = [
+                ('Prato', Prato.objects.using(banco), PratoSerializer, ProjecaoPrato()),
+                ('Conversa', Conversa.objects.using(banco).select_related('resposta'), ConversaSerializer, ProjecaoConversa()),
+                ('Pedido', Pedido.objects.using(banco).prefetch_related('itens_pedido__prato'),
+                 PedidoSerializer, ProjecaoPedido()),
+            ]
+            for nome, queryset, serializer_class, projecao in casos:
+                paginas = [queryset.order_by('id')[i:i + pagina] for i in range(0, linhas, pagina)]
+                lento = self._medir(repeticoes, lambda: [
+                    dict(linha) for p in paginas for linha in serializer_class(p.all(), many=True).data
+                ])
+                rapido = self._medir(repeticoes, lambda: [
+                    linha for p in paginas for linha in projecao.projetar(projecao.consulta(p.all()))
+                ])
+                if lento[1] != rapido[1]:
+                    self.stderr.write(self.style.ERROR(f'{nome}: projeção difere do serializer'))
+                self.stdout.write(
+                    f'{nome:<9} serializer {linhas / lento[0]:>10,.0f} linhas/s | '
+                    f'projeção {linhas / rapido[0]:>10,.0f} linhas/s | {lento[0] / rapido[0]:.1f}x'
+                )
+        finally:
+            self._remover_banco()
+
+    def _criar_banco(self):
+        """Registra a conexão temporária e cria nela só as tabelas usadas (sem migrações nem roteadores)"""
+        configuracoes = connections.configure_settings({
+            'default': connections.settings['default'],
+            ALIAS_BENCHMARK: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'},
+        })
+        connections.settings[ALIAS_BENCHMARK] = configuracoes[ALIAS_BENCHMARK]
+        with connections[ALIAS_BENCHMARK].schema_editor() as editor:
+            for modelo in MODELOS:
+                editor.create_model(modelo)
+        return ALIAS_BENCHMARK
+
+    def _remover_banco(self):
+        """Fecha a conexão temporária (o banco em memória some junto) e a tira da configuração"""
+        if ALIAS_BENCHMARK in connections.settings:
+            connections[ALIAS_BENCHMARK].close()
+            del connections[ALIAS_BENCHMARK]
+            del connections.settings[ALIAS_BENCHMARK]
+
+    def _medir(self, repeticoes, funcao):
+        """Melhor tempo entre as repetições e o resultado da última"""
+        melhor = None
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            resultado = funcao()
+            duracao = time.perf_counter() - inicio
+            melhor = duracao if melhor is None else min(melhor, duracao)
+        return melhor, resultado
+
+    def _criar_massa(self, banco, linhas):
+        """Cria pratos, conversas e pedidos (um item cada)"""
+        pratos = Prato.objects.using(banco).bulk_create([
+            Prato(
+                nome=f'prato {i}', categoria='prato_principal', ingredientes='tucumã, jambu, camarão seco',
+                descricao='Prato de teste', preco='12.00', tempo_preparo='20 minutos'
+            )
+            for i in range(linhas)
+        ], batch_size=500)
+        Conversa.objects.using(banco).bulk_create([
+            Conversa(
+                sessao_id='benchmark', mensagem_usuario=f'mensagem {i}', resposta_bot='resposta', resposta_pronta=True,
+                intencao='conversa', sugestoes=[{'nome': 'Tacacá', 'preco': 12.0}]
+            )
+            for i in range(linhas)
+        ], batch_size=500)
+        pedidos = Pedido.objects.using(banco).bulk_create([
+            Pedido(sessao_id='benchmark', total='12.00') for _ in range(linhas)
+        ], batch_size=500)
+        ItemPedido.objects.using(banco).bulk_create([
+            ItemPedido(pedido=pedido, prato=prato, quantidade=1, preco_unitario='12.00', subtotal='12.00')
+            for pedido, prato in zip(pedidos, pratos)
+        ], batch_size=500)
@@ -0,0 +1,30 @@
+from django.conf import settings
+
+from bot_langchain.memoria_sessoes import MemoriaSessoes
+
+from .models import Conversa
+
+
+def carregar_historico(sessao_id, limite):
+    """Últimos turnos gravados da sessão, do mais antigo ao mais recente (uma consulta pelo índice de sessao_id)"""
+    turnos = (
+        Conversa.objects.da_sessao(sessao_id)
+        .com_texto_resposta()
+        .order_by('-timestamp', '-id')
+        .values_list('mensagem_usuario', 'texto_resposta')[:limite]
+    )
+    return list(reversed(turnos))
+
+
+def criar_memoria_sessoes():
+    """Monta a memória de sessões conforme BOT_MEMORIA_SESSOES (None desliga)"""
+    config = getattr(settings, 'BOT_MEMORIA_SESSOES', None)
+    if not config:
+        return None
+
+    return MemoriaSessoes(
+        max_turnos=config.get('MAX_TURNOS', 6),
+        max_sessoes=config.get('MAX_SESSOES', 2000),
+        max_bytes=config.get('MAX_BYTES', 4 * 1024 * 1024),
+        carregador=carregar_historico,
+    )
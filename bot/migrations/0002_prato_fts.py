@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from bot.fts import criar_indice_textual, remover_indice_textual
+
+
+def criar_indice(apps, schema_editor):
+    criar_indice_textual(schema_editor.connection)
+
+
+def remover_indice(apps, schema_editor):
+    remover_indice_textual(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0002_prato_fts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='conversa',
+            index=models.Index(fields=['sessao_id', 'timestamp'], name='conversa_sessao_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversa',
+            index=models.Index(fields=['timestamp', 'id'], name='conversa_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['sessao_id', 'criado_em'], name='pedido_sessao_criado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['criado_em', 'id'], name='pedido_criado_idx'),
+        ),
+    ]
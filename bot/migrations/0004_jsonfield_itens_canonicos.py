@@ -0,0 +1,117 @@
+import json
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def normalizar_sugestoes(apps, schema_editor):
+    """Garante JSON válido em sugestoes antes da troca para JSONField"""
+    Conversa = apps.get_model('bot', 'Conversa')
+    Conversa.objects.filter(sugestoes='').update(sugestoes='[]')
+
+    invalidas = []
+    for id_conversa, sugestoes in Conversa.objects.values_list('id', 'sugestoes').iterator():
+        try:
+            json.loads(sugestoes)
+        except (TypeError, ValueError):
+            invalidas.append(id_conversa)
+    Conversa.objects.filter(id__in=invalidas).update(sugestoes='[]')
+
+
+def itens_para_item_pedido(apps, schema_editor):
+    """Cria as linhas de ItemPedido que faltam para cada linha do JSON de itens dos pedidos"""
+    Pedido = apps.get_model('bot', 'Pedido')
+    ItemPedido = apps.get_model('bot', 'ItemPedido')
+    Prato = apps.get_model('bot', 'Prato')
+
+    pratos_por_id = Prato.objects.in_bulk()
+    pratos_por_nome = {prato.nome.lower(): prato for prato in pratos_por_id.values()}
+
+    # A criação antiga pulava os pratos ausentes do banco: um pedido pode ter só parte das linhas
+    linhas_existentes = defaultdict(Counter)
+    for pedido_id, prato_id, quantidade in ItemPedido.objects.values_list('pedido_id', 'prato_id', 'quantidade'):
+        linhas_existentes[pedido_id][(prato_id, quantidade)] += 1
+
+    novos_itens = []
+    sem_prato = []
+    for pedido in Pedido.objects.exclude(itens__in=['', '[]']).iterator():
+        try:
+            itens = json.loads(pedido.itens)
+        except ValueError:
+            continue
+
+        existentes = linhas_existentes[pedido.id]
+        perdidos = []
+        for item in itens:
+            prato = pratos_por_id.get(item.get('prato_id')) or pratos_por_nome.get(str(item.get('nome', '')).lower())
+            quantidade = int(item.get('quantidade', 1))
+            if prato is not None and existentes[(prato.id, quantidade)] > 0:
+                # Linha que já tem seu ItemPedido
+                existentes[(prato.id, quantidade)] -= 1
+                continue
+
+            preco = Decimal(str(item.get('preco_unitario', prato.preco if prato else 0)))
+            if prato is None:
+                perdidos.append(f"{quantidade}x {item.get('nome')} (R$ {preco:.2f})")
+                continue
+            novos_itens.append(ItemPedido(
+                pedido=pedido, prato=prato, quantidade=quantidade,
+                preco_unitario=preco, subtotal=preco * quantidade,
+            ))
+
+        # Linhas cujo prato não existe mais ficam registradas nas observações
+        if perdidos:
+            pedido.observacoes = '\n'.join(filter(None, [
+                pedido.observacoes, 'Itens sem prato cadastrado: ' + ', '.join(perdidos)
+            ]))
+            sem_prato.append(pedido)
+
+    ItemPedido.objects.bulk_create(novos_itens, batch_size=500)
+    Pedido.objects.bulk_update(sem_prato, ['observacoes'], batch_size=500)
+
+
+def item_pedido_para_itens(apps, schema_editor):
+    """Reconstrói o JSON de itens a partir de ItemPedido (reversão)"""
+    Pedido = apps.get_model('bot', 'Pedido')
+
+    pedidos = list(Pedido.objects.prefetch_related('itens_pedido__prato'))
+    for pedido in pedidos:
+        pedido.itens = json.dumps([
+            {
+                "prato_id": item.prato_id,
+                "nome": item.prato.nome,
+                "preco_unitario": float(item.preco_unitario),
+                "quantidade": item.quantidade,
+                "subtotal": float(item.subtotal),
+            }
+            for item in pedido.itens_pedido.all()
+        ], ensure_ascii=False)
+    Pedido.objects.bulk_update(pedidos, ['itens'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0003_indices_listagem'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalizar_sugestoes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='conversa',
+            name='sugestoes',
+            field=models.JSONField(blank=True, default=list, help_text='Sugestões enviadas junto com a resposta'),
+        ),
+        migrations.RunPython(itens_para_item_pedido, item_pedido_para_itens),
+        # Com default a coluna pode ser recriada na reversão antes de o JSON ser reconstruído
+        migrations.AlterField(
+            model_name='pedido',
+            name='itens',
+            field=models.TextField(default='[]', help_text='JSON com itens do pedido'),
+        ),
+        migrations.RemoveField(
+            model_name='pedido',
+            name='itens',
+        ),
+    ]
@@ -0,0 +1,94 @@
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TAMANHO_LOTE = 1000
+
+
+def compactar_respostas(apps, schema_editor):
+    """Troca o texto de cada conversa pela referência à RespostaBot com o mesmo conteúdo"""
+    Conversa = apps.get_model('bot', 'Conversa')
+    RespostaBot = apps.get_model('bot', 'RespostaBot')
+    banco = schema_editor.connection.alias
+    ids_por_hash = dict(RespostaBot.objects.using(banco).values_list('hash', 'id'))
+
+    ultimo_id = 0
+    while True:
+        lote = list(
+            Conversa.objects.using(banco).filter(id__gt=ultimo_id, resposta__isnull=True)
+            .order_by('id').only('id', 'resposta_bot')[:TAMANHO_LOTE]
+        )
+        if not lote:
+            break
+        ultimo_id = lote[-1].id
+
+        hashes = {conversa.id: hashlib.sha256(conversa.resposta_bot.encode('utf-8')).hexdigest() for conversa in lote}
+        novas = {}
+        for conversa in lote:
+            chave = hashes[conversa.id]
+            if chave not in ids_por_hash and chave not in novas:
+                novas[chave] = RespostaBot(hash=chave, texto=conversa.resposta_bot)
+        RespostaBot.objects.using(banco).bulk_create(novas.values())
+        ids_por_hash.update(
+            RespostaBot.objects.using(banco).filter(hash__in=list(novas)).values_list('hash', 'id')
+        )
+
+        for conversa in lote:
+            conversa.resposta_id = ids_por_hash[hashes[conversa.id]]
+        Conversa.objects.using(banco).bulk_update(lote, ['resposta'])
+
+
+def expandir_respostas(apps, schema_editor):
+    """Copia de volta o texto da resposta para cada conversa (reversão)"""
+    Conversa = apps.get_model('bot', 'Conversa')
+    RespostaBot = apps.get_model('bot', 'RespostaBot')
+    banco = schema_editor.connection.alias
+
+    for resposta in RespostaBot.objects.using(banco).iterator():
+        Conversa.objects.using(banco).filter(resposta_id=resposta.id).update(resposta_bot=resposta.texto)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0004_jsonfield_itens_canonicos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RespostaBot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(help_text='SHA-256 do texto', max_length=64, unique=True)),
+                ('texto', models.TextField()),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Resposta do Bot',
+                'verbose_name_plural': 'Respostas do Bot',
+            },
+        ),
+        migrations.AddField(
+            model_name='conversa',
+            name='resposta',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='conversas', to='bot.respostabot'),
+        ),
+        # A dica faz a compactação rodar também nos shards de conversas
+        migrations.RunPython(compactar_respostas, expandir_respostas, hints={'model_name': 'conversa'}),
+        # Com default a coluna pode ser recriada na reversão antes de o texto ser copiado de volta
+        migrations.AlterField(
+            model_name='conversa',
+            name='resposta_bot',
+            field=models.TextField(default=''),
+        ),
+        migrations.RemoveField(
+            model_name='conversa',
+            name='resposta_bot',
+        ),
+        migrations.AlterField(
+            model_name='conversa',
+            name='resposta',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='conversas', to='bot.respostabot'),
+        ),
+    ]
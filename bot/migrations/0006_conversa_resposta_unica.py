@@ -0,0 +1,90 @@
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TAMANHO_LOTE = 1000
+
+# Regra usada para separar as respostas prontas no momento desta migração (hoje o bot que
+# produz a resposta a marca como pronta)
+INTENCOES_RESPOSTA_PRONTA = ('sugestao', 'informacao', 'pedido', 'conversa')
+
+
+def resposta_pronta(intencao):
+    rota, _, intencao = intencao.rpartition(':')
+    return rota != 'llm' and intencao in INTENCOES_RESPOSTA_PRONTA
+
+
+def separar_respostas_unicas(apps, schema_editor):
+    """Copia para a conversa o texto das respostas que não são prontas e apaga as RespostaBot que sobrarem"""
+    Conversa = apps.get_model('bot', 'Conversa')
+    RespostaBot = apps.get_model('bot', 'RespostaBot')
+    banco = schema_editor.connection.alias
+
+    ultimo_id = 0
+    while True:
+        lote = list(
+            Conversa.objects.using(banco).filter(id__gt=ultimo_id).select_related('resposta')
+            .order_by('id').only('id', 'intencao', 'resposta__texto')[:TAMANHO_LOTE]
+        )
+        if not lote:
+            break
+        ultimo_id = lote[-1].id
+
+        unicas = [conversa for conversa in lote if not resposta_pronta(conversa.intencao)]
+        for conversa in unicas:
+            conversa.resposta_unica = conversa.resposta.texto
+            conversa.resposta = None
+        Conversa.objects.using(banco).bulk_update(unicas, ['resposta_unica', 'resposta'])
+
+    RespostaBot.objects.using(banco).filter(conversas__isnull=True).delete()
+
+
+def juntar_respostas_unicas(apps, schema_editor):
+    """Volta a guardar em RespostaBot o texto das respostas gravadas na conversa (reversão)"""
+    Conversa = apps.get_model('bot', 'Conversa')
+    RespostaBot = apps.get_model('bot', 'RespostaBot')
+    banco = schema_editor.connection.alias
+
+    while True:
+        lote = list(
+            Conversa.objects.using(banco).filter(resposta__isnull=True)
+            .order_by('id').only('id', 'resposta_unica')[:TAMANHO_LOTE]
+        )
+        if not lote:
+            break
+
+        hashes = {conversa.id: hashlib.sha256(conversa.resposta_unica.encode('utf-8')).hexdigest() for conversa in lote}
+        textos = {hashes[conversa.id]: conversa.resposta_unica for conversa in lote}
+        RespostaBot.objects.using(banco).bulk_create(
+            [RespostaBot(hash=chave, texto=texto) for chave, texto in textos.items()], ignore_conflicts=True
+        )
+        ids_por_hash = dict(
+            RespostaBot.objects.using(banco).filter(hash__in=list(textos)).values_list('hash', 'id')
+        )
+        for conversa in lote:
+            conversa.resposta_id = ids_por_hash[hashes[conversa.id]]
+        Conversa.objects.using(banco).bulk_update(lote, ['resposta'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0005_respostabot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversa',
+            name='resposta_unica',
+            field=models.TextField(blank=True, default='', help_text='Texto das respostas que não são prontas'),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='conversa',
+            name='resposta',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='conversas', to='bot.respostabot'),
+        ),
+        # A dica faz a separação rodar também nos shards de conversas
+        migrations.RunPython(separar_respostas_unicas, juntar_respostas_unicas, hints={'model_name': 'conversa'}),
+    ]
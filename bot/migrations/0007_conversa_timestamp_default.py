@@ -0,0 +1,17 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0006_conversa_resposta_unica'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='conversa',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+from bot.versao_cardapio import criar_gatilhos_versao, remover_gatilhos_versao
+
+
+def criar_gatilhos(apps, schema_editor):
+    VersaoCardapio = apps.get_model('bot', 'VersaoCardapio')
+    VersaoCardapio.objects.using(schema_editor.connection.alias).get_or_create(pk=1)
+    criar_gatilhos_versao(schema_editor.connection)
+
+
+def remover_gatilhos(apps, schema_editor):
+    remover_gatilhos_versao(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0007_conversa_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersaoCardapio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('versao', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Versão do Cardápio',
+                'verbose_name_plural': 'Versões do Cardápio',
+            },
+        ),
+        migrations.RunPython(criar_gatilhos, remover_gatilhos),
+    ]
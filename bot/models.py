@@ -1,6 +1,37 @@
-from django.db import models
+import hashlib
+
+from django.db import models, connections, router
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
-import json
+from django.utils import timezone
+
+from .fts import TABELA_FTS, PESOS_BM25, consulta_fts, fts_disponivel
+from .roteador_banco import shard_da_sessao, shards_conversa
+
+class PratoQuerySet(models.QuerySet):
+    """QuerySet de pratos com busca textual"""
+    
+    def buscar(self, texto):
+        """Busca textual ranqueada por bm25 (FTS5 no SQLite, icontains nos demais bancos)"""
+        consulta = consulta_fts(texto)
+        if not consulta:
+            return self.none()
+        
+        if not fts_disponivel(connections[self.db]):
+            filtro = Q()
+            for palavra in texto.split():
+                filtro &= Q(nome__icontains=palavra) | Q(descricao__icontains=palavra) | Q(ingredientes__icontains=palavra)
+            return self.filter(filtro)
+        
+        return self.extra(
+            tables=[TABELA_FTS],
+            where=[f'{TABELA_FTS}.rowid = bot_prato.id', f'{TABELA_FTS} MATCH %s'],
+            params=[consulta],
+            select={'relevancia': f'bm25({TABELA_FTS}, %s, %s, %s)'},
+            select_params=PESOS_BM25,
+            order_by=['relevancia'],
+        )
 
 class Prato(models.Model):
     """Model para representar os pratos do restaurante"""
@@ -21,6 +52,8 @@ class Prato(models.Model):
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
     
+    objects = PratoQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Prato"
         verbose_name_plural = "Pratos"
@@ -37,35 +70,167 @@ class Prato(models.Model):
         """Define ingredientes a partir de uma lista"""
         self.ingredientes = ', '.join(ingredientes_list)
 
+class VersaoCardapio(models.Model):
+    """Contador compartilhado entre processos, incrementado a cada mudança nos pratos (linha única)"""
+    versao = models.BigIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = "Versão do Cardápio"
+        verbose_name_plural = "Versões do Cardápio"
+    
+    def __str__(self):
+        return f"Cardápio v{self.versao}"
+    
+    @classmethod
+    def atual(cls):
+        """Versão gravada no banco (0 antes da primeira mudança)"""
+        return cls.objects.filter(pk=1).values_list('versao', flat=True).first() or 0
+    
+    @classmethod
+    def incrementar(cls, using=None):
+        """Incrementa a versão; no SQLite os triggers de bot_prato já fazem isso"""
+        versoes = cls.objects.using(using)
+        versoes.get_or_create(pk=1)
+        versoes.filter(pk=1).update(versao=F('versao') + 1)
+
+class RespostaBotQuerySet(models.QuerySet):
+    """QuerySet de respostas do bot endereçadas pelo conteúdo"""
+    
+    def resolver(self, textos):
+        """Linhas de RespostaBot para os textos, criando as que faltam; retorna {texto: resposta}"""
+        por_hash = {RespostaBot.calcular_hash(texto): texto for texto in textos}
+        respostas = self.in_bulk(list(por_hash), field_name='hash')
+        novas = [RespostaBot(hash=chave, texto=texto) for chave, texto in por_hash.items() if chave not in respostas]
+        if novas:
+            # Outro processo pode ter criado a mesma resposta entre a consulta e o INSERT
+            self.bulk_create(novas, ignore_conflicts=True)
+            respostas.update(self.in_bulk([nova.hash for nova in novas], field_name='hash'))
+        return {texto: respostas[chave] for chave, texto in por_hash.items()}
+
+class RespostaBot(models.Model):
+    """Texto de uma resposta do bot, guardado uma única vez e referenciado pelas conversas"""
+    hash = models.CharField(max_length=64, unique=True, help_text="SHA-256 do texto")
+    texto = models.TextField()
+    criado_em = models.DateTimeField(auto_now_add=True)
+    
+    objects = RespostaBotQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = "Resposta do Bot"
+        verbose_name_plural = "Respostas do Bot"
+    
+    def __str__(self):
+        return self.texto[:50]
+    
+    @staticmethod
+    def calcular_hash(texto):
+        """Chave de conteúdo do texto"""
+        return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+class ConversaQuerySet(models.QuerySet):
+    """QuerySet de conversas ciente do modo shard"""
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        """Resolve os textos de resposta pendentes com uma consulta antes do INSERT em lote"""
+        objs = list(objs)
+        pendentes = [conversa for conversa in objs if conversa._resposta_pendente is not None]
+        prontas = [conversa for conversa in pendentes if conversa.resposta_pronta]
+        respostas = {}
+        if prontas:
+            banco = self._db or router.db_for_write(self.model, **self._hints)
+            respostas = RespostaBot.objects.using(banco).resolver({c._resposta_pendente for c in prontas})
+        for conversa in pendentes:
+            conversa._associar_resposta(respostas.get(conversa._resposta_pendente))
+        return super().bulk_create(objs, *args, **kwargs)
+    
+    def com_texto_resposta(self):
+        """Anota texto_resposta com o texto da resposta, esteja ele em RespostaBot ou na própria conversa"""
+        return self.annotate(texto_resposta=Coalesce('resposta__texto', 'resposta_unica'))
+    
+    def da_sessao(self, sessao_id):
+        """Conversas da sessão, lidas do shard que as guarda"""
+        return self.using(shard_da_sessao(sessao_id)).filter(sessao_id=sessao_id)
+    
+    def por_shard(self):
+        """Uma cópia da consulta para cada shard (só a própria consulta sem shards)"""
+        return [self.using(alias) for alias in shards_conversa()] or [self]
+
 class Conversa(models.Model):
     """Model para armazenar conversas com o bot"""
     sessao_id = models.CharField(max_length=100, db_index=True)
     mensagem_usuario = models.TextField()
-    resposta_bot = models.TextField()
+    # As respostas prontas do bot se repetem muito: o texto fica uma vez em RespostaBot
+    resposta = models.ForeignKey(RespostaBot, on_delete=models.PROTECT, related_name='conversas', null=True, blank=True)
+    resposta_unica = models.TextField(blank=True, help_text="Texto das respostas que não são prontas")
     intencao = models.CharField(max_length=50)
-    sugestoes = models.TextField(blank=True, help_text="JSON com sugestões")
-    timestamp = models.DateTimeField(auto_now_add=True)
+    sugestoes = models.JSONField(default=list, blank=True, help_text="Sugestões enviadas junto com a resposta")
+    # Hora da mensagem, e não da gravação: a conversa pode esperar na fila do registro em lote
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
+    
+    objects = ConversaQuerySet.as_manager()
+    
+    # Texto atribuído a resposta_bot e ainda não associado a uma RespostaBot
+    _resposta_pendente = None
+    _resposta_pronta = False
     
     class Meta:
         verbose_name = "Conversa"
         verbose_name_plural = "Conversas"
         ordering = ['-timestamp']
+        indexes = [
+            # Listagem paginada por cursor, com e sem filtro de sessão
+            models.Index(fields=['sessao_id', 'timestamp'], name='conversa_sessao_ts_idx'),
+            models.Index(fields=['timestamp', 'id'], name='conversa_ts_idx'),
+        ]
     
     def __str__(self):
         return f"Conversa {self.sessao_id} - {self.timestamp.strftime('%d/%m/%Y %H:%M')}"
     
+    @property
+    def resposta_bot(self):
+        """Texto da resposta do bot"""
+        if self._resposta_pendente is not None:
+            return self._resposta_pendente
+        return self.resposta.texto if self.resposta_id else self.resposta_unica
+    
+    @resposta_bot.setter
+    def resposta_bot(self, texto):
+        self._resposta_pendente = texto
+    
+    @property
+    def resposta_pronta(self):
+        """Se a resposta é uma das prontas do bot, guardada uma vez em RespostaBot"""
+        # Quem marca é o bot que produziu a resposta (resultado['pronta'], só no motor de regras);
+        # respostas geradas pelo LLM quase nunca se repetem e ficam na própria conversa
+        return self._resposta_pronta
+    
+    @resposta_pronta.setter
+    def resposta_pronta(self, pronta):
+        self._resposta_pronta = bool(pronta)
+    
+    def _associar_resposta(self, resposta):
+        """Grava o texto pendente na RespostaBot recebida ou, sem ela, na própria conversa"""
+        self.resposta = resposta
+        self.resposta_unica = '' if resposta is not None else self._resposta_pendente
+        self._resposta_pendente = None
+    
+    def save(self, *args, **kwargs):
+        """Associa o texto pendente à RespostaBot do mesmo banco antes de gravar"""
+        if self._resposta_pendente is not None:
+            resposta = None
+            if self.resposta_pronta:
+                banco = kwargs.get('using') or router.db_for_write(Conversa, instance=self)
+                resposta = RespostaBot.objects.using(banco).resolver([self._resposta_pendente])[self._resposta_pendente]
+            self._associar_resposta(resposta)
+        super().save(*args, **kwargs)
+    
     def get_sugestoes(self):
         """Retorna sugestões como lista"""
-        if self.sugestoes:
-            try:
-                return json.loads(self.sugestoes)
-            except json.JSONDecodeError:
-                return []
-        return []
+        return self.sugestoes or []
     
     def set_sugestoes(self, sugestoes_list):
         """Define sugestões a partir de uma lista"""
-        self.sugestoes = json.dumps(sugestoes_list, ensure_ascii=False)
+        self.sugestoes = list(sugestoes_list)
 
 class Pedido(models.Model):
     """Model para representar pedidos"""
@@ -79,7 +244,6 @@ class Pedido(models.Model):
     ]
     
     sessao_id = models.CharField(max_length=100, db_index=True)
-    itens = models.TextField(help_text="JSON com itens do pedido")
     total = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
     observacoes = models.TextField(blank=True)
@@ -90,22 +254,26 @@ class Pedido(models.Model):
         verbose_name = "Pedido"
         verbose_name_plural = "Pedidos"
         ordering = ['-criado_em']
+        indexes = [
+            models.Index(fields=['sessao_id', 'criado_em'], name='pedido_sessao_criado_idx'),
+            models.Index(fields=['criado_em', 'id'], name='pedido_criado_idx'),
+        ]
     
     def __str__(self):
         return f"Pedido {self.id} - R$ {self.total} ({self.status})"
     
     def get_itens(self):
-        """Retorna itens como lista"""
-        if self.itens:
-            try:
-                return json.loads(self.itens)
-            except json.JSONDecodeError:
-                return []
-        return []
-    
-    def set_itens(self, itens_list):
-        """Define itens a partir de uma lista"""
-        self.itens = json.dumps(itens_list, ensure_ascii=False)
+        """Retorna itens como lista (a partir de ItemPedido, que guarda as linhas do pedido)"""
+        return [
+            {
+                "prato_id": item.prato_id,
+                "nome": item.prato.nome,
+                "preco_unitario": float(item.preco_unitario),
+                "quantidade": item.quantidade,
+                "subtotal": float(item.subtotal),
+            }
+            for item in self.itens_pedido.all()
+        ]
 
 class ItemPedido(models.Model):
     """Model para representar itens individuais de um pedido"""
@@ -0,0 +1,101 @@
+import base64
+import heapq
+import json
+from datetime import datetime
+from itertools import islice
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class PaginacaoCursor(CursorPagination):
+    """Paginação por cursor: cada página é uma consulta pelo índice, sem OFFSET"""
+    page_size = 20
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class PaginacaoPedidos(PaginacaoCursor):
+    """Pedidos do mais recente para o mais antigo"""
+    ordering = ('-criado_em', '-id')
+
+
+class PaginacaoConversas(PaginacaoCursor):
+    """Conversas da mais recente para a mais antiga"""
+    ordering = ('-timestamp', '-id')
+
+
+class PaginacaoIntercalada:
+    """Paginação por cursor sobre várias consultas (uma por shard), intercaladas por (-timestamp, -id)"""
+    # O cursor guarda (timestamp, shard, id) da última linha entregue; cada página faz uma
+    # consulta de até limit + 1 linhas por shard. Só há link para a próxima página.
+    page_size = 20
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    campo_ordem = 'timestamp'
+
+    def paginar(self, consultas, request):
+        """Linhas da página pedida em request, tiradas das consultas de cada shard"""
+        self.request = request
+        tamanho = self._tamanho(request)
+        posicao = self._decodificar(request.query_params.get(self.cursor_query_param))
+
+        fatias = []
+        for indice, consulta in enumerate(consultas):
+            if posicao is not None:
+                consulta = consulta.filter(self._depois(posicao, indice))
+            linhas = consulta.order_by(f'-{self.campo_ordem}', '-id')[:tamanho + 1]
+            fatias.append([
+                (self._valor(linha, self.campo_ordem), indice, self._valor(linha, 'id'), linha)
+                for linha in linhas
+            ])
+
+        pagina = list(islice(heapq.merge(*fatias, key=lambda item: item[:3], reverse=True), tamanho + 1))
+        self.proxima = pagina[tamanho - 1][:3] if len(pagina) > tamanho else None
+        return [item[3] for item in pagina[:tamanho]]
+
+    def get_paginated_response(self, dados):
+        proxima = None
+        if self.proxima is not None:
+            proxima = replace_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param, self._codificar(self.proxima)
+            )
+        return Response({'next': proxima, 'previous': None, 'results': dados})
+
+    def _tamanho(self, request):
+        try:
+            tamanho = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return min(tamanho, self.max_page_size) if tamanho > 0 else self.page_size
+
+    def _depois(self, posicao, indice):
+        """Filtro das linhas do shard indice que vêm depois da posição na ordem intercalada"""
+        valor, indice_posicao, id_posicao = posicao
+        campo = self.campo_ordem
+        if indice < indice_posicao:
+            return Q(**{f'{campo}__lte': valor})
+        if indice > indice_posicao:
+            return Q(**{f'{campo}__lt': valor})
+        return Q(**{f'{campo}__lt': valor}) | Q(**{campo: valor, 'id__lt': id_posicao})
+
+    def _valor(self, linha, campo):
+        return linha[campo] if isinstance(linha, dict) else getattr(linha, campo)
+
+    def _codificar(self, posicao):
+        valor, indice, id_linha = posicao
+        texto = json.dumps([valor.isoformat(), indice, id_linha])
+        return base64.urlsafe_b64encode(texto.encode('ascii')).decode('ascii')
+
+    def _decodificar(self, cursor):
+        if not cursor:
+            return None
+        try:
+            valor, indice, id_linha = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            return datetime.fromisoformat(valor), int(indice), int(id_linha)
+        except (TypeError, ValueError, UnicodeEncodeError):
+            raise NotFound('Cursor inválido')
@@ -0,0 +1,154 @@
+from abc import ABC, abstractmethod
+
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .models import Prato, Pedido, ItemPedido
+
+def _formatar_data_hora():
+    """Formatador ISO 8601 igual ao DateTimeField do DRF, com o fuso horário resolvido uma vez por lote"""
+    fuso = serializers.DateTimeField().default_timezone()
+
+    def formatar(valor):
+        if valor is None:
+            return None
+        if fuso is not None:
+            valor = valor.astimezone(fuso)
+        texto = valor.isoformat()
+        return texto[:-6] + 'Z' if texto.endswith('+00:00') else texto
+    return formatar
+
+
+def _formatar_decimal(modelo, campo):
+    """Formatador de um DecimalField do modelo, igual ao do ModelSerializer"""
+    field = modelo._meta.get_field(campo)
+    return serializers.DecimalField(max_digits=field.max_digits, decimal_places=field.decimal_places).to_representation
+
+
+class Projecao(ABC):
+    """Leitura rápida: projeta dicts de .values() no mesmo formato do serializer, sem instanciar modelos"""
+    campos = ()
+
+    def consulta(self, queryset):
+        """Queryset de dicts com os campos da projeção"""
+        return queryset.prefetch_related(None).values(*self.campos)
+
+    @abstractmethod
+    def projetar(self, linhas):
+        """Converte as linhas de .values() na saída da API"""
+
+
+class ProjecaoPrato(Projecao):
+    """Mesma saída de PratoSerializer"""
+    campos = (
+        'id', 'nome', 'categoria', 'ingredientes', 'descricao', 'preco',
+        'tempo_preparo', 'disponivel', 'criado_em', 'atualizado_em'
+    )
+
+    def projetar(self, linhas):
+        preco = _formatar_decimal(Prato, 'preco')
+        data_hora = _formatar_data_hora()
+        return [
+            {
+                'id': linha['id'],
+                'nome': linha['nome'],
+                'categoria': linha['categoria'],
+                'ingredientes': linha['ingredientes'],
+                'ingredientes_list': [ing.strip() for ing in linha['ingredientes'].split(',')],
+                'descricao': linha['descricao'],
+                'preco': preco(linha['preco']),
+                'tempo_preparo': linha['tempo_preparo'],
+                'disponivel': linha['disponivel'],
+                'criado_em': data_hora(linha['criado_em']),
+                'atualizado_em': data_hora(linha['atualizado_em']),
+            }
+            for linha in linhas
+        ]
+
+
+class ProjecaoConversa(Projecao):
+    """Mesma saída de ConversaSerializer"""
+    campos = ('id', 'sessao_id', 'mensagem_usuario', 'texto_resposta', 'intencao', 'sugestoes', 'timestamp')
+
+    def consulta(self, queryset):
+        return super().consulta(queryset.com_texto_resposta())
+
+    def projetar(self, linhas):
+        data_hora = _formatar_data_hora()
+        return [
+            {
+                'id': linha['id'],
+                'sessao_id': linha['sessao_id'],
+                'mensagem_usuario': linha['mensagem_usuario'],
+                'resposta_bot': linha['texto_resposta'],
+                'intencao': linha['intencao'],
+                'sugestoes': linha['sugestoes'],
+                'timestamp': data_hora(linha['timestamp']),
+            }
+            for linha in linhas
+        ]
+
+
+class ProjecaoPedido(Projecao):
+    """Mesma saída de PedidoSerializer; os itens de todos os pedidos vêm numa segunda consulta"""
+    campos = ('id', 'sessao_id', 'total', 'status', 'observacoes', 'criado_em', 'atualizado_em')
+
+    def projetar(self, linhas):
+        # Os itens vêm do mesmo banco dos pedidos (None: o do roteador)
+        banco = getattr(linhas, 'db', None)
+        linhas = list(linhas)
+        total = _formatar_decimal(Pedido, 'total')
+        preco_unitario = _formatar_decimal(ItemPedido, 'preco_unitario')
+        subtotal = _formatar_decimal(ItemPedido, 'subtotal')
+        data_hora = _formatar_data_hora()
+
+        itens_por_pedido = {linha['id']: [] for linha in linhas}
+        itens = ItemPedido.objects.using(banco).filter(pedido_id__in=itens_por_pedido).order_by('id').values(
+            'id', 'pedido_id', 'prato_id', 'prato__nome', 'quantidade', 'preco_unitario', 'subtotal', 'observacoes'
+        )
+        for item in itens:
+            itens_por_pedido[item['pedido_id']].append({
+                'id': item['id'],
+                'prato': item['prato_id'],
+                'prato_nome': item['prato__nome'],
+                'quantidade': item['quantidade'],
+                'preco_unitario': preco_unitario(item['preco_unitario']),
+                'subtotal': subtotal(item['subtotal']),
+                'observacoes': item['observacoes'],
+            })
+
+        return [
+            {
+                'id': linha['id'],
+                'sessao_id': linha['sessao_id'],
+                'itens_pedido': itens_por_pedido[linha['id']],
+                'total': total(linha['total']),
+                'status': linha['status'],
+                'observacoes': linha['observacoes'],
+                'criado_em': data_hora(linha['criado_em']),
+                'atualizado_em': data_hora(linha['atualizado_em']),
+            }
+            for linha in linhas
+        ]
+
+
+class ListagemRapidaMixin:
+    """Listagem pela projeção (quando usar_projecao) em vez do ModelSerializer"""
+    projecao = None
+    usar_projecao = True
+
+    def list(self, request, *args, **kwargs):
+        if not self.usar_projecao or self.projecao is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.projecao.consulta(self.filter_queryset(self.get_queryset()))
+        pagina = self.paginate_queryset(queryset)
+        if pagina is not None:
+            return self.get_paginated_response(self.projecao.projetar(pagina))
+        return Response(self.projecao.projetar(queryset))
+
+    def serializar_lista(self, queryset):
+        """Dados da listagem para o queryset, pela projeção ou pelo serializer"""
+        if not self.usar_projecao or self.projecao is None:
+            return self.get_serializer(queryset, many=True).data
+        return self.projecao.projetar(self.projecao.consulta(queryset))
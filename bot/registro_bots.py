@@ -0,0 +1,82 @@
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from .cache_llm import criar_cache_respostas
+from .memoria import criar_memoria_sessoes
+
+# Motores disponíveis para BOT_MOTOR
+MOTORES_BOT = {
+    'regras': 'bot_langchain.bot_restaurante_simples.BotRestauranteParaenseSimples',
+    'llm': 'bot_langchain.bot_restaurante.BotRestauranteParaense',
+    'hibrido': 'bot_langchain.bot_restaurante_hibrido.BotRestauranteHibrido',
+}
+
+
+class RegistroBots:
+    """Mantém uma instância compartilhada de cada motor de bot por processo"""
+
+    def __init__(self):
+        # Reentrante: o motor híbrido obtém os motores de regras e LLM ao ser construído
+        self._lock = threading.RLock()
+        self._instancias = {}
+
+    def obter(self, motor=None):
+        """Retorna a instância do motor (por padrão o configurado em BOT_MOTOR)"""
+        motor = motor or settings.BOT_MOTOR
+        bot = self._instancias.get(motor)
+        if bot is None:
+            with self._lock:
+                bot = self._instancias.get(motor)
+                if bot is None:
+                    bot = self._construir(motor)
+                    self._instancias[motor] = bot
+        return bot
+
+    def registrar(self, motor, bot):
+        """Substitui a instância de um motor (útil em testes)"""
+        with self._lock:
+            self._instancias[motor] = bot
+
+    def aquecer(self, carregar_cardapio=True):
+        """Constrói os bots usados pelas views e, opcionalmente, pré-carrega o cardápio"""
+        for motor in {settings.BOT_MOTOR, 'regras'}:
+            bot = self.obter(motor)
+            if carregar_cardapio and hasattr(bot, 'aquecer'):
+                bot.aquecer()
+
+    def metricas(self):
+        """Métricas expostas pelos bots já construídos"""
+        return {
+            motor: bot.metricas()
+            for motor, bot in list(self._instancias.items())
+            if hasattr(bot, 'metricas')
+        }
+
+    def recarregar(self):
+        """Descarta as instâncias atuais; as próximas são construídas sob demanda"""
+        with self._lock:
+            self._instancias = {}
+
+    def _construir(self, motor):
+        """Instancia o bot correspondente ao motor"""
+        try:
+            caminho = MOTORES_BOT[motor]
+        except KeyError:
+            raise ImproperlyConfigured(
+                f"BOT_MOTOR '{motor}' inválido. Opções: {', '.join(MOTORES_BOT)}"
+            )
+        opcoes = dict(getattr(settings, 'BOT_OPCOES_MOTOR', {}).get(motor, {}))
+        if motor == 'llm':
+            opcoes.setdefault('cache_respostas', criar_cache_respostas())
+            opcoes.setdefault('bot_reserva', self.obter('regras'))
+            opcoes.setdefault('memoria', criar_memoria_sessoes())
+        elif motor == 'hibrido':
+            opcoes.setdefault('bot_regras', self.obter('regras'))
+            opcoes.setdefault('bot_llm', self.obter('llm'))
+        return import_string(caminho)(**opcoes)
+
+
+registro_bots = RegistroBots()
@@ -0,0 +1,162 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from .models import Conversa
+from .roteador_banco import shard_da_sessao
+
+logger = logging.getLogger(__name__)
+
+# Marca de encerramento colocada na fila
+_FIM = object()
+
+
+class RegistroConversas:
+    """Grava as conversas fora do caminho da requisição: enfileira em memória e descarrega com bulk_create"""
+
+    def __init__(self):
+        self._fila = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.gravadas = 0
+        self.lotes = 0
+        self.falhas = 0
+
+    @property
+    def config(self):
+        """Configuração atual de BOT_REGISTRO_CONVERSAS"""
+        return getattr(settings, 'BOT_REGISTRO_CONVERSAS', None) or {}
+
+    @property
+    def sincrono(self):
+        """No modo síncrono (testes, scripts) cada conversa é gravada na hora"""
+        return self.config.get('SINCRONO', False)
+
+    def registrar(self, conversa):
+        """Enfileira a conversa (ainda não salva) para gravação em lote"""
+        if self.sincrono:
+            self._gravar([conversa])
+            return
+        self._iniciar()
+        self._fila.put(conversa)
+
+    async def aregistrar(self, conversa):
+        """Versão para views assíncronas: só acessa o banco no modo síncrono"""
+        if self.sincrono:
+            await conversa.asave()
+            self.gravadas += 1
+            return
+        self._iniciar()
+        self._fila.put(conversa)
+
+    def descarregar(self):
+        """Bloqueia até que todas as conversas enfileiradas tenham sido gravadas"""
+        self._fila.join()
+
+    def encerrar(self):
+        """Grava o que resta na fila e para a thread (chamado na saída do processo)"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._fila.put(_FIM)
+            thread.join(timeout=self.config.get('ESPERA_ENCERRAMENTO_S', 10))
+
+    def metricas(self):
+        """Conversas pendentes, gravadas e descartadas por falha de gravação, e lotes gravados"""
+        return {
+            "pendentes": self._fila.qsize(),
+            "gravadas": self.gravadas,
+            "lotes": self.lotes,
+            "falhas": self.falhas,
+        }
+
+    def _iniciar(self):
+        """Inicia a thread de gravação na primeira conversa enfileirada"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._executar, name='registro-conversas', daemon=True)
+                self._thread.start()
+                atexit.register(self.encerrar)
+
+    def _executar(self):
+        """Laço da thread: junta conversas até MAX_LOTE ou INTERVALO_S e grava o lote"""
+        max_lote = self.config.get('MAX_LOTE', 50)
+        intervalo = self.config.get('INTERVALO_S', 1.0)
+        try:
+            while True:
+                lote = [self._fila.get()]
+                limite = time.monotonic() + intervalo
+                while lote[-1] is not _FIM and len(lote) < max_lote:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        break
+                    try:
+                        lote.append(self._fila.get(timeout=restante))
+                    except queue.Empty:
+                        break
+
+                encerrar = lote[-1] is _FIM
+                conversas = [conversa for conversa in lote if conversa is not _FIM]
+                try:
+                    if conversas:
+                        close_old_connections()
+                        self._gravar(conversas)
+                finally:
+                    for _ in lote:
+                        self._fila.task_done()
+                if encerrar:
+                    return
+        finally:
+            connection.close()
+
+    def _gravar(self, conversas):
+        """Grava as conversas com um INSERT por shard; falhas são registradas no log sem derrubar a thread"""
+        por_shard = defaultdict(list)
+        for conversa in conversas:
+            por_shard[shard_da_sessao(conversa.sessao_id)].append(conversa)
+        for alias, grupo in por_shard.items():
+            if self._gravar_lote(alias, grupo):
+                self.gravadas += len(grupo)
+                self.lotes += 1
+            else:
+                self._gravar_uma_a_uma(alias, grupo)
+
+    def _gravar_lote(self, alias, grupo):
+        """Tenta o INSERT em lote, repetindo com espera exponencial; False se todas as tentativas falharem"""
+        tentativas = self.config.get('TENTATIVAS', 3)
+        espera = self.config.get('ESPERA_S', 0.5)
+        for tentativa in range(tentativas):
+            try:
+                Conversa.objects.using(alias).bulk_create(grupo)
+                return True
+            except Exception:
+                if self.sincrono:
+                    self.falhas += len(grupo)
+                    raise
+                logger.warning("Falha ao gravar %d conversas (tentativa %d de %d)",
+                               len(grupo), tentativa + 1, tentativas, exc_info=True)
+                if tentativa + 1 < tentativas:
+                    time.sleep(espera * 2 ** tentativa)
+        return False
+
+    def _gravar_uma_a_uma(self, alias, grupo):
+        """Último recurso: grava cada conversa sozinha, para que uma linha inválida não descarte o lote inteiro"""
+        for conversa in grupo:
+            try:
+                conversa.save(using=alias)
+            except Exception:
+                self.falhas += 1
+                logger.exception("Falha ao gravar a conversa da sessão %s", conversa.sessao_id)
+            else:
+                self.gravadas += 1
+
+
+registro_conversas = RegistroConversas()
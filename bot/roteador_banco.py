@@ -0,0 +1,92 @@
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+# Alias da conexão somente leitura (settings.DATABASES)
+ALIAS_LEITURA = 'leitura'
+
+_somente_leitura = ContextVar('somente_leitura', default=False)
+
+
+@contextmanager
+def somente_leitura():
+    """Dentro do bloco, as leituras do ORM vão para a conexão de leitura"""
+    token = _somente_leitura.set(True)
+    try:
+        yield
+    finally:
+        _somente_leitura.reset(token)
+
+
+class RoteadorLeitura:
+    """Envia para 'leitura' as consultas feitas dentro de somente_leitura() fora de transação; o resto usa 'default'"""
+
+    def db_for_read(self, model, **hints):
+        if not _somente_leitura.get() or ALIAS_LEITURA not in connections:
+            return None
+        # Dentro de uma transação em 'default' a leitura precisa ver o que ela já escreveu
+        if connections['default'].in_atomic_block:
+            return None
+        return ALIAS_LEITURA
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # As duas conexões abrem o mesmo arquivo
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+def shards_conversa():
+    """Aliases dos bancos de conversas (BOT_SHARDS_CONVERSA); vazio quando o modo shard está desligado"""
+    return getattr(settings, 'BOT_SHARDS_CONVERSA', None) or []
+
+
+def shard_da_sessao(sessao_id):
+    """Alias do banco que guarda as conversas da sessão (None sem shards)"""
+    shards = shards_conversa()
+    if not shards:
+        return None
+    # crc32 é estável entre processos e execuções, ao contrário de hash()
+    return shards[zlib.crc32(str(sessao_id).encode('utf-8')) % len(shards)]
+
+
+class RoteadorConversas:
+    """Com BOT_SHARDS_CONVERSA, grava cada Conversa no shard da sua sessão e só cria as tabelas de conversa nos shards"""
+
+    def _do_shard(self, model):
+        return model._meta.app_label == 'bot' and model._meta.model_name in ('conversa', 'respostabot')
+
+    def db_for_read(self, model, **hints):
+        instancia = hints.get('instance')
+        if instancia is None or not self._do_shard(model) or not shards_conversa():
+            return None
+        if instancia._meta.model_name == 'conversa':
+            return shard_da_sessao(instancia.sessao_id)
+        # Objeto relacionado (ex.: a RespostaBot atribuída à conversa): segue no shard de onde veio
+        if instancia._state.db in shards_conversa():
+            return instancia._state.db
+        return None
+
+    def db_for_write(self, model, **hints):
+        return self.db_for_read(model, **hints)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db not in shards_conversa():
+            return None
+        # Cada shard tem a sua RespostaBot: a chave estrangeira não atravessa bancos
+        return app_label == 'bot' and model_name in ('conversa', 'respostabot')
+
+
+class LeituraSeparadaMixin:
+    """Mixin de views de classe somente leitura: a requisição inteira lê pela conexão de leitura"""
+
+    def dispatch(self, request, *args, **kwargs):
+        with somente_leitura():
+            return super().dispatch(request, *args, **kwargs)
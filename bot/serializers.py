@@ -20,19 +20,14 @@ class PratoSerializer(serializers.ModelSerializer):
 
 class ConversaSerializer(serializers.ModelSerializer):
     """Serializer para o model Conversa"""
-    sugestoes_list = serializers.SerializerMethodField()
     
     class Meta:
         model = Conversa
         fields = [
             'id', 'sessao_id', 'mensagem_usuario', 'resposta_bot',
-            'intencao', 'sugestoes', 'sugestoes_list', 'timestamp'
+            'intencao', 'sugestoes', 'timestamp'
         ]
         read_only_fields = ['id', 'timestamp']
-    
-    def get_sugestoes_list(self, obj):
-        """Retorna sugestões como lista"""
-        return obj.get_sugestoes()
 
 class ItemPedidoSerializer(serializers.ModelSerializer):
     """Serializer para o model ItemPedido"""
@@ -48,20 +43,15 @@ class ItemPedidoSerializer(serializers.ModelSerializer):
 
 class PedidoSerializer(serializers.ModelSerializer):
     """Serializer para o model Pedido"""
-    itens_list = serializers.SerializerMethodField()
     itens_pedido = ItemPedidoSerializer(many=True, read_only=True)
     
     class Meta:
         model = Pedido
         fields = [
-            'id', 'sessao_id', 'itens', 'itens_list', 'itens_pedido',
+            'id', 'sessao_id', 'itens_pedido',
             'total', 'status', 'observacoes', 'criado_em', 'atualizado_em'
         ]
         read_only_fields = ['id', 'criado_em', 'atualizado_em']
-    
-    def get_itens_list(self, obj):
-        """Retorna itens como lista"""
-        return obj.get_itens()
 
 class BotMensagemSerializer(serializers.Serializer):
     """Serializer para mensagens enviadas ao bot"""
@@ -100,3 +90,14 @@ class CalcularPedidoSerializer(serializers.Serializer):
                     raise serializers.ValidationError("Quantidade deve ser um número inteiro positivo")
         return value
 
+
+class CriarPedidoSerializer(CalcularPedidoSerializer):
+    """Serializer para criação de pedidos"""
+    sessao_id = serializers.CharField(max_length=100, required=False)
+    observacoes = serializers.CharField(required=False, allow_blank=True, default='')
+    
+    def validate_itens(self, value):
+        """Exige ao menos um item, além da estrutura validada no cálculo"""
+        if not value:
+            raise serializers.ValidationError("Lista de itens não pode estar vazia")
+        return super().validate_itens(value)
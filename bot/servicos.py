@@ -0,0 +1,66 @@
+from decimal import Decimal
+
+from django.db import transaction
+
+from pratos_paraenses import get_prato_por_nome
+from .models import Prato, Pedido, ItemPedido
+
+
+class PratoNaoEncontrado(Exception):
+    """Item de pedido cujo prato não existe no cardápio"""
+
+    def __init__(self, nome):
+        super().__init__(f"Prato '{nome}' não encontrado.")
+        self.nome = nome
+
+
+def _resolver_pratos(nomes):
+    """Resolve os nomes informados em pratos do banco com uma única consulta"""
+    # O catálogo em memória tolera acentos, caixa e nomes parciais; preço e existência vêm do banco
+    canonicos = {}
+    for nome in nomes:
+        prato = get_prato_por_nome(nome)
+        canonicos[nome] = prato['nome'] if prato else nome
+
+    pratos = Prato.objects.in_bulk(set(canonicos.values()), field_name='nome')
+    return {nome: pratos.get(canonico) for nome, canonico in canonicos.items()}
+
+
+def criar_pedidos(dados_pedidos):
+    """Cria os pedidos e seus itens numa única transação, com número fixo de consultas"""
+    pratos = _resolver_pratos({item['nome'] for dados in dados_pedidos for item in dados['itens']})
+
+    pedidos = []
+    itens_por_pedido = []
+    for dados in dados_pedidos:
+        total = Decimal('0')
+        itens = []
+        for item in dados['itens']:
+            prato = pratos[item['nome']]
+            if prato is None:
+                raise PratoNaoEncontrado(item['nome'])
+            quantidade = int(item.get('quantidade', 1))
+            subtotal = prato.preco * quantidade
+            total += subtotal
+            itens.append(ItemPedido(
+                prato=prato,
+                quantidade=quantidade,
+                preco_unitario=prato.preco,
+                subtotal=subtotal,
+            ))
+
+        pedido = Pedido(
+            sessao_id=dados['sessao_id'],
+            total=total,
+            observacoes=dados.get('observacoes', ''),
+        )
+        pedidos.append(pedido)
+        itens_por_pedido.append(itens)
+
+    with transaction.atomic():
+        Pedido.objects.bulk_create(pedidos)
+        for pedido, itens in zip(pedidos, itens_por_pedido):
+            for item in itens:
+                item.pedido = pedido
+        ItemPedido.objects.bulk_create([item for itens in itens_por_pedido for item in itens])
+    return pedidos
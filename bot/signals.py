@@ -0,0 +1,59 @@
+from functools import partial
+from weakref import WeakKeyDictionary
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.signals import post_save, post_delete, post_migrate
+from django.dispatch import receiver
+
+from .catalogo import catalogo_compartilhado
+from .fts import criar_indice_textual
+from .models import Prato, VersaoCardapio
+from .registro_bots import registro_bots
+from .versao_cardapio import criar_gatilhos_versao, gatilhos_disponiveis
+
+
+# Geração pendente por conexão: todos os callbacks agendados numa mesma transação levam a mesma,
+# e só o primeiro a rodar depois do commit a consome
+_geracoes = WeakKeyDictionary()
+
+
+def _atualizar_apos_commit(conexao, geracao):
+    """Invalida o snapshot de novo e, se configurado, reaquece os bots com o cardápio novo"""
+    if _geracoes.get(conexao) is not geracao:
+        return
+    del _geracoes[conexao]
+    catalogo_compartilhado.invalidar()
+    if settings.BOT_RECARREGAR_CARDAPIO:
+        registro_bots.aquecer()
+
+
+@receiver(post_save, sender=Prato)
+@receiver(post_delete, sender=Prato)
+def invalidar_catalogo(sender, using, **kwargs):
+    """Invalida o snapshot do cardápio quando um prato muda"""
+    if not gatilhos_disponiveis(connections[using]):
+        # Sem triggers, a versão compartilhada com os outros processos muda aqui, na mesma transação
+        VersaoCardapio.incrementar(using)
+    catalogo_compartilhado.invalidar()
+    # De novo após o commit: leituras feitas antes dele podem ter guardado os dados antigos.
+    # Uma vez por transação, por mais pratos que ela altere: cada prato agenda o seu callback,
+    # e assim um savepoint desfeito só leva os dele, mas os que restam dividem a geração.
+    # Se a transação inteira for desfeita, a geração sem callbacks serve para a próxima.
+    conexao = transaction.get_connection(using)
+    geracao = _geracoes.setdefault(conexao, object())
+    transaction.on_commit(partial(_atualizar_apos_commit, conexao, geracao), using=using)
+
+
+@receiver(post_migrate)
+def recriar_indice_textual(sender, using, **kwargs):
+    """Recria os triggers do FTS5 e da versão do cardápio, descartados quando uma migração reconstrói bot_prato"""
+    if sender.name != 'bot':
+        return
+    connection = connections[using]
+    aplicadas = MigrationRecorder(connection).applied_migrations()
+    if ('bot', '0002_prato_fts') in aplicadas:
+        criar_indice_textual(connection)
+    if ('bot', '0008_versaocardapio') in aplicadas:
+        criar_gatilhos_versao(connection)
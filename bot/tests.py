@@ -1,3 +1,1287 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import shutil
+import tempfile
+import time
+import zlib
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from langchain_core.language_models.fake_chat_models import FakeListChatModel, GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from bot_langchain.bot_restaurante import BotRestauranteParaense
+from bot_langchain.bot_restaurante_hibrido import BotRestauranteHibrido
+from bot_langchain.bot_restaurante_simples import BotRestauranteParaenseSimples
+from bot_langchain.cache_respostas import BackendMemoria, CacheRespostasLLM
+from bot_langchain.classificador_intencao import ClassificadorIntencao
+from bot_langchain.coalescedor import CoalescedorLLM
+from bot_langchain.memoria_sessoes import MemoriaSessoes
+from bot_langchain.resiliencia import ABERTO, FECHADO, Disjuntor, LLMIndisponivel, ProtecaoLLM
+from pratos_paraenses import MenuCatalog, PRATOS_PARAENSES, get_catalogo, normalizar_texto
+from .arquivo_historico import ArquivoHistorico
+from .cache_cardapio import cache_cardapio
+from .cache_llm import BackendCacheDjango
+from .catalogo import catalogo_compartilhado
+from .memoria import carregar_historico
+from .models import Conversa, ConversaQuerySet, ItemPedido, Pedido, Prato, RespostaBot
+from .paginacao import PaginacaoIntercalada
+from .projecoes import ProjecaoConversa, ProjecaoPedido, ProjecaoPrato
+from .serializers import ConversaSerializer, PedidoSerializer, PratoSerializer
+from .registro_bots import RegistroBots, registro_bots
+from .registro_conversas import RegistroConversas
+from .roteador_banco import RoteadorConversas, RoteadorLeitura, shard_da_sessao, somente_leitura
+
+
+class ClassificadorIntencaoTest(TestCase):
+    """Testes do classificador de intenções compilado"""
+
+    def setUp(self):
+        catalogo_compartilhado.invalidar()
+        self.bot = BotRestauranteParaenseSimples()
+
+    def test_palavras_inteiras_sem_acento(self):
+        self.assertEqual(self.bot._analisar_intencao('Ola, boa tarde!'), 'saudacao')
+        self.assertEqual(self.bot._analisar_intencao('Tenho comorbidade'), 'conversa')
+        self.assertEqual(self.bot._analisar_intencao('biscoito'), 'conversa')
+
+    def test_prato_e_confianca(self):
+        classificacao = self.bot.classificador.classificar('Me fale sobre o pato no tucuma')
+        self.assertEqual(classificacao['intencao'], 'busca_prato')
+        self.assertEqual(classificacao['prato'], 'pato_no_tucumã')
+        self.assertEqual(classificacao['confianca'], 1.0)
+        self.assertLess(self.bot.classificador.classificar('Qual é o cardápio?')['confianca'], 1.0)
+
+    def test_pratos_por_ngramas_em_cardapio_grande(self):
+        pratos = {f'prato_{i}': {'nome': f'Prato da Casa Número {i}'} for i in range(5000)}
+        pratos['vatapá_paraense'] = PRATOS_PARAENSES['vatapá_paraense']
+        classificador = ClassificadorIntencao(pratos)
+        self.assertEqual(classificador.maior_apelido, 5)
+        self.assertEqual(classificador.classificar('quanto custa o prato da casa numero 4999?')['prato'], 'prato_4999')
+        self.assertEqual(classificador.classificar('Quero um VATAPÁ   paraense')['prato'], 'vatapá_paraense')
+        # Pontuação separa as palavras do apelido, como entre palavras-chave
+        self.assertIsNone(classificador.classificar('vatapa! paraense')['prato'])
+
+    def test_processar_mensagens_em_lote(self):
+        resultados = self.bot.processar_mensagens(['oi', 'qual o cardápio?', 'tchau'])
+        self.assertEqual([r['intencao'] for r in resultados], ['saudacao', 'cardapio', 'despedida'])
+
+
+class MenuCatalogTest(SimpleTestCase):
+    """Testes dos índices do catálogo de pratos"""
+
+    def setUp(self):
+        self.catalogo = MenuCatalog(PRATOS_PARAENSES)
+
+    def test_busca_por_nome_ignora_acentos(self):
+        self.assertEqual(self.catalogo.por_nome('tacaca')['nome'], 'Tacacá')
+        self.assertEqual(self.catalogo.por_nome('cupu')['nome'], 'Doce de Cupuaçu')
+        self.assertIsNone(self.catalogo.por_nome('feijoada'))
+
+    def test_indices_preservam_ordem_do_cardapio(self):
+        self.assertEqual(list(self.catalogo.por_ingrediente('camarão')), ['tacacá', 'caruru', 'vatapá_paraense'])
+        self.assertEqual(list(self.catalogo.por_faixa_preco(20, 30)), ['maniçoba', 'caruru', 'vatapá_paraense'])
+        self.assertEqual(len(self.catalogo.por_categoria('prato_principal')), 6)
+
+    def test_busca_parcial_pelo_indice_igual_a_varredura(self):
+        textos = {
+            key: [normalizar_texto(prato['nome']), normalizar_texto(key), *map(normalizar_texto, prato['ingredientes'])]
+            for key, prato in PRATOS_PARAENSES.items()
+        }
+        trechos = {texto[i:i + n] for lista in textos.values() for texto in lista for n in (2, 4) for i in range(len(texto) - n + 1)}
+        for trecho in {trecho for trecho in trechos if trecho == trecho.strip()} | {'xyz'}:
+            ingredientes = [key for key, lista in textos.items() if any(trecho in ing for ing in lista[2:])]
+            self.assertEqual(list(self.catalogo.por_ingrediente(trecho)), ingredientes, trecho)
+            if trecho not in self.catalogo._por_nome:
+                nome = next((PRATOS_PARAENSES[key] for key, lista in textos.items() if any(trecho in t for t in lista[:2])), None)
+                self.assertEqual(self.catalogo.por_nome(trecho), nome, trecho)
+
+    def test_catalogo_imutavel(self):
+        with self.assertRaises(AttributeError):
+            self.catalogo.versao = 1
+
+
+class CatalogoCompartilhadoTest(TestCase):
+    """Testes do snapshot do cardápio carregado do banco"""
+
+    def setUp(self):
+        catalogo_compartilhado.invalidar()
+        self.prato = Prato.objects.create(
+            nome='Tacacá', categoria='prato_principal', ingredientes='tucumã, jambu',
+            descricao='Servido na cuia', preco='14.50', tempo_preparo='20 minutos'
+        )
+
+    def test_bot_usa_precos_do_banco(self):
+        resultado = BotRestauranteParaenseSimples().calcular_pedido([{'nome': 'tacacá', 'quantidade': 2}])
+        self.assertEqual(resultado['total'], 29.0)
+        self.assertEqual(resultado['itens'][0]['prato_id'], self.prato.id)
+
+    def test_signal_recarrega_snapshot(self):
+        versao = get_catalogo().versao
+        self.prato.preco = '16.00'
+        self.prato.save()
+        self.assertGreater(get_catalogo().versao, versao)
+        self.assertEqual(get_catalogo().por_nome('tacaca')['preco'], 16.0)
+        with self.assertNumQueries(0):
+            get_catalogo().por_nome('tacaca')
+
+    @override_settings(BOT_VERIFICAR_CARDAPIO_S=0)
+    def test_mudancas_fora_do_orm_e_de_outros_processos(self):
+        self.assertEqual(get_catalogo().por_nome('tacaca')['preco'], 14.5)
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE bot_prato SET preco = 99.5 WHERE id = %s', [self.prato.id])
+        self.assertEqual(get_catalogo().por_nome('tacaca')['preco'], 99.5)
+        resposta = self.client.post(
+            '/calcular-pedido/', {'itens': [{'nome': 'tacacá', 'quantidade': 1}]}, content_type='application/json'
+        )
+        self.assertEqual(float(resposta.json()['total']), 99.5)
+
+        Prato.objects.filter(id=self.prato.id).update(preco='20.00')
+        self.assertEqual(get_catalogo().por_nome('tacaca')['preco'], 20.0)
+        # Sem mudanças, a conferência custa uma consulta e mantém o snapshot
+        catalogo = get_catalogo()
+        with self.assertNumQueries(1):
+            self.assertIs(get_catalogo(), catalogo)
+
+
+class AtualizacaoCardapioTest(TransactionTestCase):
+    """Testes do reaquecimento dos bots depois que o cardápio muda"""
+
+    def _prato(self, nome):
+        return Prato.objects.create(
+            nome=nome, categoria='prato_principal', ingredientes='tucupi, jambu',
+            descricao='Servido na cuia', preco='12.00', tempo_preparo='20 minutos'
+        )
+
+    def test_um_aquecimento_por_transacao(self):
+        with patch.object(registro_bots, 'aquecer') as aquecer:
+            with transaction.atomic():
+                pratos = [self._prato(f'Prato {i}') for i in range(3)]
+                pratos[0].delete()
+            self.assertEqual(aquecer.call_count, 1)
+
+            with transaction.atomic():
+                try:
+                    with transaction.atomic():
+                        self._prato('Desfeito')
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+                self._prato('Prato 3')
+            self.assertEqual(aquecer.call_count, 2)
+
+            # Transação desfeita inteira: nenhum aquecimento, e a próxima agenda o seu
+            try:
+                with transaction.atomic():
+                    self._prato('Desfeito')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            self.assertEqual(aquecer.call_count, 2)
+            self._prato('Prato 4')
+            self.assertEqual(aquecer.call_count, 3)
+
+
+@override_settings(BOT_REGISTRO_CONVERSAS={'SINCRONO': True})
+class RegistroBotsTest(TestCase):
+    """Testes do registro de bots compartilhados"""
+
+    def test_instancia_unica_por_motor(self):
+        self.assertIs(registro_bots.obter(), registro_bots.obter('regras'))
+        with self.assertRaises(ImproperlyConfigured):
+            RegistroBots().obter('inexistente')
+
+    def test_chat_usa_bot_registrado(self):
+        resposta = self.client.post('/bot/chat/', {'mensagem': 'oi', 'sessao_id': 's1'})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['intencao'], 'saudacao')
+
+
+class CacheRespostasCardapioTest(TestCase):
+    """Testes do cache de respostas derivadas do cardápio"""
+
+    def setUp(self):
+        catalogo_compartilhado.invalidar()
+        self.bot = BotRestauranteParaenseSimples()
+
+    def test_resposta_reaproveitada_ate_o_cardapio_mudar(self):
+        primeira = self.bot.processar_mensagem('qual o cardápio?')['resposta']
+        self.assertIs(self.bot.processar_mensagem('me mostra o menu')['resposta'], primeira)
+
+        Prato.objects.create(
+            nome='Tacacá', categoria='prato_principal', ingredientes='tucumã, jambu',
+            descricao='Servido na cuia', preco='19.90', tempo_preparo='20 minutos'
+        )
+        atualizada = self.bot.processar_mensagem('qual o cardápio?')['resposta']
+        self.assertIn('R$ 19.90', atualizada)
+        self.assertLessEqual(len(self.bot._cache_respostas), 4)
+
+
+class BuscaPratoTest(TestCase):
+    """Testes da busca aproximada de pratos"""
+
+    def setUp(self):
+        catalogo_compartilhado.invalidar()
+
+    def test_tolera_erros_de_digitacao(self):
+        self.assertEqual(get_catalogo().buscar('manisoba')[0][0], 'maniçoba')
+        self.assertEqual(get_catalogo().buscar('tacaca', limite=1), [('tacacá', 1.0)])
+
+    def _popular(self):
+        Prato.objects.bulk_create([
+            Prato(
+                nome=prato['nome'], categoria=prato['categoria'].replace(' ', '_'),
+                ingredientes=', '.join(prato['ingredientes']), descricao=prato['descricao'],
+                preco=Decimal(str(prato['preco'])), tempo_preparo=prato['tempo_preparo']
+            )
+            for prato in PRATOS_PARAENSES.values()
+        ])
+        catalogo_compartilhado.invalidar()
+
+    def test_endpoint_paginado_sem_consultas(self):
+        self._popular()
+        get_catalogo()
+        with self.assertNumQueries(0):
+            resposta = self.client.get('/buscar-prato/', {'nome': 'camarao', 'limit': 2, 'offset': 1})
+        dados = resposta.json()
+        self.assertTrue(dados['encontrado'])
+        self.assertEqual(dados['total'], 4)
+        self.assertEqual([r['prato']['nome'] for r in dados['resultados']], ['Caruru', 'Vatapá Paraense'])
+        # Mesmo formato do PratoSerializer e da busca textual
+        caruru = dados['resultados'][0]['prato']
+        self.assertEqual(caruru, PratoSerializer(Prato.objects.get(nome='Caruru')).data)
+        # O melhor resultado geral, não o primeiro da página
+        melhor = get_catalogo().pratos[get_catalogo().buscar('camarao')[0][0]]['nome']
+        self.assertEqual(dados['prato']['nome'], melhor)
+        self.assertNotIn(melhor, [r['prato']['nome'] for r in dados['resultados']])
+
+    def test_endpoint_sem_pratos_no_banco_usa_catalogo(self):
+        resposta = self.client.get('/buscar-prato/', {'nome': 'tacaca'})
+        self.assertEqual(resposta.json()['prato'], PRATOS_PARAENSES['tacacá'])
+
+    def test_endpoint_valida_paginacao(self):
+        resposta = self.client.get('/buscar-prato/', {'nome': 'tacaca', 'limit': 'x'})
+        self.assertEqual(resposta.status_code, 400)
+
+
+class BuscaTextualTest(TestCase):
+    """Testes da busca textual com FTS5"""
+
+    def setUp(self):
+        Prato.objects.create(
+            nome='Tacacá', categoria='prato_principal', ingredientes='tucumã, jambu, camarão seco',
+            descricao='Servido na cuia', preco='12.00', tempo_preparo='20 minutos'
+        )
+        self.manicoba = Prato.objects.create(
+            nome='Maniçoba', categoria='prato_principal', ingredientes='folha de mandioca, carne seca',
+            descricao='Cozida por sete dias', preco='28.00', tempo_preparo='7 dias'
+        )
+
+    def test_busca_ignora_acentos_e_acompanha_alteracoes(self):
+        self.assertEqual([p.nome for p in Prato.objects.buscar('camarao')], ['Tacacá'])
+        self.manicoba.descricao = 'Servida com arroz e camarão'
+        self.manicoba.save()
+        self.assertEqual(len(Prato.objects.buscar('camarao')), 2)
+        self.manicoba.delete()
+        self.assertEqual([p.nome for p in Prato.objects.buscar('camar')], ['Tacacá'])
+
+    def test_cardapio_e_busca_com_parametro_q(self):
+        resposta = self.client.get('/cardapio/', {'q': 'cuia'})
+        self.assertEqual([p['nome'] for p in resposta.json()], ['Tacacá'])
+        resposta = self.client.get('/buscar-prato/', {'q': 'mandioca'})
+        self.assertEqual(resposta.json()['prato']['nome'], 'Maniçoba')
+
+
+class PromptBotLLMTest(SimpleTestCase):
+    """Testes do cardápio enviado no prompt do bot com LLM"""
+
+    def setUp(self):
+        self.bot = BotRestauranteParaense(llm=FakeListChatModel(responses=['Temos tacacá!']))
+
+    def test_recupera_apenas_pratos_relevantes(self):
+        with patch('bot_langchain.bot_restaurante.get_catalogo', return_value=MenuCatalog(PRATOS_PARAENSES)):
+            pratos_info = self.bot._format_pratos_info('tem algo com camarão?')
+            completo = self.bot._format_pratos_info()
+            self.assertIs(self.bot._format_pratos_info(), completo)
+        self.assertIn('Caruru', pratos_info)
+        self.assertNotIn('Açaí', pratos_info)
+        self.assertIn('Açaí', completo)
+
+    def test_recuperacao_desligada_envia_cardapio_completo(self):
+        self.bot.usar_recuperacao = False
+        with patch('bot_langchain.bot_restaurante.get_catalogo', return_value=MenuCatalog(PRATOS_PARAENSES)):
+            self.assertIn('Açaí', self.bot._format_pratos_info('camarão'))
+
+
+@override_settings(BOT_REGISTRO_CONVERSAS={'SINCRONO': True})
+class ChatAssincronoTest(TestCase):
+    """Testes do endpoint assíncrono do chat"""
+
+    def tearDown(self):
+        registro_bots.recarregar()
+
+    @override_settings(BOT_MOTOR='llm')
+    async def test_chat_assincrono_com_llm(self):
+        registro_bots.registrar('llm', BotRestauranteParaense(llm=FakeListChatModel(responses=['Temos tacacá!'])))
+        resposta = await self.async_client.post(
+            '/bot/chat/async/', {'mensagem': 'qual o preço do tacacá?', 'sessao_id': 's1'},
+            content_type='application/json'
+        )
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['resposta'], 'Temos tacacá!')
+        conversa = await Conversa.objects.select_related('resposta').aget(sessao_id='s1')
+        self.assertEqual(conversa.resposta_bot, 'Temos tacacá!')
+
+    async def test_chat_assincrono_valida_mensagem(self):
+        resposta = await self.async_client.post('/bot/chat/async/', {}, content_type='application/json')
+        self.assertEqual(resposta.status_code, 400)
+
+
+@override_settings(BOT_REGISTRO_CONVERSAS={'SINCRONO': True})
+class ChatStreamingTest(TestCase):
+    """Testes do chat com streaming (SSE)"""
+
+    def tearDown(self):
+        registro_bots.recarregar()
+
+    @override_settings(BOT_MOTOR='llm')
+    async def test_envia_tokens_e_evento_final(self):
+        llm = GenericFakeChatModel(messages=iter([AIMessage(content='Temos tacacá quentinho')]))
+        registro_bots.registrar('llm', BotRestauranteParaense(llm=llm))
+        resposta = await self.async_client.post(
+            '/bot/chat/stream/', {'mensagem': 'o que vocês recomendam?', 'sessao_id': 's1'},
+            content_type='application/json'
+        )
+        self.assertEqual(resposta['Content-Type'], 'text/event-stream')
+        corpo = b''.join([parte async for parte in resposta.streaming_content]).decode()
+
+        eventos = [bloco.split('\n') for bloco in corpo.strip().split('\n\n')]
+        tokens = [json.loads(dados[6:])['conteudo'] for evento, dados in eventos if evento == 'event: token']
+        self.assertGreater(len(tokens), 1)
+        self.assertEqual(''.join(tokens), 'Temos tacacá quentinho')
+        self.assertEqual(eventos[-1][0], 'event: fim')
+        self.assertEqual(json.loads(eventos[-1][1][6:])['intencao'], 'sugestao')
+
+        conversa = await Conversa.objects.select_related('resposta').aget(sessao_id='s1')
+        self.assertEqual(conversa.resposta_bot, 'Temos tacacá quentinho')
+
+
+@override_settings(BOT_REGISTRO_CONVERSAS={'SINCRONO': True})
+class BotHibridoTest(TestCase):
+    """Testes do roteamento entre regras e LLM"""
+
+    def setUp(self):
+        catalogo_compartilhado.invalidar()
+        self.llm = FakeListChatModel(responses=['Aceitamos pix, sim!'])
+        self.bot = BotRestauranteHibrido(
+            bot_regras=BotRestauranteParaenseSimples(),
+            bot_llm=BotRestauranteParaense(llm=self.llm),
+        )
+
+    def tearDown(self):
+        registro_bots.recarregar()
+
+    def test_mensagens_confiaveis_nao_chamam_llm(self):
+        for mensagem in ['olá, boa noite!', 'qual o preço do tacacá?', 'tacacá']:
+            resultado = self.bot.processar_mensagem(mensagem)
+            self.assertEqual(resultado['rota'], 'regras')
+        self.assertEqual(self.llm.i, 0)
+        self.assertEqual(self.bot.metricas()['rotas'], {'regras': 3, 'llm': 0})
+
+    def test_preco_de_um_prato_responde_so_o_prato(self):
+        resultado = self.bot.processar_mensagem('quanto custa o tacacá?')
+        self.assertEqual(resultado['rota'], 'regras')
+        self.assertIn('**Tacacá** sai por R$ 12.00', resultado['resposta'])
+        self.assertNotIn('Nossos preços', resultado['resposta'])
+        self.assertIn('Nossos preços', self.bot.processar_mensagem('quanto custa?')['resposta'])
+
+    def test_baixa_confianca_escala_para_llm(self):
+        resultado = self.bot.processar_mensagem('vocês aceitam pix?')
+        self.assertEqual(resultado['rota'], 'llm')
+        self.assertEqual(resultado['resposta'], 'Aceitamos pix, sim!')
+
+    def test_limiar_configuravel(self):
+        bot = BotRestauranteHibrido(
+            bot_regras=self.bot.bot_regras, bot_llm=self.bot.bot_llm, limiar_confianca=1.1
+        )
+        self.assertEqual(bot.processar_mensagem('olá, boa noite!')['rota'], 'llm')
+
+    @override_settings(BOT_MOTOR='hibrido')
+    def test_rota_registrada_na_conversa(self):
+        registro_bots.registrar('llm', self.bot.bot_llm)
+        self.client.post('/bot/chat/', {'mensagem': 'olá', 'sessao_id': 's1'}, content_type='application/json')
+        self.client.post('/bot/chat/', {'mensagem': 'vocês aceitam pix?', 'sessao_id': 's1'}, content_type='application/json')
+        intencoes = list(Conversa.objects.filter(sessao_id='s1').order_by('id').values_list('intencao', flat=True))
+        self.assertEqual(intencoes, ['regras:saudacao', 'llm:conversa'])
+
+
+class ModeloContador(FakeListChatModel):
+    """Modelo falso que registra o tamanho de cada lote recebido"""
+    lotes: list = []
+
+    def batch(self, entradas, *args, **kwargs):
+        self.lotes.append(len(entradas))
+        return super().batch(entradas, *args, **kwargs)
+
+
+class CoalescedorLLMTest(SimpleTestCase):
+    """Testes do coalescimento e agrupamento das chamadas ao LLM"""
+
+    def setUp(self):
+        self.llm = ModeloContador(responses=['resposta'], lotes=[])
+        self.coalescedor = CoalescedorLLM(self.llm, max_lote=8, espera_ms=100)
+
+    def _disparar(self, entradas):
+        with ThreadPoolExecutor(max_workers=len(entradas)) as executor:
+            return list(executor.map(self.coalescedor.invocar, entradas))
+
+    def test_entradas_identicas_compartilham_uma_chamada(self):
+        respostas = self._disparar(['qual o preço do tacacá?'] * 5)
+        self.assertEqual({r.content for r in respostas}, {'resposta'})
+        self.assertEqual(self.llm.lotes, [1])
+        self.assertEqual(self.coalescedor.metricas(), {'chamadas': 5, 'coalescidas': 4, 'lotes': 1})
+
+    def test_entradas_distintas_vao_no_mesmo_lote(self):
+        self._disparar(['tacacá', 'maniçoba', 'açaí'])
+        self.assertEqual(self.llm.lotes, [3])
+
+    def test_respeita_tamanho_maximo_do_lote(self):
+        self.coalescedor.max_lote = 2
+        self._disparar(['tacacá', 'maniçoba', 'açaí'])
+        self.assertEqual(sorted(self.llm.lotes), [1, 2])
+
+    async def test_chamada_assincrona(self):
+        resposta = await self.coalescedor.ainvocar('tacacá')
+        self.assertEqual(resposta.content, 'resposta')
+
+    async def test_cancelar_uma_espera_nao_afeta_as_outras(self):
+        desistente = asyncio.ensure_future(self.coalescedor.ainvocar('tacacá'))
+        companheira = asyncio.ensure_future(self.coalescedor.ainvocar('tacacá'))
+        outra = asyncio.ensure_future(self.coalescedor.ainvocar('maniçoba'))
+        await asyncio.sleep(0.01)
+        desistente.cancel()
+        respostas = await asyncio.gather(companheira, outra)
+        self.assertEqual([r.content for r in respostas], ['resposta', 'resposta'])
+        self.assertTrue(desistente.cancelled())
+        self.assertEqual(self.llm.lotes, [2])
+
+    def test_bot_llm_usa_coalescedor(self):
+        bot = BotRestauranteParaense(llm=self.llm, coalescer={'max_lote': 4, 'espera_ms': 1})
+        with patch('bot_langchain.bot_restaurante.get_catalogo', return_value=MenuCatalog(PRATOS_PARAENSES)):
+            resultado = bot.processar_mensagem('vocês aceitam pix?')
+        self.assertEqual(resultado['resposta'], 'resposta')
+        self.assertEqual(bot.metricas()['coalescedor']['lotes'], 1)
+
+
+def _llm_fora_do_ar(entrada):
+    raise ConnectionError('provedor fora do ar')
+
+
+def _llm_lento(entrada):
+    time.sleep(0.3)
+    return AIMessage(content='tarde demais')
+
+
+class ProtecaoLLMTest(TestCase):
+    """Testes do limite, prazo e disjuntor em volta do LLM"""
+
+    def setUp(self):
+        catalogo_compartilhado.invalidar()
+
+    def _bot(self, llm, **protecao):
+        opcoes = {'prazo_s': 5, 'falhas_para_abrir': 2, 'tempo_aberto_s': 60}
+        opcoes.update(protecao)
+        return BotRestauranteParaense(llm=llm, protecao=opcoes, bot_reserva=BotRestauranteParaenseSimples())
+
+    def test_falhas_abrem_disjuntor_e_reserva_responde(self):
+        llm = RunnableLambda(_llm_fora_do_ar)
+        bot = self._bot(llm)
+        for _ in range(3):
+            resultado = bot.processar_mensagem('olá')
+            self.assertEqual(resultado['status'], 'sucesso')
+            self.assertEqual(resultado['intencao'], 'saudacao')
+        metricas = bot.metricas()
+        self.assertEqual(metricas['protecao']['estado'], ABERTO)
+        self.assertEqual(metricas['protecao']['recusas'], {'disjuntor_aberto': 1})
+        self.assertEqual(metricas['respostas_reserva'], {'falha': 2, 'disjuntor_aberto': 1})
+
+    def test_prazo_esgotado_usa_reserva(self):
+        bot = self._bot(RunnableLambda(_llm_lento), prazo_s=0.05)
+        inicio = time.monotonic()
+        resultado = bot.processar_mensagem('olá')
+        self.assertLess(time.monotonic() - inicio, 0.25)
+        self.assertEqual(resultado['reserva'], 'prazo')
+
+    async def test_prazo_esgotado_assincrono(self):
+        bot = self._bot(RunnableLambda(_llm_lento), prazo_s=0.05)
+        await sync_to_async(get_catalogo)()
+        resultado = await bot.aprocessar_mensagem('olá')
+        self.assertEqual(resultado['reserva'], 'prazo')
+
+    def test_limite_de_chamadas_simultaneas(self):
+        bot = self._bot(RunnableLambda(_llm_lento), max_simultaneas=1)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            resultados = list(executor.map(bot.processar_mensagem, ['olá', 'olá']))
+        self.assertIn('limite_simultaneas', [r.get('reserva') for r in resultados])
+
+    def test_vaga_livre_assim_que_a_chamada_retorna(self):
+        protecao = ProtecaoLLM(max_simultaneas=1)
+        for i in range(200):
+            self.assertEqual(protecao.executar(lambda x: x, i), i)
+        self.assertEqual(protecao.metricas()['recusas'], {})
+        self.assertEqual(protecao.metricas()['em_andamento'], 0)
+
+    def test_streaming_parado_estoura_prazo_por_parte(self):
+        def partes():
+            yield 'Temos '
+            time.sleep(0.3)
+            yield 'tacacá'
+
+        protecao = ProtecaoLLM(max_simultaneas=1, prazo_s=0.05)
+        recebidas = []
+        with self.assertRaises(LLMIndisponivel) as contexto:
+            for parte in protecao.transmitir(partes()):
+                recebidas.append(parte)
+        self.assertEqual((recebidas, contexto.exception.motivo), (['Temos '], 'prazo'))
+        # A vaga segue ocupada até a parte atrasada chegar
+        self.assertEqual(protecao.metricas()['em_andamento'], 1)
+        time.sleep(0.4)
+        self.assertEqual(protecao.metricas()['em_andamento'], 0)
+
+    async def test_streaming_assincrono_estoura_prazo_por_parte(self):
+        async def partes():
+            yield 'Temos '
+            await asyncio.sleep(1)
+            yield 'tacacá'
+
+        protecao = ProtecaoLLM(prazo_s=0.05)
+        recebidas = []
+        with self.assertRaises(LLMIndisponivel):
+            async for parte in protecao.atransmitir(partes()):
+                recebidas.append(parte)
+        self.assertEqual(recebidas, ['Temos '])
+        self.assertEqual(protecao.metricas()['em_andamento'], 0)
+
+    def test_disjuntor_fecha_apos_teste_bem_sucedido(self):
+        disjuntor = Disjuntor(falhas_para_abrir=1, tempo_aberto_s=60)
+        disjuntor.registrar_falha()
+        self.assertFalse(disjuntor.permitir())
+        with patch('bot_langchain.resiliencia.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertTrue(disjuntor.permitir())
+            self.assertFalse(disjuntor.permitir())
+        disjuntor.registrar_sucesso()
+        self.assertEqual(disjuntor.estado, FECHADO)
+
+
+class MemoriaSessoesTest(TestCase):
+    """Testes da memória por sessão do chat"""
+
+    def setUp(self):
+        catalogo_compartilhado.invalidar()
+
+    def test_buffer_circular_guarda_ultimos_turnos(self):
+        memoria = MemoriaSessoes(max_turnos=2)
+        for i in range(3):
+            memoria.registrar('s1', f'pergunta {i}', f'resposta {i}')
+        self.assertEqual(memoria.historico('s1'), [('pergunta 1', 'resposta 1'), ('pergunta 2', 'resposta 2')])
+
+    def test_descarta_sessoes_ociosas_pelo_limite(self):
+        memoria = MemoriaSessoes(max_sessoes=2)
+        memoria.registrar('s1', 'oi', 'olá')
+        memoria.registrar('s2', 'oi', 'olá')
+        memoria.historico('s1')
+        memoria.registrar('s3', 'oi', 'olá')
+        self.assertEqual(list(memoria._sessoes), ['s1', 's3'])
+
+    def test_respeita_teto_de_bytes(self):
+        memoria = MemoriaSessoes(max_bytes=100)
+        memoria.registrar('s1', 'a' * 60, 'b')
+        memoria.registrar('s2', 'c' * 60, 'd')
+        self.assertEqual(memoria.metricas()['sessoes'], 1)
+        self.assertLessEqual(memoria.metricas()['bytes'], 100)
+
+    def test_janela_respeita_orcamento_de_tokens(self):
+        memoria = MemoriaSessoes()
+        memoria.registrar('s1', 'x' * 400, 'y' * 400)
+        memoria.registrar('s2', 'oi', 'olá')
+        memoria.registrar('s1', 'e o tacacá?', 'Custa R$ 12,00')
+        self.assertEqual(memoria.janela('s1', 50), [('e o tacacá?', 'Custa R$ 12,00')])
+
+    def test_reconstroi_do_banco_so_na_falta(self):
+        Conversa.objects.create(sessao_id='s1', mensagem_usuario='tem tacacá?', resposta_bot='Temos!', intencao='busca_prato')
+        memoria = MemoriaSessoes(carregador=carregar_historico)
+        with self.assertNumQueries(1):
+            memoria.historico('s1')
+            memoria.historico('s1')
+        self.assertEqual(memoria.historico('s1'), [('tem tacacá?', 'Temos!')])
+
+    def test_turno_por_regras_apos_reinicio_mantem_historico_do_banco(self):
+        Conversa.objects.create(
+            sessao_id='s1', mensagem_usuario='me fala do tacacá', resposta_bot='É um caldo de tucupi.', intencao='llm:conversa'
+        )
+        prompts = []
+
+        def llm(entrada):
+            prompts.append([m.content for m in entrada.to_messages()[1:]])
+            return AIMessage(content='Aceitamos pix, sim!')
+
+        # Memória vazia, como após um reinício
+        bot = BotRestauranteHibrido(
+            bot_regras=BotRestauranteParaenseSimples(),
+            bot_llm=BotRestauranteParaense(llm=RunnableLambda(llm), memoria=MemoriaSessoes(carregador=carregar_historico)),
+        )
+        self.assertEqual(bot.processar_mensagem('olá', sessao_id='s1')['rota'], 'regras')
+        self.assertEqual(bot.processar_mensagem('vocês aceitam pix?', sessao_id='s1')['rota'], 'llm')
+        self.assertEqual(prompts[0][:2], ['me fala do tacacá', 'É um caldo de tucupi.'])
+        self.assertEqual(prompts[0][2], 'olá')
+
+    def test_historico_vai_no_prompt_e_ignora_cache(self):
+        prompts = []
+
+        def llm(entrada):
+            prompts.append(entrada.to_messages())
+            return AIMessage(content='Custa R$ 12,00')
+
+        bot = BotRestauranteParaense(
+            llm=RunnableLambda(llm), cache_respostas=CacheRespostasLLM(), memoria=MemoriaSessoes()
+        )
+        bot.processar_mensagem('me fala do tacacá', sessao_id='s1')
+        bot.processar_mensagem('e quanto custa?', sessao_id='s1')
+        bot.processar_mensagem('e quanto custa?', sessao_id='s1')
+
+        self.assertEqual([m.content for m in prompts[1][1:]], ['me fala do tacacá', 'Custa R$ 12,00', 'e quanto custa?'])
+        self.assertEqual(len(prompts), 3)
+        self.assertEqual(bot.metricas()['cache_respostas']['acertos'], 0)
+
+
+class RegistroConversasTest(TransactionTestCase):
+    """Testes da gravação das conversas em lote fora da requisição"""
+
+    def _conversa(self, i):
+        return Conversa(sessao_id='s1', mensagem_usuario=f'mensagem {i}', resposta_bot='ok', intencao='conversa')
+
+    @override_settings(BOT_REGISTRO_CONVERSAS={'SINCRONO': False, 'MAX_LOTE': 2, 'INTERVALO_S': 0.05})
+    def test_grava_em_lotes_em_segundo_plano(self):
+        registro = RegistroConversas()
+        for i in range(3):
+            registro.registrar(self._conversa(i))
+        registro.descarregar()
+        self.assertEqual(Conversa.objects.count(), 3)
+        self.assertEqual(registro.metricas()['gravadas'], 3)
+        self.assertEqual(registro.metricas()['lotes'], 2)
+        registro.encerrar()
+
+    @override_settings(BOT_REGISTRO_CONVERSAS={'SINCRONO': False, 'MAX_LOTE': 50, 'INTERVALO_S': 60})
+    def test_encerrar_grava_o_que_resta(self):
+        registro = RegistroConversas()
+        registro.registrar(self._conversa(1))
+        registro.encerrar()
+        self.assertEqual(Conversa.objects.count(), 1)
+
+    @override_settings(BOT_REGISTRO_CONVERSAS={'SINCRONO': False, 'MAX_LOTE': 50, 'INTERVALO_S': 60})
+    def test_guarda_a_hora_da_mensagem(self):
+        conversa = self._conversa(1)
+        recebida = conversa.timestamp
+        registro = RegistroConversas()
+        registro.registrar(conversa)
+        time.sleep(0.01)
+        registro.encerrar()
+        self.assertEqual(Conversa.objects.get().timestamp, recebida)
+
+    @override_settings(BOT_REGISTRO_CONVERSAS={'SINCRONO': False, 'INTERVALO_S': 0.05, 'TENTATIVAS': 2, 'ESPERA_S': 0})
+    def test_repete_lote_que_falhou(self):
+        bulk_create = ConversaQuerySet.bulk_create
+        chamadas = []
+
+        def falha_na_primeira(queryset, objs, *args, **kwargs):
+            chamadas.append(len(objs))
+            if len(chamadas) == 1:
+                raise OperationalError('database is locked')
+            return bulk_create(queryset, objs, *args, **kwargs)
+
+        registro = RegistroConversas()
+        with patch.object(ConversaQuerySet, 'bulk_create', falha_na_primeira), self.assertLogs('bot.registro_conversas', 'WARNING'):
+            registro.registrar(self._conversa(1))
+            registro.registrar(self._conversa(2))
+            registro.descarregar()
+        registro.encerrar()
+        self.assertEqual(chamadas, [2, 2])
+        self.assertEqual(Conversa.objects.count(), 2)
+        self.assertEqual(registro.metricas()['falhas'], 0)
+
+    @override_settings(BOT_REGISTRO_CONVERSAS={'SINCRONO': False, 'INTERVALO_S': 0.05, 'TENTATIVAS': 2, 'ESPERA_S': 0})
+    def test_linha_invalida_nao_descarta_o_lote(self):
+        invalida = Conversa(sessao_id=None, mensagem_usuario='sem sessão', resposta_bot='ok', intencao='conversa')
+        registro = RegistroConversas()
+        with self.assertLogs('bot.registro_conversas', 'WARNING'):
+            registro.registrar(self._conversa(1))
+            registro.registrar(invalida)
+            registro.descarregar()
+        registro.encerrar()
+        self.assertEqual(list(Conversa.objects.values_list('mensagem_usuario', flat=True)), ['mensagem 1'])
+        self.assertEqual(registro.metricas()['gravadas'], 1)
+        self.assertEqual(registro.metricas()['falhas'], 1)
+
+    @override_settings(BOT_REGISTRO_CONVERSAS={'SINCRONO': True})
+    def test_chat_grava_conversa_com_uma_escrita(self):
+        catalogo_compartilhado.invalidar()
+        self.client.post('/bot/chat/', {'mensagem': 'quero pedir', 'sessao_id': 's1'}, content_type='application/json')
+        # A resposta pronta já está em RespostaBot: a segunda conversa só grava a própria linha
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.post('/bot/chat/', {'mensagem': 'quero pedir', 'sessao_id': 's2'}, content_type='application/json')
+        escritas = [c['sql'] for c in consultas.captured_queries if c['sql'].startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(len(escritas), 1)
+        self.assertEqual(Conversa.objects.get(sessao_id='s2').intencao, 'pedido')
+
+
+class RoteadorLeituraTest(TransactionTestCase):
+    """Testes do roteamento das views somente leitura para a conexão de leitura"""
+    databases = {'default', 'leitura'}
+
+    def test_views_de_leitura_usam_conexao_de_leitura(self):
+        Conversa.objects.create(sessao_id='s1', mensagem_usuario='oi', resposta_bot='olá', intencao='saudacao')
+        with CaptureQueriesContext(connections['leitura']) as leituras, \
+                CaptureQueriesContext(connections['default']) as escritas:
+            resposta = self.client.get('/conversas/')
+        self.assertEqual(resposta.json()['results'][0]['sessao_id'], 's1')
+        self.assertEqual(len(leituras), 1)
+        self.assertEqual(len(escritas), 0)
+
+    def test_escritas_e_transacoes_usam_default(self):
+        roteador = RoteadorLeitura()
+        with somente_leitura():
+            self.assertEqual(roteador.db_for_read(Prato), 'leitura')
+            self.assertEqual(roteador.db_for_write(Prato), 'default')
+            with transaction.atomic():
+                self.assertIsNone(roteador.db_for_read(Prato))
+        self.assertIsNone(roteador.db_for_read(Prato))
+        self.assertFalse(roteador.allow_migrate('leitura', 'bot'))
+
+
+class ShardsConversaTest(TestCase):
+    """Testes do modo shard das conversas"""
+
+    @override_settings(BOT_SHARDS_CONVERSA=['conversas_0', 'conversas_1', 'conversas_2'])
+    def test_roteia_pela_sessao(self):
+        roteador = RoteadorConversas()
+        shard = shard_da_sessao('sessao-abc')
+        self.assertEqual(shard, f"conversas_{zlib.crc32(b'sessao-abc') % 3}")
+        self.assertEqual(roteador.db_for_write(Conversa, instance=Conversa(sessao_id='sessao-abc')), shard)
+        self.assertIsNone(roteador.db_for_write(Prato, instance=Prato(nome='Tacacá')))
+        self.assertEqual(Conversa.objects.da_sessao('sessao-abc').db, shard)
+        self.assertTrue(roteador.allow_migrate('conversas_1', 'bot', model_name='conversa'))
+        self.assertFalse(roteador.allow_migrate('conversas_1', 'bot', model_name='prato'))
+        self.assertIsNone(roteador.allow_migrate('default', 'bot', model_name='conversa'))
+
+    def test_sem_shards(self):
+        self.assertIsNone(shard_da_sessao('sessao-abc'))
+        self.assertEqual(len(Conversa.objects.por_shard()), 1)
+
+    def test_paginacao_intercalada(self):
+        for i in range(7):
+            Conversa.objects.create(sessao_id='ab'[i % 2], mensagem_usuario=f'm{i}', resposta_bot='ok', intencao='conversa')
+        # Empates de timestamp entre e dentro dos shards
+        Conversa.objects.filter(mensagem_usuario__in=['m1', 'm2', 'm3']).update(timestamp=timezone.now())
+        consultas = [Conversa.objects.filter(sessao_id='a'), Conversa.objects.filter(sessao_id='b')]
+        esperado = sorted(
+            Conversa.objects.all(), key=lambda c: (c.timestamp, 'ab'.index(c.sessao_id), c.id), reverse=True
+        )
+
+        vistos, cursor = [], None
+        while True:
+            paginacao = PaginacaoIntercalada()
+            parametros = {'limit': 3, **({'cursor': cursor} if cursor else {})}
+            request = Request(APIRequestFactory().get('/conversas/', parametros))
+            vistos += paginacao.paginar(consultas, request)
+            proxima = paginacao.get_paginated_response([]).data['next']
+            if proxima is None:
+                break
+            cursor = parse_qs(urlparse(proxima).query)['cursor'][0]
+        self.assertEqual(vistos, esperado)
+
+    def test_cursor_invalido(self):
+        request = Request(APIRequestFactory().get('/conversas/', {'cursor': 'xx'}))
+        with self.assertRaises(NotFound):
+            PaginacaoIntercalada().paginar([Conversa.objects.all()], request)
+
+
+@override_settings(BOT_REGISTRO_CONVERSAS={'SINCRONO': True})
+class ChatComShardsTest(TestCase):
+    """Testes do chat com as conversas gravadas em shards"""
+    shards = ['conversas_teste_0', 'conversas_teste_1']
+
+    @classmethod
+    def setUpClass(cls):
+        # Shards em memória criados só para esta classe, como faria "migrate --database conversas_<i>";
+        # entram em databases depois que o runner já preparou os bancos de teste
+        cls.databases = {'default', *cls.shards}
+        configuracoes = connections.configure_settings({
+            'default': connections.settings['default'],
+            **{alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'} for alias in cls.shards},
+        })
+        for alias in cls.shards:
+            connections.settings[alias] = configuracoes[alias]
+        with override_settings(BOT_SHARDS_CONVERSA=cls.shards):
+            for alias in cls.shards:
+                call_command('migrate', 'bot', database=alias, verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in cls.shards:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+
+    def test_resposta_pronta_gravada_no_shard_da_sessao(self):
+        with override_settings(BOT_SHARDS_CONVERSA=self.shards):
+            resposta = self.client.post(
+                '/bot/chat/', {'mensagem': 'quero fazer um pedido', 'sessao_id': 'sessao-abc'}, content_type='application/json'
+            )
+            self.assertEqual(resposta.status_code, 200)
+            shard = shard_da_sessao('sessao-abc')
+            conversa = Conversa.objects.da_sessao('sessao-abc').get()
+        self.assertEqual(conversa.intencao, 'pedido')
+        self.assertEqual(conversa.resposta_bot, resposta.json()['resposta'])
+        self.assertEqual(RespostaBot.objects.using(shard).count(), 1)
+        self.assertFalse(RespostaBot.objects.exists())
+
+
+class ArquivoHistoricoTest(TestCase):
+    """Testes do arquivamento de conversas e pedidos antigos"""
+
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.diretorio)
+        agora = timezone.now()
+        prato = Prato.objects.create(
+            nome='Tacacá', categoria='prato_principal', ingredientes='tucumã, jambu',
+            descricao='Servido na cuia', preco='12.00', tempo_preparo='20 minutos'
+        )
+        for i, dias in enumerate([120, 120, 100, 1]):
+            conversa = Conversa.objects.create(
+                sessao_id=f's{i % 2}', mensagem_usuario=f'm{i}', resposta_bot='ok', resposta_pronta=True, intencao='conversa'
+            )
+            Conversa.objects.filter(id=conversa.id).update(timestamp=agora - timedelta(days=dias))
+        for status, dias in [('entregue', 120), ('pendente', 120), ('entregue', 1)]:
+            pedido = Pedido.objects.create(sessao_id='s0', total='12.00', status=status)
+            ItemPedido.objects.create(pedido=pedido, prato=prato, quantidade=1, preco_unitario=Decimal('12.00'))
+            Pedido.objects.filter(id=pedido.id).update(criado_em=agora - timedelta(days=dias))
+
+    def _arquivar(self):
+        saida = StringIO()
+        call_command('arquivar_historico', dias=90, lote=1, diretorio=self.diretorio, stdout=saida)
+        return saida.getvalue()
+
+    def test_move_linhas_antigas_para_segmentos(self):
+        self.assertIn('conversa: 3 linhas', self._arquivar())
+        self.assertEqual(list(Conversa.objects.values_list('mensagem_usuario', flat=True)), ['m3'])
+        self.assertEqual(sorted(Pedido.objects.values_list('status', flat=True)), ['entregue', 'pendente'])
+        self.assertEqual(ItemPedido.objects.count(), 2)
+
+        arquivo = ArquivoHistorico(self.diretorio)
+        segmentos = arquivo.segmentos('conversa')
+        self.assertEqual([segmento['linhas'] for segmento in segmentos], [2, 1])
+        # Um membro gzip por lote no mesmo segmento
+        self.assertEqual([linha['mensagem_usuario'] for linha in arquivo.ler('conversa')], ['m0', 'm1', 'm2'])
+        self.assertEqual([linha['mensagem_usuario'] for linha in arquivo.ler('conversa', sessao_id='s0')], ['m0', 'm2'])
+        self.assertEqual(list(arquivo.ler('conversa', de=date.fromisoformat(segmentos[1]['dia'])))[0]['mensagem_usuario'], 'm2')
+
+        pedido, = arquivo.ler('pedido')
+        self.assertEqual(pedido['status'], 'entregue')
+        self.assertEqual(pedido['itens_pedido'][0]['prato_nome'], 'Tacacá')
+
+    def test_repetir_nao_duplica(self):
+        self._arquivar()
+        self.assertIn('conversa: 0 linhas', self._arquivar())
+        self.assertEqual(len(list(ArquivoHistorico(self.diretorio).ler('conversa'))), 3)
+
+    def test_descarta_lote_interrompido(self):
+        self._arquivar()
+        arquivo = ArquivoHistorico(self.diretorio)
+        segmento = arquivo.segmentos('conversa')[0]
+        # Membro gzip pela metade deixado por uma execução que caiu antes de gravar o índice
+        with open(Path(self.diretorio) / segmento['arquivo'], 'ab') as bruto:
+            bruto.write(gzip.compress(b'{"id": 0}\n')[:10])
+        conversa = Conversa.objects.create(sessao_id='s0', mensagem_usuario='m4', resposta_bot='ok', resposta_pronta=True, intencao='conversa')
+        Conversa.objects.filter(id=conversa.id).update(timestamp=datetime.fromisoformat(segmento['primeiro']))
+
+        self._arquivar()
+        self.assertEqual([linha['mensagem_usuario'] for linha in arquivo.ler('conversa')], ['m0', 'm1', 'm4', 'm2'])
+
+    def test_um_arquivamento_por_vez(self):
+        with ArquivoHistorico(self.diretorio)._travado():
+            with self.assertRaises(CommandError):
+                self._arquivar()
+        self.assertEqual(Conversa.objects.count(), 4)
+
+    def test_apaga_respostas_sem_conversa(self):
+        antiga = Conversa.objects.create(sessao_id='s9', mensagem_usuario='m9', resposta_bot='só esta', resposta_pronta=True, intencao='pedido')
+        Conversa.objects.filter(id=antiga.id).update(timestamp=timezone.now() - timedelta(days=120))
+        self._arquivar()
+        # 'ok' ainda é a resposta da conversa recente
+        self.assertEqual(list(RespostaBot.objects.values_list('texto', flat=True)), ['ok'])
+
+
+@override_settings(BOT_REGISTRO_CONVERSAS={'SINCRONO': True})
+class RespostaBotTest(TestCase):
+    """Testes do armazenamento deduplicado das respostas do bot"""
+
+    def _conversa(self, sessao_id, resposta, intencao='sugestao', pronta=True):
+        return Conversa(
+            sessao_id=sessao_id, mensagem_usuario='oi', resposta_bot=resposta, resposta_pronta=pronta, intencao=intencao
+        )
+
+    def test_textos_iguais_guardados_uma_vez(self):
+        Conversa.objects.bulk_create([self._conversa('s1', 'Olá!'), self._conversa('s2', 'Olá!'), self._conversa('s3', 'Tchau')])
+        self._conversa('s4', 'Olá!', 'regras:sugestao').save()
+        self.assertEqual(RespostaBot.objects.count(), 2)
+        self.assertEqual(RespostaBot.objects.get(texto='Olá!').conversas.count(), 3)
+
+        conversas = Conversa.objects.select_related('resposta').order_by('sessao_id')
+        self.assertEqual([c.resposta_bot for c in conversas], ['Olá!', 'Olá!', 'Tchau', 'Olá!'])
+        self.assertEqual(ConversaSerializer(conversas[2]).data['resposta_bot'], 'Tchau')
+
+    def test_respostas_que_nao_sao_prontas_ficam_na_conversa(self):
+        # A intenção não decide: só o que o bot marcou como pronta vai para RespostaBot
+        Conversa.objects.bulk_create([
+            self._conversa('s1', 'Gerada 1', 'llm:sugestao', pronta=False), self._conversa('s2', 'Olá!', pronta=False)
+        ])
+        Conversa.objects.create(sessao_id='s3', mensagem_usuario='oi', resposta_bot='Gerada 2', intencao='conversa')
+        self.assertFalse(RespostaBot.objects.exists())
+
+        conversas = Conversa.objects.order_by('sessao_id')
+        self.assertEqual([c.resposta_bot for c in conversas], ['Gerada 1', 'Olá!', 'Gerada 2'])
+        projetadas = ProjecaoConversa().projetar(ProjecaoConversa().consulta(conversas))
+        self.assertEqual([c['resposta_bot'] for c in projetadas], ['Gerada 1', 'Olá!', 'Gerada 2'])
+
+    def test_chat_grava_uma_vez_so_as_respostas_do_motor_de_regras(self):
+        bot_llm = BotRestauranteParaense(llm=FakeListChatModel(responses=['Gerada']))
+        with patch.object(registro_bots, 'obter', return_value=bot_llm):
+            for sessao in ('s1', 's2'):
+                self.client.post('/bot/chat/', {'mensagem': 'quero fazer um pedido', 'sessao_id': sessao}, content_type='application/json')
+        self.client.post('/bot/chat/', {'mensagem': 'quero fazer um pedido', 'sessao_id': 's3'}, content_type='application/json')
+        self.client.post('/bot/chat/', {'mensagem': 'quero fazer um pedido', 'sessao_id': 's4'}, content_type='application/json')
+        self.assertEqual(RespostaBot.objects.count(), 1)
+        self.assertEqual(RespostaBot.objects.get().conversas.count(), 2)
+        self.assertEqual(list(Conversa.objects.filter(resposta__isnull=True).values_list('resposta_unica', flat=True)), ['Gerada'] * 2)
+
+    def test_trocar_resposta(self):
+        conversa = self._conversa('s1', 'Olá!')
+        conversa.save()
+        conversa.resposta_bot = 'Bom dia!'
+        self.assertEqual(conversa.resposta_bot, 'Bom dia!')
+        conversa.save()
+        self.assertEqual(Conversa.objects.get(id=conversa.id).resposta_bot, 'Bom dia!')
+        self.assertEqual(RespostaBot.objects.get(texto='Bom dia!').hash, RespostaBot.calcular_hash('Bom dia!'))
+
+
+class MigracaoItensPedidoTest(TransactionTestCase):
+    """Testes da migração dos itens em JSON para ItemPedido"""
+    antes = [('bot', '0003_indices_listagem')]
+    depois = [('bot', '0004_jsonfield_itens_canonicos')]
+
+    def _migrar(self, alvo):
+        executor = MigrationExecutor(connection)
+        executor.migrate(alvo)
+        return executor.loader.project_state(alvo).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_pedido_com_parte_das_linhas(self):
+        apps = self._migrar(self.antes)
+        Prato = apps.get_model('bot', 'Prato')
+        Pedido = apps.get_model('bot', 'Pedido')
+        ItemPedido = apps.get_model('bot', 'ItemPedido')
+        dados = {'categoria': 'prato_principal', 'ingredientes': 'jambu', 'descricao': '', 'tempo_preparo': '20 minutos'}
+        tacaca = Prato.objects.create(nome='Tacacá', preco=Decimal('12.00'), **dados)
+        # Criado depois do pedido: a criação antiga não gerou o ItemPedido dele
+        manicoba = Prato.objects.create(nome='Maniçoba', preco=Decimal('20.00'), **dados)
+        pedido = Pedido.objects.create(sessao_id='s1', total=Decimal('48.00'), itens=json.dumps([
+            {'prato_id': tacaca.id, 'nome': 'Tacacá', 'preco_unitario': 12.0, 'quantidade': 2},
+            {'prato_id': 999, 'nome': 'Vatapá', 'preco_unitario': 4.0, 'quantidade': 1},
+            {'nome': 'Maniçoba', 'preco_unitario': 20.0, 'quantidade': 1},
+        ]))
+        ItemPedido.objects.create(
+            pedido=pedido, prato=tacaca, quantidade=2, preco_unitario=Decimal('12.00'), subtotal=Decimal('24.00')
+        )
+
+        apps = self._migrar(self.depois)
+        pedido = apps.get_model('bot', 'Pedido').objects.get(id=pedido.id)
+        linhas = sorted(pedido.itens_pedido.values_list('prato_id', 'quantidade', 'subtotal'))
+        self.assertEqual(linhas, [(tacaca.id, 2, Decimal('24.00')), (manicoba.id, 1, Decimal('20.00'))])
+        self.assertIn('1x Vatapá (R$ 4.00)', pedido.observacoes)
+
+
+class CriarPedidoTest(TestCase):
+    """Testes da criação de pedidos em lote"""
+
+    def setUp(self):
+        Prato.objects.create(
+            nome='Tacacá', categoria='prato_principal', ingredientes='tucumã, jambu, camarão seco',
+            descricao='Servido na cuia', preco='12.00', tempo_preparo='20 minutos'
+        )
+        Prato.objects.create(
+            nome='Açaí', categoria='sobremesa', ingredientes='açaí, farinha de tapioca',
+            descricao='Açaí batido na hora', preco='8.50', tempo_preparo='5 minutos'
+        )
+        get_catalogo()
+
+    def _criar(self, dados):
+        return self.client.post('/pedidos/', dados, content_type='application/json')
+
+    def test_cria_pedido_com_itens(self):
+        resposta = self._criar({'sessao_id': 's1', 'itens': [{'nome': 'tacaca', 'quantidade': 2}, {'nome': 'Açaí'}]})
+        self.assertEqual(resposta.status_code, 201)
+        pedido = Pedido.objects.get(sessao_id='s1')
+        self.assertEqual(str(pedido.total), '32.50')
+        self.assertEqual(sorted(i.subtotal for i in pedido.itens_pedido.all()), [Decimal('8.50'), Decimal('24.00')])
+        self.assertEqual(len(resposta.json()['itens_pedido']), 2)
+
+    def test_numero_de_consultas_nao_depende_dos_itens(self):
+        with CaptureQueriesContext(connection) as um_item:
+            self._criar({'itens': [{'nome': 'tacacá'}]})
+        lista = [{'itens': [{'nome': 'tacacá', 'quantidade': 3}, {'nome': 'açaí'}]} for _ in range(3)]
+        with CaptureQueriesContext(connection) as varios:
+            resposta = self._criar(lista)
+        self.assertEqual(resposta.status_code, 201)
+        self.assertEqual(len(resposta.json()), 3)
+        self.assertEqual(len(varios), len(um_item))
+        self.assertEqual(ItemPedido.objects.count(), 7)
+
+    def test_prato_inexistente_nao_cria_nada(self):
+        resposta = self._criar([
+            {'itens': [{'nome': 'tacacá'}]},
+            {'itens': [{'nome': 'pizza'}]},
+        ])
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(resposta.json()['status'], 'prato_nao_encontrado')
+        self.assertFalse(Pedido.objects.exists())
+
+    def test_itens_vazios(self):
+        self.assertEqual(self._criar({'itens': []}).status_code, 400)
+
+
+class ListagensPaginadasTest(TestCase):
+    """Testes da paginação por cursor das listagens de pedidos e conversas"""
+
+    def setUp(self):
+        Prato.objects.create(
+            nome='Tacacá', categoria='prato_principal', ingredientes='tucumã, jambu, camarão seco',
+            descricao='Servido na cuia', preco='12.00', tempo_preparo='20 minutos'
+        )
+        get_catalogo()
+
+    def _consultas_listando_pedidos(self, quantidade):
+        Pedido.objects.all().delete()
+        self.client.post('/pedidos/', [
+            {'sessao_id': 's1', 'itens': [{'nome': 'tacacá', 'quantidade': 2}] * 3} for _ in range(quantidade)
+        ], content_type='application/json')
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get('/pedidos/listar/', {'sessao_id': 's1', 'limit': 5})
+        self.assertEqual(len(resposta.json()['results']), min(quantidade, 5))
+        if quantidade:
+            self.assertNotIn('itens', resposta.json()['results'][0])
+        return len(consultas)
+
+    def test_pedidos_sem_consultas_por_item(self):
+        self.assertEqual(self._consultas_listando_pedidos(1), self._consultas_listando_pedidos(5))
+
+    def test_sugestoes_em_json_nativo(self):
+        sugestoes = [{'nome': 'Tacacá', 'preco': 12.0}]
+        Conversa.objects.create(
+            sessao_id='s1', mensagem_usuario='oi', resposta_bot='olá', intencao='saudacao', sugestoes=sugestoes
+        )
+        conversa = self.client.get('/conversas/', {'sessao_id': 's1'}).json()['results'][0]
+        self.assertEqual(conversa['sugestoes'], sugestoes)
+        self.assertNotIn('sugestoes_list', conversa)
+
+    def test_conversas_paginadas_por_cursor(self):
+        Conversa.objects.bulk_create([
+            Conversa(sessao_id='s1', mensagem_usuario=f'mensagem {i}', resposta_bot='ok', intencao='conversa')
+            for i in range(5)
+        ])
+        primeira = self.client.get('/conversas/', {'sessao_id': 's1', 'limit': 3}).json()
+        segunda = self.client.get(primeira['next']).json()
+        mensagens = [c['mensagem_usuario'] for c in primeira['results'] + segunda['results']]
+        self.assertEqual(mensagens, [f'mensagem {i}' for i in reversed(range(5))])
+        self.assertIsNone(segunda['next'])
+
+
+class CardapioCondicionalTest(TestCase):
+    """Testes do cache e das requisições condicionais do cardápio"""
+
+    def setUp(self):
+        self.tacaca = Prato.objects.create(
+            nome='Tacacá', categoria='prato_principal', ingredientes='tucumã, jambu, camarão seco',
+            descricao='Servido na cuia', preco='12.00', tempo_preparo='20 minutos'
+        )
+        Prato.objects.create(
+            nome='Açaí', categoria='sobremesa', ingredientes='açaí, farinha de tapioca',
+            descricao='Açaí batido na hora', preco='8.50', tempo_preparo='5 minutos'
+        )
+
+    def test_etag_responde_304_sem_consultas(self):
+        resposta = self.client.get('/cardapio/')
+        self.assertEqual(len(resposta.json()), 2)
+        self.assertNotIn('Last-Modified', resposta)
+        with self.assertNumQueries(0):
+            repetida = self.client.get('/cardapio/', HTTP_IF_NONE_MATCH=resposta['ETag'])
+            self.client.get('/cardapio/')
+        self.assertEqual(repetida.status_code, 304)
+
+    def test_alteracao_de_prato_troca_etag(self):
+        etag = self.client.get('/cardapio/')['ETag']
+        etag_sobremesas = self.client.get('/cardapio/', {'categoria': 'sobremesa'})['ETag']
+        self.tacaca.preco = '13.00'
+        self.tacaca.save()
+        self.assertEqual(self.client.get('/cardapio/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        # A ETag vem do conteúdo: categorias sem alteração continuam válidas
+        sobremesas = self.client.get('/cardapio/', {'categoria': 'sobremesa'}, HTTP_IF_NONE_MATCH=etag_sobremesas)
+        self.assertEqual(sobremesas.status_code, 304)
+        self.assertEqual(self.client.get(f'/cardapio/{self.tacaca.id}/').json()['preco'], '13.00')
+
+    @override_settings(BOT_VERIFICAR_CARDAPIO_S=0)
+    def test_alteracao_em_outro_processo_troca_etag(self):
+        etag = self.client.get(f'/cardapio/{self.tacaca.id}/')['ETag']
+        # Feita fora do ORM, como por outro worker: nenhum signal roda neste processo
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE bot_prato SET preco = 99.5 WHERE id = %s', [self.tacaca.id])
+        resposta = self.client.get(f'/cardapio/{self.tacaca.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['preco'], '99.50')
+
+    def test_exclusao_nao_responde_304_por_data(self):
+        resposta = self.client.get('/cardapio/')
+        self.tacaca.delete()
+        data = http_date(time.time() + 60)
+        self.assertEqual(len(self.client.get('/cardapio/', HTTP_IF_MODIFIED_SINCE=data).json()), 1)
+        self.assertEqual(self.client.get('/cardapio/', HTTP_IF_NONE_MATCH=resposta['ETag']).status_code, 200)
+
+    def test_chaves_do_cache_limitadas(self):
+        cache_cardapio.limpar()
+        self.assertEqual(self.client.get('/cardapio/', {'categoria': 'inexistente'}).json(), [])
+        self.assertEqual(self.client.get('/cardapio/999/').status_code, 404)
+        self.client.get('/cardapio/', {'categoria': 'sobremesa'})
+        self.assertEqual(list(cache_cardapio._respostas), [('lista', 'sobremesa')])
+
+    def test_detalhe_e_categorias(self):
+        detalhe = self.client.get(f'/cardapio/{self.tacaca.id}/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(f'/cardapio/{self.tacaca.id}/', HTTP_IF_NONE_MATCH=detalhe['ETag']).status_code, 304)
+        self.assertEqual(self.client.get('/cardapio/999/').status_code, 404)
+        categorias = self.client.get('/categorias/')
+        self.assertEqual(self.client.get('/categorias/', HTTP_IF_NONE_MATCH=categorias['ETag']).status_code, 304)
+
+
+class ProjecoesTest(TestCase):
+    """Testes das projeções rápidas das listagens"""
+
+    def setUp(self):
+        self.prato = Prato.objects.create(
+            nome='Tacacá', categoria='prato_principal', ingredientes='tucumã, jambu, camarão seco',
+            descricao='Servido na cuia', preco='12.00', tempo_preparo='20 minutos'
+        )
+        Conversa.objects.create(
+            sessao_id='s1', mensagem_usuario='oi', resposta_bot='olá', intencao='saudacao',
+            sugestoes=[{'nome': 'Tacacá', 'preco': 12.0}]
+        )
+        pedido = Pedido.objects.create(sessao_id='s1', total='24.00')
+        ItemPedido.objects.create(pedido=pedido, prato=self.prato, quantidade=2, preco_unitario=Decimal('12.00'))
+        Pedido.objects.create(sessao_id='s1', total='0.00')
+
+    def test_mesma_saida_dos_serializers(self):
+        casos = [
+            (Prato.objects.all(), PratoSerializer, ProjecaoPrato()),
+            (Conversa.objects.all(), ConversaSerializer, ProjecaoConversa()),
+            (Pedido.objects.prefetch_related('itens_pedido__prato'), PedidoSerializer, ProjecaoPedido()),
+        ]
+        for queryset, serializer_class, projecao in casos:
+            with self.subTest(projecao=type(projecao).__name__):
+                esperado = [dict(linha) for linha in serializer_class(queryset, many=True).data]
+                self.assertEqual(projecao.projetar(projecao.consulta(queryset)), esperado)
+
+    def test_listagem_de_pedidos_em_duas_consultas(self):
+        with self.assertNumQueries(2):
+            resposta = self.client.get('/pedidos/listar/')
+        self.assertEqual(resposta.json()['results'][1]['itens_pedido'][0]['prato_nome'], 'Tacacá')
+
+    def test_benchmark(self):
+        saida = StringIO()
+        # A conexão temporária do comando é criada durante o teste e precisa ser liberada nele
+        with CaptureQueriesContext(connection) as consultas, \
+                patch.object(type(self), 'databases', self.databases | {'benchmark_serializacao'}):
+            call_command('benchmark_serializacao', linhas=20, repeticoes=1, pagina=10, stdout=saida, stderr=saida)
+        self.assertIn('linhas/s', saida.getvalue())
+        self.assertNotIn('difere', saida.getvalue())
+        # A massa fica num banco em memória descartado ao final: nada passa pelo banco configurado
+        self.assertEqual(len(consultas), 0)
+        self.assertNotIn('benchmark_serializacao', connections.settings)
+        self.assertEqual(Prato.objects.count(), 1)
+
+
+class CacheRespostasDjangoTest(TestCase):
+    """Testes do cache de respostas do LLM no cache do Django (DatabaseCache), pelos caminhos assíncronos"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('createcachetable', verbosity=0)
+
+    async def test_caminhos_assincronos_nao_bloqueiam_o_event_loop(self):
+        await sync_to_async(get_catalogo)()
+        llm = FakeListChatModel(responses=['Custa R$ 12,00', 'outra resposta'])
+        bot = BotRestauranteParaense(llm=llm, cache_respostas=CacheRespostasLLM(BackendCacheDjango('respostas_llm')))
+        primeira = await bot.aprocessar_mensagem('Qual o preço do tacacá?')
+        partes = [parte async for parte in bot.astream_mensagem('qual o PRECO do tacaca')]
+        self.assertEqual(primeira['status'], 'sucesso')
+        self.assertEqual(partes[-1]['status'], 'sucesso')
+        self.assertEqual(partes[0]['conteudo'], 'Custa R$ 12,00')
+        self.assertEqual(llm.i, 1)
+        self.assertEqual(bot.metricas()['cache_respostas'], {'acertos': 1, 'falhas': 1, 'taxa_acerto': 0.5})
+
+
+class CacheRespostasLLMTest(SimpleTestCase):
+    """Testes do cache de respostas do LLM"""
+
+    def test_mensagens_equivalentes_reaproveitam_resposta(self):
+        llm = FakeListChatModel(responses=['Custa R$ 12,00', 'outra resposta'])
+        bot = BotRestauranteParaense(llm=llm, cache_respostas=CacheRespostasLLM())
+        with patch('bot_langchain.bot_restaurante.get_catalogo', return_value=MenuCatalog(PRATOS_PARAENSES)):
+            primeira = bot.processar_mensagem('Qual o preço do tacacá?')
+            segunda = bot.processar_mensagem('  qual o PRECO do tacaca ')
+        self.assertEqual(segunda['resposta'], primeira['resposta'])
+        self.assertEqual(llm.i, 1)
+        self.assertEqual(bot.metricas()['cache_respostas'], {'acertos': 1, 'falhas': 1, 'taxa_acerto': 0.5})
+
+    def test_backend_memoria_expira_e_descarta_lru(self):
+        backend = BackendMemoria(max_itens=2, ttl=60)
+        backend.guardar('a', '1')
+        backend.guardar('b', '2')
+        backend.obter('a')
+        backend.guardar('c', '3')
+        self.assertIsNone(backend.obter('b'))
+        self.assertEqual(backend.obter('a'), '1')
+        with patch('bot_langchain.cache_respostas.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(backend.obter('a'))
@@ -0,0 +1,38 @@
+# Versão do cardápio compartilhada entre processos: uma linha em bot_versaocardapio que os
+# triggers do SQLite incrementam a cada mudança em bot_prato, inclusive fora do ORM
+# (QuerySet.update, popular_banco, SQL direto, outros workers)
+TABELA_VERSAO = 'bot_versaocardapio'
+
+SQL_CRIAR_GATILHOS = [
+    f"""CREATE TRIGGER IF NOT EXISTS bot_prato_versao_{sufixo} AFTER {operacao} ON bot_prato BEGIN
+        INSERT OR IGNORE INTO {TABELA_VERSAO}(id, versao) VALUES (1, 0);
+        UPDATE {TABELA_VERSAO} SET versao = versao + 1 WHERE id = 1;
+    END"""
+    for sufixo, operacao in (('ai', 'INSERT'), ('au', 'UPDATE'), ('ad', 'DELETE'))
+]
+
+SQL_REMOVER_GATILHOS = [f"DROP TRIGGER IF EXISTS bot_prato_versao_{sufixo}" for sufixo in ('ai', 'au', 'ad')]
+
+
+def gatilhos_disponiveis(connection):
+    """Indica se o banco da conexão mantém a versão por triggers (nos demais, os signals de Prato a incrementam)"""
+    return connection.vendor == 'sqlite'
+
+
+def criar_gatilhos_versao(connection):
+    """Cria os triggers que incrementam a versão do cardápio"""
+    tabelas = connection.introspection.table_names()
+    if not gatilhos_disponiveis(connection) or 'bot_prato' not in tabelas or TABELA_VERSAO not in tabelas:
+        return
+    with connection.cursor() as cursor:
+        for sql in SQL_CRIAR_GATILHOS:
+            cursor.execute(sql)
+
+
+def remover_gatilhos_versao(connection):
+    """Remove os triggers da versão do cardápio"""
+    if not gatilhos_disponiveis(connection):
+        return
+    with connection.cursor() as cursor:
+        for sql in SQL_REMOVER_GATILHOS:
+            cursor.execute(sql)
@@ -3,6 +3,12 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
+from django.db.models import prefetch_related_objects
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from asgiref.sync import sync_to_async
+import json
 import uuid
 import sys
 import os
@@ -10,12 +16,24 @@ import os
 # Adiciona o diretório do bot ao path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from bot_langchain.bot_restaurante_simples import BotRestauranteParaenseSimples
+from pratos_paraenses import get_catalogo
+from .registro_bots import registro_bots
+from .registro_conversas import registro_conversas
+from .cache_cardapio import cache_cardapio
 from .models import Prato, Conversa, Pedido, ItemPedido
 from .serializers import (
     PratoSerializer, ConversaSerializer, PedidoSerializer,
-    BotMensagemSerializer, BotRespostaSerializer, CalcularPedidoSerializer
+    BotMensagemSerializer, BotRespostaSerializer, CalcularPedidoSerializer, CriarPedidoSerializer
 )
+from .servicos import criar_pedidos, PratoNaoEncontrado
+from .paginacao import PaginacaoPedidos, PaginacaoConversas, PaginacaoIntercalada
+from .projecoes import ListagemRapidaMixin, ProjecaoPrato, ProjecaoPedido, ProjecaoConversa
+from .roteador_banco import LeituraSeparadaMixin, shards_conversa
+
+def _intencao_registrada(resultado):
+    """Intenção gravada na conversa; no motor híbrido inclui a rota (ex.: 'llm:duvida')"""
+    rota = resultado.get('rota')
+    return f"{rota}:{resultado['intencao']}" if rota else resultado['intencao']
 
 class BotChatView(APIView):
     """View para interação com o bot"""
@@ -28,21 +46,22 @@ class BotChatView(APIView):
             mensagem = serializer.validated_data['mensagem']
             sessao_id = serializer.validated_data.get('sessao_id', str(uuid.uuid4()))
             
-            # Inicializa o bot
-            bot = BotRestauranteParaenseSimples()
+            # Bot compartilhado do motor configurado em BOT_MOTOR
+            bot = registro_bots.obter()
             
             # Processa a mensagem
-            resultado = bot.processar_mensagem(mensagem)
+            resultado = bot.processar_mensagem(mensagem, sessao_id=sessao_id)
             
-            # Salva a conversa no banco
-            conversa = Conversa.objects.create(
+            # Enfileira a conversa; a gravação em lote acontece fora da requisição
+            conversa = Conversa(
                 sessao_id=sessao_id,
                 mensagem_usuario=mensagem,
                 resposta_bot=resultado['resposta'],
-                intencao=resultado['intencao']
+                resposta_pronta=resultado.get('pronta', False),
+                intencao=_intencao_registrada(resultado)
             )
             conversa.set_sugestoes(resultado.get('sugestoes', []))
-            conversa.save()
+            registro_conversas.registrar(conversa)
             
             # Prepara resposta
             resposta_data = {
@@ -57,56 +76,239 @@ class BotChatView(APIView):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class CardapioListView(generics.ListAPIView):
+async def _carregar_sessao(bot, sessao_id):
+    """Garante o histórico da sessão em memória fora do event loop (na falta ele vem do banco)"""
+    memoria = getattr(bot, 'memoria', None)
+    if memoria is not None:
+        await sync_to_async(memoria.historico)(sessao_id)
+
+@csrf_exempt
+@require_POST
+async def bot_chat_async(request):
+    """Versão assíncrona do chat: sob ASGI o worker atende outras conversas enquanto o LLM responde"""
+    try:
+        dados = json.loads(request.body or b'{}')
+    except json.JSONDecodeError:
+        return JsonResponse({'erro': 'JSON inválido'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    serializer = BotMensagemSerializer(data=dados)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    mensagem = serializer.validated_data['mensagem']
+    sessao_id = serializer.validated_data.get('sessao_id', str(uuid.uuid4()))
+    
+    # Garante o snapshot do cardápio carregado fora do event loop
+    await sync_to_async(get_catalogo)()
+    
+    bot = registro_bots.obter()
+    await _carregar_sessao(bot, sessao_id)
+    resultado = await bot.aprocessar_mensagem(mensagem, sessao_id=sessao_id)
+    
+    # Enfileira a conversa para gravação em lote
+    conversa = Conversa(
+        sessao_id=sessao_id,
+        mensagem_usuario=mensagem,
+        resposta_bot=resultado['resposta'],
+        resposta_pronta=resultado.get('pronta', False),
+        intencao=_intencao_registrada(resultado)
+    )
+    conversa.set_sugestoes(resultado.get('sugestoes', []))
+    await registro_conversas.aregistrar(conversa)
+    
+    return JsonResponse({
+        'resposta': resultado['resposta'],
+        'intencao': resultado['intencao'],
+        'sugestoes': resultado.get('sugestoes', []),
+        'status': resultado['status'],
+        'sessao_id': sessao_id
+    }, json_dumps_params={'ensure_ascii': False})
+
+def _evento_sse(evento, dados):
+    """Formata um evento Server-Sent Events"""
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+@csrf_exempt
+@require_POST
+async def bot_chat_stream(request):
+    """Chat com streaming (SSE): envia os tokens do bot à medida que são gerados"""
+    try:
+        dados = json.loads(request.body or b'{}')
+    except json.JSONDecodeError:
+        return JsonResponse({'erro': 'JSON inválido'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    serializer = BotMensagemSerializer(data=dados)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    mensagem = serializer.validated_data['mensagem']
+    sessao_id = serializer.validated_data.get('sessao_id', str(uuid.uuid4()))
+    
+    await sync_to_async(get_catalogo)()
+    bot = registro_bots.obter()
+    await _carregar_sessao(bot, sessao_id)
+    
+    async def eventos():
+        async for parte in bot.astream_mensagem(mensagem, sessao_id=sessao_id):
+            if parte['tipo'] == 'token':
+                yield _evento_sse('token', {'conteudo': parte['conteudo']})
+                continue
+            
+            # Resposta completa: registra a conversa e envia intenção e sugestões
+            conversa = Conversa(
+                sessao_id=sessao_id,
+                mensagem_usuario=mensagem,
+                resposta_bot=parte['resposta'],
+                resposta_pronta=parte.get('pronta', False),
+                intencao=_intencao_registrada(parte)
+            )
+            conversa.set_sugestoes(parte.get('sugestoes', []))
+            await registro_conversas.aregistrar(conversa)
+            
+            final = {
+                'intencao': parte['intencao'],
+                'sugestoes': parte.get('sugestoes', []),
+                'status': parte['status'],
+                'sessao_id': sessao_id
+            }
+            if parte['status'] != 'sucesso':
+                final['resposta'] = parte['resposta']
+            yield _evento_sse('fim', final)
+    
+    resposta = StreamingHttpResponse(eventos(), content_type='text/event-stream')
+    resposta['Cache-Control'] = 'no-cache'
+    resposta['X-Accel-Buffering'] = 'no'
+    return resposta
+
+class CardapioListView(LeituraSeparadaMixin, ListagemRapidaMixin, generics.ListAPIView):
     """View para listar cardápio"""
     queryset = Prato.objects.filter(disponivel=True)
     serializer_class = PratoSerializer
+    projecao = ProjecaoPrato()
+    categorias_validas = frozenset(valor for valor, _ in Prato.CATEGORIAS)
+    
+    def get(self, request, *args, **kwargs):
+        """Sem busca textual, responde com os bytes guardados da versão atual do cardápio"""
+        categoria = request.query_params.get('categoria', '')
+        # Só categorias conhecidas viram chave do cache; as demais são respondidas sem guardar
+        if request.query_params.get('q') or (categoria and categoria not in self.categorias_validas):
+            return super().get(request, *args, **kwargs)
+        
+        resposta = cache_cardapio.obter(('lista', categoria), lambda: self._montar(categoria))
+        return cache_cardapio.responder(request, resposta)
     
     def get_queryset(self):
         queryset = super().get_queryset()
         categoria = self.request.query_params.get('categoria', None)
+        texto = self.request.query_params.get('q', None)
         
         if categoria:
             queryset = queryset.filter(categoria=categoria)
         
+        if texto:
+            # Busca textual no índice FTS5, ordenada por relevância
+            queryset = queryset.buscar(texto)
+        
         return queryset
+    
+    def _montar(self, categoria):
+        """Dados serializados da listagem, sem Last-Modified"""
+        # Max(atualizado_em) não muda quando um prato é excluído ou fica indisponível: só a ETag valida a lista
+        return self.serializar_lista(self.get_queryset()), None
 
-class PratoDetailView(generics.RetrieveAPIView):
+class PratoDetailView(LeituraSeparadaMixin, generics.RetrieveAPIView):
     """View para detalhes de um prato específico"""
     queryset = Prato.objects.all()
     serializer_class = PratoSerializer
     lookup_field = 'id'
+    
+    def get(self, request, *args, **kwargs):
+        """Responde com os bytes guardados do prato na versão atual do cardápio"""
+        resposta = cache_cardapio.obter(('prato', kwargs['id']), lambda: self._montar(kwargs['id']))
+        if resposta.corpo is None:
+            return Response({'detail': 'Não encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+        return cache_cardapio.responder(request, resposta)
+    
+    def _montar(self, id_prato):
+        """Dados serializados do prato (None se não existir) e a data da última alteração"""
+        prato = self.get_queryset().filter(id=id_prato).first()
+        if prato is None:
+            return None, None
+        return self.get_serializer(prato).data, prato.atualizado_em
 
-class BuscarPratoView(APIView):
-    """View para buscar prato por nome"""
+class BuscarPratoView(LeituraSeparadaMixin, APIView):
+    """View para buscar pratos por nome (em memória) ou por texto livre (índice do banco)"""
+    limite_padrao = 10
+    limite_maximo = 50
     
     def get(self, request):
         nome = request.query_params.get('nome', '')
+        texto = request.query_params.get('q', '')
+        
+        if not nome and not texto:
+            return Response(
+                {'erro': 'Parâmetro nome (ou q) é obrigatório'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        if not nome:
+        try:
+            limit = int(request.query_params.get('limit', self.limite_padrao))
+            offset = int(request.query_params.get('offset', 0))
+            if limit <= 0 or offset < 0:
+                raise ValueError()
+        except ValueError:
             return Response(
-                {'erro': 'Parâmetro nome é obrigatório'},
+                {'erro': 'Parâmetros limit e offset devem ser inteiros positivos'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        limit = min(limit, self.limite_maximo)
         
-        # Inicializa o bot para usar sua função de busca
-        bot = BotRestauranteParaenseSimples()
-        resultado = bot.buscar_prato(nome)
-        
-        if resultado['encontrado']:
-            # Busca o prato no banco de dados
-            try:
-                prato = Prato.objects.get(nome__icontains=nome)
-                serializer = PratoSerializer(prato)
-                return Response({
-                    'encontrado': True,
-                    'prato': serializer.data
-                })
-            except Prato.DoesNotExist:
-                # Se não estiver no banco, retorna dados do bot
-                return Response(resultado)
+        melhor = None
+        if nome:
+            # Índice de trigramas e pratos já serializados no snapshot do cardápio: nenhuma consulta ao banco
+            catalogo = get_catalogo()
+            ranking = catalogo.buscar(nome)
+            total = len(ranking)
+            dados = catalogo.dados_api
+            resultados = [
+                {'prato': dados[key], 'pontuacao': pontuacao}
+                for key, pontuacao in ranking[offset:offset + limit]
+            ]
+            if ranking:
+                melhor = dados[ranking[0][0]]
         else:
-            return Response(resultado)
+            # Descrições e ingredientes: índice FTS5 ranqueado por bm25
+            queryset = Prato.objects.buscar(texto)
+            total = queryset.count()
+            resultados = [
+                {'prato': dados, 'pontuacao': round(-prato.relevancia, 3)}
+                for prato, dados in self._serializar(queryset[offset:offset + limit])
+            ]
+            if total:
+                melhor = resultados[0]['prato'] if offset == 0 else self._melhor_textual(queryset)
+        
+        resposta = {
+            'encontrado': total > 0,
+            'resultados': resultados,
+            'total': total,
+            'limit': limit,
+            'offset': offset,
+        }
+        if melhor is not None:
+            resposta['prato'] = melhor
+        elif not total:
+            resposta['mensagem'] = f"Não encontrei o prato '{nome or texto}' em nosso cardápio."
+            resposta['status'] = 'nao_encontrado'
+        return Response(resposta)
+    
+    def _melhor_textual(self, queryset):
+        """Prato mais relevante da busca textual, independente da página pedida"""
+        return PratoSerializer(queryset[0]).data
+    
+    def _serializar(self, pratos):
+        """Retorna pares (prato, dados serializados)"""
+        pratos = list(pratos)
+        return zip(pratos, PratoSerializer(pratos, many=True).data)
 
 class CalcularPedidoView(APIView):
     """View para calcular total de um pedido"""
@@ -117,8 +319,8 @@ class CalcularPedidoView(APIView):
         if serializer.is_valid():
             itens = serializer.validated_data['itens']
             
-            # Inicializa o bot para calcular
-            bot = BotRestauranteParaenseSimples()
+            # Usa o bot baseado em regras para calcular
+            bot = registro_bots.obter('regras')
             resultado = bot.calcular_pedido(itens)
             
             return Response(resultado, status=status.HTTP_200_OK)
@@ -126,56 +328,40 @@ class CalcularPedidoView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class CriarPedidoView(APIView):
-    """View para criar um novo pedido"""
+    """View para criar um novo pedido (ou uma lista de pedidos, para integrações)"""
     
     def post(self, request):
-        sessao_id = request.data.get('sessao_id', str(uuid.uuid4()))
-        itens = request.data.get('itens', [])
-        observacoes = request.data.get('observacoes', '')
+        varios = isinstance(request.data, list)
+        serializer = CriarPedidoSerializer(data=request.data, many=varios)
         
-        if not itens:
-            return Response(
-                {'erro': 'Lista de itens não pode estar vazia'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        dados_pedidos = serializer.validated_data if varios else [serializer.validated_data]
+        for dados in dados_pedidos:
+            dados.setdefault('sessao_id', str(uuid.uuid4()))
+        
+        try:
+            pedidos = criar_pedidos(dados_pedidos)
+        except PratoNaoEncontrado as e:
+            return Response({
+                "total": 0,
+                "itens": [],
+                "mensagem": str(e),
+                "status": "prato_nao_encontrado"
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Calcula o pedido usando o bot
-        bot = BotRestauranteParaenseSimples()
-        calculo = bot.calcular_pedido(itens)
-        
-        if calculo['status'] != 'sucesso':
-            return Response(calculo, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Cria o pedido
-        pedido = Pedido.objects.create(
-            sessao_id=sessao_id,
-            total=calculo['total'],
-            observacoes=observacoes
-        )
-        pedido.set_itens(calculo['itens'])
-        pedido.save()
-        
-        # Cria os itens do pedido
-        for item_data in calculo['itens']:
-            try:
-                prato = Prato.objects.get(nome=item_data['nome'])
-                ItemPedido.objects.create(
-                    pedido=pedido,
-                    prato=prato,
-                    quantidade=item_data['quantidade'],
-                    preco_unitario=item_data['preco_unitario']
-                )
-            except Prato.DoesNotExist:
-                # Se o prato não existir no banco, continua sem criar o ItemPedido
-                pass
-        
-        serializer = PedidoSerializer(pedido)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-class PedidoListView(generics.ListAPIView):
-    """View para listar pedidos"""
-    queryset = Pedido.objects.all()
+        # Carrega itens e pratos de todos os pedidos em duas consultas
+        prefetch_related_objects(pedidos, 'itens_pedido__prato')
+        serializer = PedidoSerializer(pedidos, many=True)
+        return Response(serializer.data if varios else serializer.data[0], status=status.HTTP_201_CREATED)
+
+class PedidoListView(LeituraSeparadaMixin, ListagemRapidaMixin, generics.ListAPIView):
+    """View para listar pedidos (paginada por cursor)"""
+    queryset = Pedido.objects.prefetch_related('itens_pedido__prato')
     serializer_class = PedidoSerializer
+    pagination_class = PaginacaoPedidos
+    projecao = ProjecaoPedido()
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -188,23 +374,42 @@ class PedidoListView(generics.ListAPIView):
 
 class PedidoDetailView(generics.RetrieveUpdateAPIView):
     """View para detalhes e atualização de pedido"""
-    queryset = Pedido.objects.all()
+    queryset = Pedido.objects.prefetch_related('itens_pedido__prato')
     serializer_class = PedidoSerializer
     lookup_field = 'id'
 
-class ConversaListView(generics.ListAPIView):
-    """View para listar conversas"""
-    queryset = Conversa.objects.all()
+class ConversaListView(LeituraSeparadaMixin, ListagemRapidaMixin, generics.ListAPIView):
+    """View para listar conversas (paginada por cursor)"""
+    queryset = Conversa.objects.select_related('resposta')
     serializer_class = ConversaSerializer
+    pagination_class = PaginacaoConversas
+    projecao = ProjecaoConversa()
+    
+    def list(self, request, *args, **kwargs):
+        """Sem filtro de sessão e com shards, intercala as conversas de todos os shards"""
+        if request.query_params.get('sessao_id') or not shards_conversa():
+            return super().list(request, *args, **kwargs)
+        
+        usar_projecao = self.usar_projecao and self.projecao is not None
+        consultas = self.filter_queryset(self.get_queryset()).por_shard()
+        if usar_projecao:
+            consultas = [self.projecao.consulta(consulta) for consulta in consultas]
+        
+        paginacao = PaginacaoIntercalada()
+        linhas = paginacao.paginar(consultas, request)
+        if usar_projecao:
+            return paginacao.get_paginated_response(self.projecao.projetar(linhas))
+        return paginacao.get_paginated_response(self.get_serializer(linhas, many=True).data)
     
     def get_queryset(self):
         queryset = super().get_queryset()
         sessao_id = self.request.query_params.get('sessao_id', None)
         
         if sessao_id:
-            queryset = queryset.filter(sessao_id=sessao_id)
+            # Com shards, só o banco que guarda a sessão é consultado
+            queryset = queryset.da_sessao(sessao_id)
         
-        return queryset.order_by('-timestamp')[:50]  # Últimas 50 conversas
+        return queryset
 
 @api_view(['GET'])
 def status_api(request):
@@ -215,19 +420,23 @@ def status_api(request):
         'descricao': 'API do Bot Restaurante Paraense',
         'endpoints': {
             'bot_chat': '/api/bot/chat/',
+            'bot_chat_async': '/api/bot/chat/async/',
+            'bot_chat_stream': '/api/bot/chat/stream/',
             'cardapio': '/api/cardapio/',
             'buscar_prato': '/api/buscar-prato/',
             'calcular_pedido': '/api/calcular-pedido/',
             'criar_pedido': '/api/pedidos/',
             'listar_pedidos': '/api/pedidos/',
             'conversas': '/api/conversas/',
-        }
+        },
+        'metricas': registro_bots.metricas(),
+        'registro_conversas': registro_conversas.metricas()
     })
 
 @api_view(['GET'])
 def categorias_pratos(request):
     """Endpoint para listar categorias de pratos"""
-    categorias = Prato.CATEGORIAS
-    return Response({
-        'categorias': [{'valor': cat[0], 'nome': cat[1]} for cat in categorias]
-    })
+    resposta = cache_cardapio.obter(('categorias',), lambda: ({
+        'categorias': [{'valor': cat[0], 'nome': cat[1]} for cat in Prato.CATEGORIAS]
+    }, None))
+    return cache_cardapio.responder(request, resposta)
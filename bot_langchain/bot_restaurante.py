@@ -3,21 +3,38 @@ import json
 from typing import Dict, List, Any
 from langchain_openai import ChatOpenAI
 from langchain.schema import HumanMessage, SystemMessage
-from langchain.prompts import ChatPromptTemplate
+from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.messages import AIMessage
 from langchain.chains import LLMChain
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from pratos_paraenses import PRATOS_PARAENSES, get_pratos_por_categoria, get_prato_por_nome, get_pratos_por_ingrediente, get_pratos_por_preco
+from pratos_paraenses import get_catalogo, get_pratos_por_categoria, get_prato_por_nome, get_pratos_por_ingrediente, get_pratos_por_preco
+from bot_langchain.recuperador import RecuperadorBM25
+from bot_langchain.coalescedor import CoalescedorLLM
+from bot_langchain.resiliencia import ProtecaoLLM
 
 class BotRestauranteParaense:
-    def __init__(self):
+    def __init__(self, llm=None, usar_cache_prompt: bool = True, usar_recuperacao: bool = True,
+                 pratos_no_prompt: int = 4, cache_respostas=None, coalescer: Dict[str, Any] = None,
+                 protecao: Dict[str, Any] = None, bot_reserva=None, memoria=None,
+                 tokens_historico: int = 600):
         """Inicializa o bot com configurações do LangChain"""
-        self.llm = ChatOpenAI(
+        self.llm = llm or ChatOpenAI(
             model="gpt-3.5-turbo",
             temperature=0.7,
             max_tokens=500
         )
         
+        # Cache do cardápio formatado por versão do catálogo
+        self.usar_cache_prompt = usar_cache_prompt
+        # Envia no prompt só os pratos relevantes para a mensagem
+        self.usar_recuperacao = usar_recuperacao
+        self.pratos_no_prompt = pratos_no_prompt
+        self._prompt_por_catalogo = None
+        
+        # Cache de respostas (CacheRespostasLLM) consultado antes de chamar o LLM
+        self.cache_respostas = cache_respostas
+        
         self.system_prompt = """
         Você é um assistente virtual especializado em culinária paraense, trabalhando para uma rede de restaurantes que serve comidas típicas do Pará, Brasil.
 
@@ -40,16 +57,32 @@ class BotRestauranteParaense:
         
         self.prompt_template = ChatPromptTemplate.from_messages([
             ("system", self.system_prompt),
+            MessagesPlaceholder("historico", optional=True),
             ("human", "{user_input}")
         ])
         
         self.chain = self.prompt_template | self.llm
         
-    def _format_pratos_info(self) -> str:
-        """Formata informações dos pratos para o prompt"""
-        pratos_info = []
-        for key, prato in PRATOS_PARAENSES.items():
-            info = f"""
+        # Junta chamadas concorrentes em lotes (ex.: {'max_lote': 8, 'espera_ms': 5}); None chama direto
+        self.coalescedor = CoalescedorLLM(self.chain, **coalescer) if coalescer is not None else None
+        
+        # Limite de chamadas simultâneas, prazo e disjuntor em volta do LLM; None chama sem proteção
+        self.protecao = ProtecaoLLM(**protecao) if protecao is not None else None
+        # Bot que responde quando o LLM falha ou está indisponível (ex.: BotRestauranteParaenseSimples)
+        self.bot_reserva = bot_reserva
+        self.respostas_reserva = {}
+        
+        # Memória das sessões (MemoriaSessoes); o prompt recebe os últimos turnos até tokens_historico
+        self.memoria = memoria
+        self.tokens_historico = tokens_historico
+        
+    def aquecer(self):
+        """Formata o cardápio e monta o índice de recuperação antes da primeira mensagem"""
+        self._dados_prompt(get_catalogo())
+    
+    def _format_prato(self, prato: Dict[str, Any]) -> str:
+        """Formata as informações de um prato para o prompt"""
+        return f"""
             {prato['nome']} ({prato['categoria']}):
             - Ingredientes: {', '.join(prato['ingredientes'])}
             - Descrição: {prato['descricao']}
@@ -57,40 +90,234 @@ class BotRestauranteParaense:
             - Tempo de preparo: {prato['tempo_preparo']}
             - Disponível: {'Sim' if prato['disponivel'] else 'Não'}
             """
-            pratos_info.append(info)
-        return '\n'.join(pratos_info)
     
-    def processar_mensagem(self, mensagem_usuario: str) -> Dict[str, Any]:
+    def _dados_prompt(self, catalogo) -> Dict[str, Any]:
+        """Retorna os blocos formatados e o recuperador da versão atual do catálogo"""
+        atual = self._prompt_por_catalogo
+        if atual is not None and atual['catalogo'] is catalogo:
+            return atual
+        
+        atual = {
+            'catalogo': catalogo,
+            'blocos': {key: self._format_prato(prato) for key, prato in catalogo.pratos.items()},
+            'recuperador': RecuperadorBM25(catalogo.pratos),
+        }
+        atual['completo'] = '\n'.join(atual['blocos'].values())
+        self._prompt_por_catalogo = atual
+        return atual
+    
+    def _format_pratos_info(self, mensagem_usuario: str = None) -> str:
+        """Formata informações dos pratos para o prompt"""
+        catalogo = get_catalogo()
+        if not self.usar_cache_prompt:
+            self._prompt_por_catalogo = None
+        dados = self._dados_prompt(catalogo)
+        
+        if not self.usar_recuperacao or mensagem_usuario is None:
+            return dados['completo']
+        
+        # Só os pratos mais relevantes; sem nenhum relevante, os primeiros do cardápio
+        keys = dados['recuperador'].recuperar(mensagem_usuario, self.pratos_no_prompt)
+        keys = keys or list(dados['blocos'])[:self.pratos_no_prompt]
+        return '\n'.join(dados['blocos'][key] for key in keys)
+    
+    def processar_mensagem(self, mensagem_usuario: str, sessao_id: str = None) -> Dict[str, Any]:
         """Processa a mensagem do usuário e retorna resposta estruturada"""
         try:
-            # Prepara o prompt com informações dos pratos
-            pratos_info = self._format_pratos_info()
+            historico = self._historico(sessao_id)
+            resposta = self._resposta_em_cache(mensagem_usuario, historico)
+            if resposta is None:
+                # Prepara o prompt com informações dos pratos e invoca a chain do LangChain
+                response = self._invocar(self._montar_entrada(mensagem_usuario, historico))
+                resposta = self._guardar_em_cache(mensagem_usuario, historico, response.content)
+            self.lembrar(sessao_id, mensagem_usuario, resposta)
+            return self._montar_resultado(mensagem_usuario, resposta)
             
-            # Invoca a chain do LangChain
-            response = self.chain.invoke({
-                "pratos_info": pratos_info,
-                "user_input": mensagem_usuario
-            })
-            
-            # Analisa a intenção do usuário para fornecer informações extras
-            intencao = self._analisar_intencao(mensagem_usuario)
-            sugestoes = self._gerar_sugestoes(mensagem_usuario, intencao)
-            
-            return {
-                "resposta": response.content,
-                "intencao": intencao,
-                "sugestoes": sugestoes,
-                "status": "sucesso"
-            }
+        except Exception as e:
+            if self.bot_reserva is not None:
+                return self._responder_com_reserva(mensagem_usuario, sessao_id, e)
+            return self._resultado_erro(e)
+    
+    async def aprocessar_mensagem(self, mensagem_usuario: str, sessao_id: str = None) -> Dict[str, Any]:
+        """Versão assíncrona de processar_mensagem: não bloqueia a thread durante a chamada ao LLM"""
+        try:
+            historico = self._historico(sessao_id)
+            resposta = await self._aresposta_em_cache(mensagem_usuario, historico)
+            if resposta is None:
+                response = await self._ainvocar(self._montar_entrada(mensagem_usuario, historico))
+                resposta = await self._aguardar_em_cache(mensagem_usuario, historico, response.content)
+            self.lembrar(sessao_id, mensagem_usuario, resposta)
+            return self._montar_resultado(mensagem_usuario, resposta)
             
         except Exception as e:
-            return {
-                "resposta": "Desculpe, tive um problema para processar sua mensagem. Pode tentar novamente?",
-                "intencao": "erro",
-                "sugestoes": [],
-                "status": "erro",
-                "erro": str(e)
-            }
+            if self.bot_reserva is not None:
+                return self._responder_com_reserva(mensagem_usuario, sessao_id, e)
+            return self._resultado_erro(e)
+    
+    def stream_mensagem(self, mensagem_usuario: str, sessao_id: str = None):
+        """Gera a resposta em partes conforme o LLM produz os tokens; o último item traz o resultado"""
+        partes = []
+        try:
+            historico = self._historico(sessao_id)
+            resposta = self._resposta_em_cache(mensagem_usuario, historico)
+            if resposta is not None:
+                yield {"tipo": "token", "conteudo": resposta}
+            else:
+                for chunk in self._transmitir(self.chain.stream(self._montar_entrada(mensagem_usuario, historico))):
+                    if chunk.content:
+                        partes.append(chunk.content)
+                        yield {"tipo": "token", "conteudo": chunk.content}
+                resposta = self._guardar_em_cache(mensagem_usuario, historico, ''.join(partes))
+            self.lembrar(sessao_id, mensagem_usuario, resposta)
+            resultado = self._montar_resultado(mensagem_usuario, resposta)
+        except Exception as e:
+            # Sem nenhum token enviado ainda, a reserva responde no lugar do LLM
+            if self.bot_reserva is not None and not partes:
+                resultado = self._responder_com_reserva(mensagem_usuario, sessao_id, e)
+                yield {"tipo": "token", "conteudo": resultado["resposta"]}
+            else:
+                resultado = self._resultado_erro(e)
+        yield {"tipo": "fim", **resultado}
+    
+    async def astream_mensagem(self, mensagem_usuario: str, sessao_id: str = None):
+        """Versão assíncrona de stream_mensagem"""
+        partes = []
+        try:
+            historico = self._historico(sessao_id)
+            resposta = await self._aresposta_em_cache(mensagem_usuario, historico)
+            if resposta is not None:
+                yield {"tipo": "token", "conteudo": resposta}
+            else:
+                async for chunk in self._atransmitir(self.chain.astream(self._montar_entrada(mensagem_usuario, historico))):
+                    if chunk.content:
+                        partes.append(chunk.content)
+                        yield {"tipo": "token", "conteudo": chunk.content}
+                resposta = await self._aguardar_em_cache(mensagem_usuario, historico, ''.join(partes))
+            self.lembrar(sessao_id, mensagem_usuario, resposta)
+            resultado = self._montar_resultado(mensagem_usuario, resposta)
+        except Exception as e:
+            if self.bot_reserva is not None and not partes:
+                resultado = self._responder_com_reserva(mensagem_usuario, sessao_id, e)
+                yield {"tipo": "token", "conteudo": resultado["resposta"]}
+            else:
+                resultado = self._resultado_erro(e)
+        yield {"tipo": "fim", **resultado}
+    
+    def lembrar(self, sessao_id: str, mensagem_usuario: str, resposta: str):
+        """Registra o turno na memória da sessão"""
+        if self.memoria is not None and sessao_id:
+            self.memoria.registrar(sessao_id, mensagem_usuario, resposta)
+    
+    def metricas(self) -> Dict[str, Any]:
+        """Métricas do bot (cache de respostas e coalescimento das chamadas)"""
+        metricas = {}
+        if self.cache_respostas is not None:
+            metricas["cache_respostas"] = self.cache_respostas.metricas()
+        if self.coalescedor is not None:
+            metricas["coalescedor"] = self.coalescedor.metricas()
+        if self.protecao is not None:
+            metricas["protecao"] = self.protecao.metricas()
+        if self.bot_reserva is not None:
+            metricas["respostas_reserva"] = dict(self.respostas_reserva)
+        if self.memoria is not None:
+            metricas["memoria"] = self.memoria.metricas()
+        return metricas
+    
+    def _invocar(self, entrada: Dict[str, Any]):
+        """Chama a chain, passando pelo coalescedor e pela proteção quando configurados"""
+        chamar = self.coalescedor.invocar if self.coalescedor is not None else self.chain.invoke
+        if self.protecao is not None:
+            return self.protecao.executar(chamar, entrada)
+        return chamar(entrada)
+    
+    async def _ainvocar(self, entrada: Dict[str, Any]):
+        """Versão assíncrona de _invocar"""
+        chamar = self.coalescedor.ainvocar if self.coalescedor is not None else self.chain.ainvoke
+        if self.protecao is not None:
+            return await self.protecao.aexecutar(chamar, entrada)
+        return await chamar(entrada)
+    
+    def _transmitir(self, partes):
+        """Streaming pela proteção (vaga ocupada e prazo por parte), quando configurada"""
+        return self.protecao.transmitir(partes) if self.protecao is not None else partes
+    
+    def _atransmitir(self, partes):
+        """Versão assíncrona de _transmitir"""
+        return self.protecao.atransmitir(partes) if self.protecao is not None else partes
+    
+    def _responder_com_reserva(self, mensagem_usuario: str, sessao_id: str, erro: Exception) -> Dict[str, Any]:
+        """Responde pelo bot de reserva quando o LLM falhou ou foi recusado pela proteção"""
+        motivo = getattr(erro, 'motivo', 'falha')
+        self.respostas_reserva[motivo] = self.respostas_reserva.get(motivo, 0) + 1
+        resultado = self.bot_reserva.processar_mensagem(mensagem_usuario)
+        resultado["reserva"] = motivo
+        if resultado["status"] == "sucesso":
+            self.lembrar(sessao_id, mensagem_usuario, resultado["resposta"])
+        return resultado
+    
+    def _historico(self, sessao_id: str) -> List[Any]:
+        """Turnos recentes da sessão que cabem no orçamento de tokens, como mensagens do chat"""
+        if self.memoria is None or not sessao_id:
+            return []
+        mensagens = []
+        for mensagem, resposta in self.memoria.janela(sessao_id, self.tokens_historico):
+            mensagens.extend([HumanMessage(content=mensagem), AIMessage(content=resposta)])
+        return mensagens
+    
+    def _resposta_em_cache(self, mensagem_usuario: str, historico: List[Any] = None):
+        """Retorna a resposta guardada para a mensagem, se houver (só sem histórico, que muda o contexto)"""
+        if self.cache_respostas is None or historico:
+            return None
+        return self.cache_respostas.obter(mensagem_usuario, get_catalogo().assinatura)
+    
+    def _guardar_em_cache(self, mensagem_usuario: str, historico: List[Any], resposta: str) -> str:
+        """Guarda a resposta gerada pelo LLM e a devolve"""
+        if self.cache_respostas is not None and resposta and not historico:
+            self.cache_respostas.guardar(mensagem_usuario, get_catalogo().assinatura, resposta)
+        return resposta
+    
+    async def _aresposta_em_cache(self, mensagem_usuario: str, historico: List[Any] = None):
+        """Versão assíncrona de _resposta_em_cache"""
+        if self.cache_respostas is None or historico:
+            return None
+        return await self.cache_respostas.aobter(mensagem_usuario, get_catalogo().assinatura)
+    
+    async def _aguardar_em_cache(self, mensagem_usuario: str, historico: List[Any], resposta: str) -> str:
+        """Versão assíncrona de _guardar_em_cache"""
+        if self.cache_respostas is not None and resposta and not historico:
+            await self.cache_respostas.aguardar(mensagem_usuario, get_catalogo().assinatura, resposta)
+        return resposta
+    
+    def _montar_entrada(self, mensagem_usuario: str, historico: List[Any] = None) -> Dict[str, Any]:
+        """Monta as variáveis do prompt para a mensagem"""
+        return {
+            "pratos_info": self._format_pratos_info(mensagem_usuario),
+            "historico": historico or [],
+            "user_input": mensagem_usuario
+        }
+    
+    def _montar_resultado(self, mensagem_usuario: str, resposta: str) -> Dict[str, Any]:
+        """Monta a resposta estruturada a partir do texto gerado pelo LLM"""
+        # Analisa a intenção do usuário para fornecer informações extras
+        intencao = self._analisar_intencao(mensagem_usuario)
+        sugestoes = self._gerar_sugestoes(mensagem_usuario, intencao)
+        
+        return {
+            "resposta": resposta,
+            "intencao": intencao,
+            "sugestoes": sugestoes,
+            "status": "sucesso"
+        }
+    
+    def _resultado_erro(self, erro: Exception) -> Dict[str, Any]:
+        """Resposta padrão quando a mensagem não pôde ser processada"""
+        return {
+            "resposta": "Desculpe, tive um problema para processar sua mensagem. Pode tentar novamente?",
+            "intencao": "erro",
+            "sugestoes": [],
+            "status": "erro",
+            "erro": str(erro)
+        }
     
     def _analisar_intencao(self, mensagem: str) -> str:
         """Analisa a intenção do usuário baseada na mensagem"""
@@ -116,9 +343,10 @@ class BotRestauranteParaense:
         if intencao == 'sugestao':
             # Sugere pratos populares
             pratos_populares = ['tacacá', 'açaí', 'pato_no_tucumã']
+            pratos = get_catalogo().pratos
             for prato_key in pratos_populares:
-                if prato_key in PRATOS_PARAENSES:
-                    prato = PRATOS_PARAENSES[prato_key]
+                if prato_key in pratos:
+                    prato = pratos[prato_key]
                     sugestoes.append({
                         'nome': prato['nome'],
                         'preco': prato['preco'],
@@ -127,7 +355,7 @@ class BotRestauranteParaense:
         
         elif intencao == 'cardapio':
             # Mostra categorias disponíveis
-            categorias = set(prato['categoria'] for prato in PRATOS_PARAENSES.values())
+            categorias = set(prato['categoria'] for prato in get_catalogo().pratos.values())
             for categoria in categorias:
                 pratos_categoria = get_pratos_por_categoria(categoria)
                 sugestoes.append({
@@ -175,7 +403,7 @@ class BotRestauranteParaense:
                         "status": "categoria_vazia"
                     }
             else:
-                pratos = PRATOS_PARAENSES
+                pratos = get_catalogo().pratos
             
             cardapio = []
             for key, prato in pratos.items():
@@ -218,6 +446,7 @@ class BotRestauranteParaense:
                     total += subtotal
                     
                     itens_calculados.append({
+                        "prato_id": prato.get("id"),
                         "nome": prato["nome"],
                         "preco_unitario": prato["preco"],
                         "quantidade": quantidade,
@@ -0,0 +1,126 @@
+import os
+import threading
+from typing import Dict, Any
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bot_langchain.bot_restaurante_simples import BotRestauranteParaenseSimples
+
+# Intenções que as regras respondem bem quando a classificação é confiável
+INTENCOES_DIRETAS = ('saudacao', 'despedida', 'cardapio', 'preco', 'busca_prato')
+
+# Intenções em que citar um prato conhecido já basta para as regras responderem
+INTENCOES_COM_PRATO = ('preco', 'busca_prato')
+
+
+class BotRestauranteHibrido:
+    def __init__(self, bot_regras=None, bot_llm=None, limiar_confianca: float = 0.6, **opcoes_llm):
+        """Inicializa o roteador: regras primeiro, LLM só para mensagens de baixa confiança"""
+        self.bot_regras = bot_regras or BotRestauranteParaenseSimples()
+        if bot_llm is None:
+            from bot_langchain.bot_restaurante import BotRestauranteParaense
+            bot_llm = BotRestauranteParaense(**opcoes_llm)
+        self.bot_llm = bot_llm
+        self.limiar_confianca = limiar_confianca
+
+        self.rotas = {'regras': 0, 'llm': 0}
+        self._lock = threading.Lock()
+
+    @property
+    def memoria(self):
+        """Memória de sessões do motor LLM (as respostas das regras também são registradas nela)"""
+        return getattr(self.bot_llm, 'memoria', None)
+
+    def aquecer(self):
+        """Aquece os dois motores"""
+        for bot in (self.bot_regras, self.bot_llm):
+            if hasattr(bot, 'aquecer'):
+                bot.aquecer()
+
+    def _rotear(self, mensagem_usuario: str):
+        """Classifica a mensagem e decide qual motor responde"""
+        classificacao = self.bot_regras.classificador.classificar(mensagem_usuario)
+        intencao = classificacao['intencao']
+        direta = intencao in INTENCOES_DIRETAS and (
+            classificacao['confianca'] >= self.limiar_confianca
+            or (classificacao['prato'] is not None and intencao in INTENCOES_COM_PRATO)
+        )
+        rota = 'regras' if direta else 'llm'
+        with self._lock:
+            self.rotas[rota] += 1
+        return classificacao, rota
+
+    def _anotar(self, resultado: Dict[str, Any], classificacao: Dict[str, Any], rota: str) -> Dict[str, Any]:
+        """Acrescenta a rota e a classificação das regras ao resultado"""
+        if resultado.get('status') == 'sucesso':
+            resultado['intencao'] = classificacao['intencao']
+        resultado['confianca'] = classificacao['confianca']
+        resultado['rota'] = rota
+        return resultado
+
+    def _responder_por_regras(self, mensagem_usuario: str, classificacao: Dict[str, Any], sessao_id: str):
+        """Resposta das regras, registrada na memória para dar contexto a um próximo turno no LLM"""
+        resultado = self.bot_regras.responder(mensagem_usuario, classificacao)
+        if hasattr(self.bot_llm, 'lembrar'):
+            self.bot_llm.lembrar(sessao_id, mensagem_usuario, resultado['resposta'])
+        return resultado
+
+    def processar_mensagem(self, mensagem_usuario: str, sessao_id: str = None) -> Dict[str, Any]:
+        """Processa a mensagem do usuário e retorna resposta estruturada"""
+        classificacao, rota = self._rotear(mensagem_usuario)
+        if rota == 'regras':
+            resultado = self._responder_por_regras(mensagem_usuario, classificacao, sessao_id)
+        else:
+            resultado = self.bot_llm.processar_mensagem(mensagem_usuario, sessao_id=sessao_id)
+        return self._anotar(resultado, classificacao, rota)
+
+    async def aprocessar_mensagem(self, mensagem_usuario: str, sessao_id: str = None) -> Dict[str, Any]:
+        """Versão assíncrona de processar_mensagem"""
+        classificacao, rota = self._rotear(mensagem_usuario)
+        if rota == 'regras':
+            resultado = self._responder_por_regras(mensagem_usuario, classificacao, sessao_id)
+        else:
+            resultado = await self.bot_llm.aprocessar_mensagem(mensagem_usuario, sessao_id=sessao_id)
+        return self._anotar(resultado, classificacao, rota)
+
+    def stream_mensagem(self, mensagem_usuario: str, sessao_id: str = None):
+        """Gera a resposta em partes; o último item traz o resultado com a rota"""
+        classificacao, rota = self._rotear(mensagem_usuario)
+        if rota == 'regras':
+            resultado = self._responder_por_regras(mensagem_usuario, classificacao, sessao_id)
+            yield {"tipo": "token", "conteudo": resultado["resposta"]}
+            yield {"tipo": "fim", **self._anotar(resultado, classificacao, rota)}
+            return
+
+        for parte in self.bot_llm.stream_mensagem(mensagem_usuario, sessao_id=sessao_id):
+            yield self._anotar(parte, classificacao, rota) if parte['tipo'] == 'fim' else parte
+
+    async def astream_mensagem(self, mensagem_usuario: str, sessao_id: str = None):
+        """Versão assíncrona de stream_mensagem"""
+        classificacao, rota = self._rotear(mensagem_usuario)
+        if rota == 'regras':
+            resultado = self._responder_por_regras(mensagem_usuario, classificacao, sessao_id)
+            yield {"tipo": "token", "conteudo": resultado["resposta"]}
+            yield {"tipo": "fim", **self._anotar(resultado, classificacao, rota)}
+            return
+
+        async for parte in self.bot_llm.astream_mensagem(mensagem_usuario, sessao_id=sessao_id):
+            yield self._anotar(parte, classificacao, rota) if parte['tipo'] == 'fim' else parte
+
+    def metricas(self) -> Dict[str, Any]:
+        """Quantidade de mensagens por rota e métricas do LLM"""
+        metricas = {"rotas": dict(self.rotas)}
+        if hasattr(self.bot_llm, 'metricas'):
+            metricas.update(self.bot_llm.metricas())
+        return metricas
+
+    def buscar_prato(self, nome_prato: str) -> Dict[str, Any]:
+        """Busca informações específicas de um prato"""
+        return self.bot_regras.buscar_prato(nome_prato)
+
+    def listar_cardapio(self, categoria: str = None) -> Dict[str, Any]:
+        """Lista o cardápio completo ou por categoria"""
+        return self.bot_regras.listar_cardapio(categoria)
+
+    def calcular_pedido(self, itens_pedido):
+        """Calcula o total de um pedido"""
+        return self.bot_regras.calcular_pedido(itens_pedido)
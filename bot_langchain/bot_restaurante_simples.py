@@ -1,10 +1,19 @@
 import os
 import json
 import re
+import threading
+from collections import OrderedDict
 from typing import Dict, List, Any
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from pratos_paraenses import PRATOS_PARAENSES, get_pratos_por_categoria, get_prato_por_nome, get_pratos_por_ingrediente, get_pratos_por_preco
+from pratos_paraenses import get_catalogo, get_pratos_por_categoria, get_prato_por_nome, get_pratos_por_ingrediente, get_pratos_por_preco
+from bot_langchain.classificador_intencao import ClassificadorIntencao
+
+# Intenções cuja resposta depende apenas do cardápio
+INTENCOES_DO_CARDAPIO = ('cardapio', 'preco')
+
+# Quantidade de versões do cardápio mantidas no cache de respostas
+MAX_VERSOES_CACHE = 4
 
 class BotRestauranteParaenseSimples:
     def __init__(self):
@@ -21,26 +30,33 @@ class BotRestauranteParaenseSimples:
             "Até mais! Que tal experimentar nossos pratos na próxima?"
         ]
         
-    def processar_mensagem(self, mensagem_usuario: str) -> Dict[str, Any]:
-        """Processa a mensagem do usuário e retorna resposta estruturada"""
+        # Classificador compilado uma vez por versão do catálogo
+        self._classificador_por_catalogo = None
+        
+        # Respostas renderizadas por versão do catálogo
+        self._cache_respostas = OrderedDict()
+        self._lock_cache = threading.Lock()
+        
+    @property
+    def classificador(self) -> ClassificadorIntencao:
+        """Retorna o classificador do catálogo ativo, recompilando se o cardápio mudou"""
+        catalogo = get_catalogo()
+        atual = self._classificador_por_catalogo
+        if atual is None or atual[0] is not catalogo:
+            atual = (catalogo, ClassificadorIntencao(catalogo.pratos))
+            self._classificador_por_catalogo = atual
+        return atual[1]
+    
+    def aquecer(self):
+        """Carrega o catálogo ativo, compila o classificador e pré-renderiza as respostas"""
+        self.classificador
+        self._respostas_do_cardapio(get_catalogo())
+    
+    def processar_mensagem(self, mensagem_usuario: str, sessao_id: str = None) -> Dict[str, Any]:
+        """Processa a mensagem do usuário e retorna resposta estruturada (as regras não usam a sessão)"""
         try:
-            mensagem_lower = mensagem_usuario.lower()
-            
-            # Analisa a intenção do usuário
-            intencao = self._analisar_intencao(mensagem_usuario)
-            
-            # Gera resposta baseada na intenção
-            resposta = self._gerar_resposta(mensagem_usuario, intencao)
-            
-            # Gera sugestões
-            sugestoes = self._gerar_sugestoes(mensagem_usuario, intencao)
-            
-            return {
-                "resposta": resposta,
-                "intencao": intencao,
-                "sugestoes": sugestoes,
-                "status": "sucesso"
-            }
+            # Analisa a intenção do usuário em uma única passada
+            return self.responder(mensagem_usuario, self.classificador.classificar(mensagem_usuario))
             
         except Exception as e:
             return {
@@ -51,54 +67,54 @@ class BotRestauranteParaenseSimples:
                 "erro": str(e)
             }
     
-    def _analisar_intencao(self, mensagem: str) -> str:
-        """Analisa a intenção do usuário baseada na mensagem"""
-        mensagem_lower = mensagem.lower()
-        
-        # Saudações
-        if any(palavra in mensagem_lower for palavra in ['oi', 'olá', 'ola', 'bom dia', 'boa tarde', 'boa noite', 'salve']):
-            return 'saudacao'
-        
-        # Despedidas
-        elif any(palavra in mensagem_lower for palavra in ['tchau', 'até', 'obrigado', 'valeu', 'bye']):
-            return 'despedida'
-        
-        # Sugestões
-        elif any(palavra in mensagem_lower for palavra in ['sugerir', 'recomendar', 'indicar', 'o que', 'qual']):
-            return 'sugestao'
+    def responder(self, mensagem_usuario: str, classificacao: Dict[str, Any]) -> Dict[str, Any]:
+        """Monta a resposta para uma mensagem já classificada"""
+        intencao = classificacao['intencao']
         
-        # Informações sobre pratos
-        elif any(palavra in mensagem_lower for palavra in ['ingrediente', 'feito', 'como', 'receita', 'preparo']):
-            return 'informacao'
+        # Gera resposta baseada na intenção
+        resposta = self._gerar_resposta(mensagem_usuario, intencao, classificacao['prato'])
         
-        # Preços
-        elif any(palavra in mensagem_lower for palavra in ['preço', 'custa', 'valor', 'quanto']):
-            return 'preco'
+        # Gera sugestões
+        sugestoes = self._gerar_sugestoes(mensagem_usuario, intencao)
         
-        # Pedidos
-        elif any(palavra in mensagem_lower for palavra in ['pedir', 'quero', 'comprar', 'pedido']):
-            return 'pedido'
-        
-        # Cardápio
-        elif any(palavra in mensagem_lower for palavra in ['cardápio', 'cardapio', 'menu', 'pratos', 'opções', 'opcoes']):
-            return 'cardapio'
-        
-        # Busca por prato específico
-        elif self._encontrar_prato_na_mensagem(mensagem):
-            return 'busca_prato'
-        
-        else:
-            return 'conversa'
+        return {
+            "resposta": resposta,
+            "intencao": intencao,
+            "confianca": classificacao['confianca'],
+            "sugestoes": sugestoes,
+            "status": "sucesso",
+            # Resposta de modelo fixo, que se repete entre conversas (o registro a guarda uma vez)
+            "pronta": True
+        }
+    
+    async def aprocessar_mensagem(self, mensagem_usuario: str, sessao_id: str = None) -> Dict[str, Any]:
+        """Versão assíncrona de processar_mensagem (as regras não fazem I/O)"""
+        return self.processar_mensagem(mensagem_usuario)
+    
+    def stream_mensagem(self, mensagem_usuario: str, sessao_id: str = None):
+        """Interface de streaming: a resposta inteira em uma parte, seguida do resultado"""
+        resultado = self.processar_mensagem(mensagem_usuario)
+        yield {"tipo": "token", "conteudo": resultado["resposta"]}
+        yield {"tipo": "fim", **resultado}
+    
+    async def astream_mensagem(self, mensagem_usuario: str, sessao_id: str = None):
+        """Versão assíncrona de stream_mensagem"""
+        for parte in self.stream_mensagem(mensagem_usuario):
+            yield parte
+    
+    def processar_mensagens(self, mensagens: List[str]) -> List[Dict[str, Any]]:
+        """Processa um lote de mensagens reaproveitando o classificador compilado"""
+        return [self.processar_mensagem(mensagem) for mensagem in mensagens]
+    
+    def _analisar_intencao(self, mensagem: str) -> str:
+        """Analisa a intenção do usuário baseada na mensagem"""
+        return self.classificador.classificar(mensagem)['intencao']
     
     def _encontrar_prato_na_mensagem(self, mensagem: str) -> str:
         """Encontra nome de prato na mensagem"""
-        mensagem_lower = mensagem.lower()
-        for key, prato in PRATOS_PARAENSES.items():
-            if prato['nome'].lower() in mensagem_lower or key in mensagem_lower:
-                return key
-        return None
+        return self.classificador.classificar(mensagem)['prato']
     
-    def _gerar_resposta(self, mensagem: str, intencao: str) -> str:
+    def _gerar_resposta(self, mensagem: str, intencao: str, prato_key: str = None) -> str:
         """Gera resposta baseada na intenção"""
         
         if intencao == 'saudacao':
@@ -107,21 +123,13 @@ class BotRestauranteParaenseSimples:
         elif intencao == 'despedida':
             return "Muito obrigado pela visita! Volte sempre para saborear nossa deliciosa culinária paraense. Até logo! 😊"
         
-        elif intencao == 'cardapio':
-            pratos_principais = get_pratos_por_categoria('prato principal')
-            sobremesas = get_pratos_por_categoria('sobremesa')
-            
-            resposta = "🍽️ **Nosso Cardápio Paraense:**\n\n"
-            resposta += "**Pratos Principais:**\n"
-            for key, prato in list(pratos_principais.items())[:4]:
-                resposta += f"• {prato['nome']} - R$ {prato['preco']:.2f}\n"
-            
-            resposta += "\n**Sobremesas:**\n"
-            for key, prato in list(sobremesas.items())[:2]:
-                resposta += f"• {prato['nome']} - R$ {prato['preco']:.2f}\n"
-            
-            resposta += "\nQuer saber mais sobre algum prato específico?"
-            return resposta
+        elif intencao == 'preco' and prato_key in get_catalogo().pratos:
+            prato = get_catalogo().pratos[prato_key]
+            return f"💰 **{prato['nome']}** sai por R$ {prato['preco']:.2f}.\n\nQuer que eu anote no seu pedido? 😋"
+        
+        elif intencao in INTENCOES_DO_CARDAPIO:
+            # Resposta depende só do cardápio: servida do cache da versão atual
+            return self._respostas_do_cardapio(get_catalogo())['respostas'][intencao]
         
         elif intencao == 'sugestao':
             return """🌟 **Minhas recomendações especiais:**
@@ -134,24 +142,10 @@ class BotRestauranteParaenseSimples:
 
 Qual desses desperta seu interesse? Posso contar mais detalhes sobre qualquer um! 😋"""
         
-        elif intencao == 'preco':
-            resposta = "💰 **Nossos preços:**\n\n"
-            resposta += "**Opções econômicas (até R$ 15):**\n"
-            pratos_economicos = get_pratos_por_preco(15.00)
-            for key, prato in list(pratos_economicos.items())[:3]:
-                resposta += f"• {prato['nome']} - R$ {prato['preco']:.2f}\n"
-            
-            resposta += "\n**Pratos especiais:**\n"
-            pratos_especiais = {k: v for k, v in PRATOS_PARAENSES.items() if v['preco'] > 15}
-            for key, prato in list(pratos_especiais.items())[:3]:
-                resposta += f"• {prato['nome']} - R$ {prato['preco']:.2f}\n"
-            
-            return resposta
-        
         elif intencao == 'busca_prato':
-            prato_key = self._encontrar_prato_na_mensagem(mensagem)
+            prato_key = prato_key or self._encontrar_prato_na_mensagem(mensagem)
             if prato_key:
-                prato = PRATOS_PARAENSES[prato_key]
+                prato = get_catalogo().pratos[prato_key]
                 resposta = f"🍽️ **{prato['nome']}**\n\n"
                 resposta += f"📝 {prato['descricao']}\n\n"
                 resposta += f"🥘 **Ingredientes:** {', '.join(prato['ingredientes'])}\n"
@@ -198,14 +192,76 @@ O que você gostaria de saber sobre nossa deliciosa comida paraense?"""
     
     def _gerar_sugestoes(self, mensagem: str, intencao: str) -> List[Dict[str, Any]]:
         """Gera sugestões baseadas na mensagem e intenção"""
+        sugestoes = self._respostas_do_cardapio(get_catalogo())['sugestoes']
+        return list(sugestoes.get(intencao, []))
+    
+    def _respostas_do_cardapio(self, catalogo) -> Dict[str, Any]:
+        """Retorna respostas e sugestões pré-renderizadas para a versão do cardápio"""
+        with self._lock_cache:
+            entrada = self._cache_respostas.get(catalogo.versao)
+            if entrada is not None and entrada['catalogo'] is catalogo:
+                self._cache_respostas.move_to_end(catalogo.versao)
+                return entrada
+        
+        entrada = {
+            'catalogo': catalogo,
+            'respostas': {
+                'cardapio': self._renderizar_cardapio(catalogo),
+                'preco': self._renderizar_precos(catalogo),
+            },
+            'sugestoes': {
+                intencao: self._montar_sugestoes(catalogo, intencao)
+                for intencao in ('sugestao', 'cardapio', 'preco')
+            },
+        }
+        with self._lock_cache:
+            self._cache_respostas[catalogo.versao] = entrada
+            while len(self._cache_respostas) > MAX_VERSOES_CACHE:
+                self._cache_respostas.popitem(last=False)
+        return entrada
+    
+    def _renderizar_cardapio(self, catalogo) -> str:
+        """Monta a resposta da intenção 'cardapio'"""
+        pratos_principais = catalogo.por_categoria('prato principal')
+        sobremesas = catalogo.por_categoria('sobremesa')
+        
+        resposta = "🍽️ **Nosso Cardápio Paraense:**\n\n"
+        resposta += "**Pratos Principais:**\n"
+        for key, prato in list(pratos_principais.items())[:4]:
+            resposta += f"• {prato['nome']} - R$ {prato['preco']:.2f}\n"
+        
+        resposta += "\n**Sobremesas:**\n"
+        for key, prato in list(sobremesas.items())[:2]:
+            resposta += f"• {prato['nome']} - R$ {prato['preco']:.2f}\n"
+        
+        resposta += "\nQuer saber mais sobre algum prato específico?"
+        return resposta
+    
+    def _renderizar_precos(self, catalogo) -> str:
+        """Monta a resposta da intenção 'preco'"""
+        resposta = "💰 **Nossos preços:**\n\n"
+        resposta += "**Opções econômicas (até R$ 15):**\n"
+        pratos_economicos = catalogo.por_faixa_preco(preco_max=15.00)
+        for key, prato in list(pratos_economicos.items())[:3]:
+            resposta += f"• {prato['nome']} - R$ {prato['preco']:.2f}\n"
+        
+        resposta += "\n**Pratos especiais:**\n"
+        pratos_especiais = {k: v for k, v in catalogo.pratos.items() if v['preco'] > 15}
+        for key, prato in list(pratos_especiais.items())[:3]:
+            resposta += f"• {prato['nome']} - R$ {prato['preco']:.2f}\n"
+        
+        return resposta
+    
+    def _montar_sugestoes(self, catalogo, intencao: str) -> List[Dict[str, Any]]:
+        """Monta a lista de sugestões de uma intenção a partir do cardápio"""
         sugestoes = []
         
         if intencao == 'sugestao' or intencao == 'cardapio':
             # Sugere pratos populares
             pratos_populares = ['tacacá', 'açaí', 'pato_no_tucumã']
             for prato_key in pratos_populares:
-                if prato_key in PRATOS_PARAENSES:
-                    prato = PRATOS_PARAENSES[prato_key]
+                if prato_key in catalogo.pratos:
+                    prato = catalogo.pratos[prato_key]
                     sugestoes.append({
                         'nome': prato['nome'],
                         'preco': prato['preco'],
@@ -214,7 +270,7 @@ O que você gostaria de saber sobre nossa deliciosa comida paraense?"""
         
         elif intencao == 'preco':
             # Sugere pratos por faixa de preço
-            pratos_economicos = get_pratos_por_preco(15.00)
+            pratos_economicos = catalogo.por_faixa_preco(preco_max=15.00)
             for key, prato in list(pratos_economicos.items())[:3]:
                 sugestoes.append({
                     'nome': prato['nome'],
@@ -252,7 +308,7 @@ O que você gostaria de saber sobre nossa deliciosa comida paraense?"""
                         "status": "categoria_vazia"
                     }
             else:
-                pratos = PRATOS_PARAENSES
+                pratos = get_catalogo().pratos
             
             cardapio = []
             for key, prato in pratos.items():
@@ -295,6 +351,7 @@ O que você gostaria de saber sobre nossa deliciosa comida paraense?"""
                     total += subtotal
                     
                     itens_calculados.append({
+                        "prato_id": prato.get("id"),
                         "nome": prato["nome"],
                         "preco_unitario": prato["preco"],
                         "quantidade": quantidade,
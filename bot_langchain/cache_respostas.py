@@ -0,0 +1,103 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pratos_paraenses import normalizar_texto
+
+
+class BackendMemoria:
+    """Backend do cache em memória do processo, com expiração por TTL e descarte LRU"""
+
+    def __init__(self, max_itens: int = 1000, ttl: float = 3600):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave: str) -> Optional[str]:
+        """Retorna o valor guardado ou None se ausente/expirado"""
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            valor, expira_em = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave: str, valor: str):
+        """Guarda o valor, descartando os itens menos usados além do limite"""
+        with self._lock:
+            self._itens[chave] = (valor, time.monotonic() + self.ttl)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    async def aobter(self, chave: str) -> Optional[str]:
+        """Versão assíncrona de obter (em memória, sem I/O)"""
+        return self.obter(chave)
+
+    async def aguardar(self, chave: str, valor: str):
+        """Versão assíncrona de guardar (em memória, sem I/O)"""
+        self.guardar(chave, valor)
+
+    def limpar(self):
+        """Remove todos os itens"""
+        with self._lock:
+            self._itens.clear()
+
+
+class CacheRespostasLLM:
+    """Cache das respostas do LLM chaveado pela mensagem normalizada e pelo cardápio"""
+
+    def __init__(self, backend=None):
+        self.backend = backend or BackendMemoria()
+        self.acertos = 0
+        self.falhas = 0
+        self._lock = threading.Lock()
+
+    def chave(self, mensagem: str, assinatura_catalogo: str) -> str:
+        """Gera a chave: sem acentos, caixa, pontuação ou espaços extras"""
+        texto = ' '.join(re.findall(r'\w+', normalizar_texto(mensagem)))
+        return 'llm:' + hashlib.sha1(f"{assinatura_catalogo}:{texto}".encode('utf-8')).hexdigest()
+
+    def obter(self, mensagem: str, assinatura_catalogo: str) -> Optional[str]:
+        """Retorna a resposta guardada para a mensagem, contabilizando acerto ou falha"""
+        return self._contar(self.backend.obter(self.chave(mensagem, assinatura_catalogo)))
+
+    async def aobter(self, mensagem: str, assinatura_catalogo: str) -> Optional[str]:
+        """Versão assíncrona de obter: backends com I/O (ex.: cache do Django) não bloqueiam o event loop"""
+        return self._contar(await self.backend.aobter(self.chave(mensagem, assinatura_catalogo)))
+
+    def guardar(self, mensagem: str, assinatura_catalogo: str, resposta: str):
+        """Guarda a resposta gerada pelo LLM"""
+        self.backend.guardar(self.chave(mensagem, assinatura_catalogo), resposta)
+
+    async def aguardar(self, mensagem: str, assinatura_catalogo: str, resposta: str):
+        """Versão assíncrona de guardar"""
+        await self.backend.aguardar(self.chave(mensagem, assinatura_catalogo), resposta)
+
+    def _contar(self, resposta: Optional[str]) -> Optional[str]:
+        """Contabiliza acerto ou falha e devolve a resposta"""
+        with self._lock:
+            if resposta is None:
+                self.falhas += 1
+            else:
+                self.acertos += 1
+        return resposta
+
+    def metricas(self) -> Dict[str, Any]:
+        """Contadores de acertos e falhas do cache"""
+        total = self.acertos + self.falhas
+        return {
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "taxa_acerto": round(self.acertos / total, 3) if total else 0.0,
+        }
@@ -0,0 +1,113 @@
+import os
+import re
+from typing import Dict, List, Any
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pratos_paraenses import normalizar_texto
+
+# Palavras-chave por intenção, em ordem de prioridade (usada para desempate).
+# Um "*" no final aceita qualquer sufixo a partir do radical (plural, conjugação).
+PALAVRAS_CHAVE = [
+    ('saudacao', ['oi', 'ola', 'bom dia', 'boa tarde', 'boa noite', 'salve']),
+    ('despedida', ['tchau', 'ate logo', 'ate mais', 'ate breve', 'ate a proxima', 'obrigad*', 'valeu', 'bye']),
+    ('sugestao', ['suger*', 'sugest*', 'recomend*', 'indic*', 'o que', 'qual']),
+    ('informacao', ['ingrediente*', 'feito*', 'feita*', 'como', 'receita*', 'preparo']),
+    ('preco', ['preco*', 'cust*', 'valor*', 'quanto']),
+    ('pedido', ['pedir', 'pedido*', 'quero', 'queria', 'compr*']),
+    ('cardapio', ['cardapio*', 'menu*', 'pratos', 'opcoes']),
+]
+
+# Palavras genéricas demais para decidir sozinhas a intenção
+PALAVRAS_FRACAS = {'o que', 'qual', 'como', 'quanto'}
+PESO_FRACO = 0.5
+
+PALAVRA = re.compile(r'\w+')
+
+INTENCAO_PRATO = 'busca_prato'
+INTENCAO_PADRAO = 'conversa'
+
+
+def _padrao_palavra(palavra: str) -> str:
+    """Converte uma palavra-chave em padrão de expressão regular"""
+    radical = palavra[:-1] if palavra.endswith('*') else palavra
+    padrao = r'\s+'.join(re.escape(parte) for parte in radical.split())
+    return padrao + r'\w*' if palavra.endswith('*') else padrao
+
+
+class ClassificadorIntencao:
+    """Classifica intenções sobre o texto normalizado: pratos por n-gramas, palavras-chave por uma regex compilada"""
+
+    def __init__(self, pratos: Dict[str, Dict[str, Any]], palavras_chave: List = None):
+        palavras_chave = palavras_chave or PALAVRAS_CHAVE
+        self.prioridade = {intencao: ordem for ordem, (intencao, _) in enumerate(palavras_chave)}
+        self.prioridade[INTENCAO_PRATO] = len(palavras_chave)
+
+        # Nomes e chaves dos pratos, já em palavras normalizadas, apontando para a chave do prato;
+        # a mensagem é quebrada em palavras uma vez e cada n-grama vira uma consulta ao dicionário,
+        # em vez de uma alternação com todos os apelidos que cresce com o cardápio
+        self.apelidos_pratos = {}
+        for key, prato in pratos.items():
+            for apelido in (prato['nome'], key.replace('_', ' ')):
+                palavras = tuple(PALAVRA.findall(normalizar_texto(apelido)))
+                if palavras:
+                    self.apelidos_pratos.setdefault(palavras, key)
+        self.maior_apelido = max(map(len, self.apelidos_pratos), default=0)
+
+        grupos = []
+        for intencao, palavras in palavras_chave:
+            palavras = sorted(palavras, key=len, reverse=True)
+            grupos.append(f"(?P<{intencao}>{'|'.join(_padrao_palavra(p) for p in palavras)})")
+
+        self.padrao = re.compile(r'\b(?:' + '|'.join(grupos) + r')\b')
+
+    def classificar(self, mensagem: str) -> Dict[str, Any]:
+        """Retorna intenção, confiança e prato mencionado em uma única passada"""
+        texto = normalizar_texto(mensagem)
+        pontuacao = {}
+        pratos, restante = self._pratos_mencionados(texto)
+        if pratos:
+            pontuacao[INTENCAO_PRATO] = float(len(pratos))
+
+        for ocorrencia in self.padrao.finditer(restante):
+            intencao = ocorrencia.lastgroup
+            trecho = ' '.join(ocorrencia.group().split())
+            peso = PESO_FRACO if trecho in PALAVRAS_FRACAS else 1.0
+            pontuacao[intencao] = pontuacao.get(intencao, 0.0) + peso
+
+        if not pontuacao:
+            return {"intencao": INTENCAO_PADRAO, "confianca": 0.0, "prato": None}
+
+        intencao = min(pontuacao, key=lambda i: (-pontuacao[i], self.prioridade[i]))
+        return {
+            "intencao": intencao,
+            "confianca": round(pontuacao[intencao] / sum(pontuacao.values()), 2),
+            "prato": pratos[0] if pratos else None,
+        }
+
+    def _pratos_mencionados(self, texto: str):
+        """Pratos citados no texto (o apelido mais longo em cada posição) e o texto sem esses trechos"""
+        palavras = list(PALAVRA.finditer(texto))
+        pratos, trechos, inicio, i = [], [], 0, 0
+        while i < len(palavras):
+            # Um apelido só atravessa espaços, não pontuação ("vatapá! paraense" não é o vatapá paraense)
+            alcance = 1
+            while (alcance < self.maior_apelido and i + alcance < len(palavras)
+                   and texto[palavras[i + alcance - 1].end():palavras[i + alcance].start()].isspace()):
+                alcance += 1
+            for n in range(alcance, 0, -1):
+                key = self.apelidos_pratos.get(tuple(p.group() for p in palavras[i:i + n]))
+                if key is not None:
+                    pratos.append(key)
+                    trechos.append(texto[inicio:palavras[i].start()])
+                    inicio = palavras[i + n - 1].end()
+                    i += n
+                    break
+            else:
+                i += 1
+        trechos.append(texto[inicio:])
+        # O separador impede que palavras-chave de várias palavras se formem por cima de um prato
+        return pratos, ' | '.join(trechos)
+
+    def classificar_lote(self, mensagens: List[str]) -> List[Dict[str, Any]]:
+        """Classifica uma lista de mensagens reaproveitando o padrão compilado"""
+        return [self.classificar(mensagem) for mensagem in mensagens]
@@ -0,0 +1,102 @@
+import json
+import time
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any
+
+
+class CoalescedorLLM:
+    """Junta chamadas concorrentes ao LLM: entradas idênticas em voo compartilham um único
+    resultado e entradas distintas que chegam juntas são enviadas num só chain.batch"""
+
+    def __init__(self, runnable, max_lote: int = 8, espera_ms: float = 5, lotes_simultaneos: int = 4):
+        self.runnable = runnable
+        self.max_lote = max_lote
+        self.espera = espera_ms / 1000
+
+        # Entradas aguardando despacho, na ordem de chegada, e futuros em voo por chave
+        self._pendentes = []
+        self._em_voo = {}
+        self._condicao = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=lotes_simultaneos, thread_name_prefix='coalescedor-llm')
+        self._despachante = None
+
+        self.chamadas = 0
+        self.coalescidas = 0
+        self.lotes = 0
+
+    def invocar(self, entrada: Dict[str, Any]):
+        """Equivalente a runnable.invoke, bloqueando até o resultado do lote"""
+        return self.enviar(entrada).result()
+
+    async def ainvocar(self, entrada: Dict[str, Any]):
+        """Equivalente a runnable.ainvoke, sem bloquear o event loop enquanto o lote roda"""
+        # O futuro é compartilhado pelas chamadas coalescidas: cancelar esta espera (prazo,
+        # cliente desconectado) não pode cancelá-lo para as outras
+        return await asyncio.shield(asyncio.wrap_future(self.enviar(entrada)))
+
+    def enviar(self, entrada: Dict[str, Any]) -> Future:
+        """Enfileira a entrada e retorna o futuro com a resposta do LLM"""
+        chave = json.dumps(entrada, sort_keys=True, ensure_ascii=False, default=str)
+        with self._condicao:
+            self.chamadas += 1
+            futuro = self._em_voo.get(chave)
+            if futuro is not None:
+                self.coalescidas += 1
+                return futuro
+
+            futuro = Future()
+            self._em_voo[chave] = futuro
+            self._pendentes.append((chave, entrada, futuro))
+            if self._despachante is None:
+                self._despachante = threading.Thread(target=self._despachar, name='coalescedor-llm', daemon=True)
+                self._despachante.start()
+            self._condicao.notify()
+        return futuro
+
+    def metricas(self) -> Dict[str, Any]:
+        """Chamadas recebidas, chamadas que reaproveitaram outra em voo e lotes enviados"""
+        return {
+            "chamadas": self.chamadas,
+            "coalescidas": self.coalescidas,
+            "lotes": self.lotes,
+        }
+
+    def _despachar(self):
+        """Laço do despachante: espera a janela do lote e envia as entradas acumuladas"""
+        while True:
+            with self._condicao:
+                while not self._pendentes:
+                    self._condicao.wait()
+                limite = time.monotonic() + self.espera
+                while len(self._pendentes) < self.max_lote:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self._condicao.wait(restante)
+                lote = self._pendentes[:self.max_lote]
+                del self._pendentes[:self.max_lote]
+                self.lotes += 1
+            self._executor.submit(self._executar_lote, lote)
+
+    def _executar_lote(self, lote):
+        """Executa o lote com chain.batch e resolve os futuros de cada entrada"""
+        with self._condicao:
+            for chave, _, _ in lote:
+                self._em_voo.pop(chave, None)
+        # Entradas cujo futuro já foi cancelado não vão ao LLM; as demais não podem mais ser canceladas
+        lote = [item for item in lote if item[2].set_running_or_notify_cancel()]
+        if not lote:
+            return
+
+        try:
+            respostas = self.runnable.batch([entrada for _, entrada, _ in lote], return_exceptions=True)
+        except Exception as e:
+            respostas = [e] * len(lote)
+
+        for (_, _, futuro), resposta in zip(lote, respostas):
+            if isinstance(resposta, Exception):
+                futuro.set_exception(resposta)
+            else:
+                futuro.set_result(resposta)
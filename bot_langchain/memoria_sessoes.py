@@ -0,0 +1,105 @@
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, List, Any, Tuple
+
+
+def _tamanho_turno(turno: Tuple[str, str]) -> int:
+    """Bytes ocupados pelos textos de um turno"""
+    return len(turno[0].encode('utf-8')) + len(turno[1].encode('utf-8'))
+
+
+def estimar_tokens(texto: str) -> int:
+    """Estimativa barata de tokens (cerca de 4 caracteres por token)"""
+    return len(texto) // 4 + 1
+
+
+class MemoriaSessoes:
+    """Últimos turnos de cada sessão em buffers circulares, com descarte LRU e teto de memória"""
+
+    def __init__(self, max_turnos: int = 6, max_sessoes: int = 2000, max_bytes: int = 4 * 1024 * 1024,
+                 carregador=None):
+        self.max_turnos = max_turnos
+        self.max_sessoes = max_sessoes
+        self.max_bytes = max_bytes
+        # Função (sessao_id, limite) -> [(mensagem, resposta), ...] usada quando a sessão não está em memória
+        self.carregador = carregador
+
+        self._sessoes = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.carregamentos = 0
+
+    def historico(self, sessao_id: str) -> List[Tuple[str, str]]:
+        """Turnos da sessão, do mais antigo ao mais recente; reconstrói pelo carregador na falta"""
+        with self._lock:
+            turnos = self._sessoes.get(sessao_id)
+            if turnos is not None:
+                self._sessoes.move_to_end(sessao_id)
+                self.acertos += 1
+                return list(turnos)
+
+        carregados = self.carregador(sessao_id, self.max_turnos) if self.carregador else []
+        with self._lock:
+            self.carregamentos += 1
+            # Outra thread pode ter registrado um turno enquanto o histórico era carregado
+            if sessao_id not in self._sessoes:
+                self._sessoes[sessao_id] = deque(maxlen=self.max_turnos)
+                for turno in carregados[-self.max_turnos:]:
+                    self._acrescentar(sessao_id, turno)
+                self._descartar_excesso()
+            return list(self._sessoes.get(sessao_id, ()))
+
+    def janela(self, sessao_id: str, max_tokens: int) -> List[Tuple[str, str]]:
+        """Turnos mais recentes que cabem no orçamento de tokens, em ordem cronológica"""
+        janela = []
+        for turno in reversed(self.historico(sessao_id)):
+            max_tokens -= estimar_tokens(turno[0]) + estimar_tokens(turno[1])
+            if max_tokens < 0:
+                break
+            janela.append(turno)
+        janela.reverse()
+        return janela
+
+    def registrar(self, sessao_id: str, mensagem: str, resposta: str):
+        """Acrescenta um turno à sessão, descartando o mais antigo quando o buffer está cheio"""
+        with self._lock:
+            presente = sessao_id in self._sessoes
+        if not presente:
+            # Sessão fora da memória (reinício ou descarte): os turnos anteriores vêm antes do novo
+            self.historico(sessao_id)
+        with self._lock:
+            if sessao_id not in self._sessoes:
+                self._sessoes[sessao_id] = deque(maxlen=self.max_turnos)
+            self._sessoes.move_to_end(sessao_id)
+            self._acrescentar(sessao_id, (mensagem, resposta))
+            self._descartar_excesso()
+
+    def esquecer(self, sessao_id: str):
+        """Remove a sessão da memória"""
+        with self._lock:
+            turnos = self._sessoes.pop(sessao_id, ())
+            self._bytes -= sum(_tamanho_turno(turno) for turno in turnos)
+
+    def metricas(self) -> Dict[str, Any]:
+        """Sessões e bytes em memória, acertos e reconstruções a partir do carregador"""
+        return {
+            "sessoes": len(self._sessoes),
+            "bytes": self._bytes,
+            "acertos": self.acertos,
+            "carregamentos": self.carregamentos,
+        }
+
+    def _acrescentar(self, sessao_id: str, turno: Tuple[str, str]):
+        """Insere o turno no buffer atualizando o total de bytes (chamado com o lock)"""
+        turnos = self._sessoes[sessao_id]
+        if len(turnos) == turnos.maxlen:
+            self._bytes -= _tamanho_turno(turnos[0])
+        turnos.append(turno)
+        self._bytes += _tamanho_turno(turno)
+
+    def _descartar_excesso(self):
+        """Descarta as sessões ociosas há mais tempo até respeitar os limites (chamado com o lock)"""
+        while len(self._sessoes) > 1 and (len(self._sessoes) > self.max_sessoes or self._bytes > self.max_bytes):
+            _, turnos = self._sessoes.popitem(last=False)
+            self._bytes -= sum(_tamanho_turno(turno) for turno in turnos)
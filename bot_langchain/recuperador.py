@@ -0,0 +1,65 @@
+import os
+import math
+import re
+from typing import Dict, List, Any
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pratos_paraenses import normalizar_texto, PALAVRAS_IGNORADAS
+
+# Parâmetros clássicos do BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def _tokenizar(texto: str) -> List[str]:
+    """Quebra o texto normalizado em palavras, descartando as irrelevantes"""
+    return [p for p in re.findall(r'\w+', normalizar_texto(texto)) if p not in PALAVRAS_IGNORADAS]
+
+
+class RecuperadorBM25:
+    """Recupera os pratos mais relevantes para uma mensagem usando BM25"""
+
+    def __init__(self, pratos: Dict[str, Dict[str, Any]]):
+        self.keys = []
+        self.frequencias = []
+        self.tamanhos = []
+        documentos_por_termo = {}
+
+        for key, prato in pratos.items():
+            # O nome entra duas vezes para pesar mais que a descrição
+            texto = ' '.join([
+                prato['nome'], prato['nome'], key.replace('_', ' '), prato['categoria'],
+                ' '.join(prato['ingredientes']), prato['descricao'],
+            ])
+            termos = _tokenizar(texto)
+            frequencia = {}
+            for termo in termos:
+                frequencia[termo] = frequencia.get(termo, 0) + 1
+            for termo in frequencia:
+                documentos_por_termo.setdefault(termo, []).append(len(self.keys))
+            self.keys.append(key)
+            self.frequencias.append(frequencia)
+            self.tamanhos.append(len(termos))
+
+        total = len(self.keys)
+        self.tamanho_medio = sum(self.tamanhos) / total if total else 0.0
+        self.documentos_por_termo = documentos_por_termo
+        self.idf = {
+            termo: math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            for termo, docs in documentos_por_termo.items()
+        }
+
+    def recuperar(self, mensagem: str, limite: int) -> List[str]:
+        """Retorna as chaves dos pratos mais relevantes, da maior para a menor pontuação"""
+        pontuacao = {}
+        for termo in set(_tokenizar(mensagem)):
+            idf = self.idf.get(termo)
+            if idf is None:
+                continue
+            for doc in self.documentos_por_termo[termo]:
+                frequencia = self.frequencias[doc][termo]
+                normalizacao = BM25_K1 * (1 - BM25_B + BM25_B * self.tamanhos[doc] / self.tamanho_medio)
+                pontuacao[doc] = pontuacao.get(doc, 0.0) + idf * frequencia * (BM25_K1 + 1) / (frequencia + normalizacao)
+
+        melhores = sorted(pontuacao, key=lambda doc: (-pontuacao[doc], doc))[:limite]
+        return [self.keys[doc] for doc in melhores]
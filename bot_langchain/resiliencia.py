@@ -0,0 +1,209 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as PrazoEsgotado
+from typing import Dict, Any
+
+# Estados do disjuntor
+FECHADO = 'fechado'
+ABERTO = 'aberto'
+MEIO_ABERTO = 'meio_aberto'
+
+# Fim do streaming, devolvido por next() no lugar de StopIteration
+_FIM = object()
+
+
+class LLMIndisponivel(Exception):
+    """Chamada ao LLM recusada ou abandonada pela proteção"""
+
+    def __init__(self, motivo: str):
+        super().__init__(f"LLM indisponível: {motivo}")
+        self.motivo = motivo
+
+
+class Disjuntor:
+    """Circuit breaker: abre após falhas seguidas e libera uma chamada de teste depois de um tempo"""
+
+    def __init__(self, falhas_para_abrir: int = 5, tempo_aberto_s: float = 30):
+        self.falhas_para_abrir = falhas_para_abrir
+        self.tempo_aberto_s = tempo_aberto_s
+        self.falhas_consecutivas = 0
+        self.aberturas = 0
+        self._aberto_em = None
+        self._teste_em_andamento = False
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self) -> str:
+        """Estado atual: fechado, aberto ou meio_aberto"""
+        if self._aberto_em is None:
+            return FECHADO
+        if time.monotonic() - self._aberto_em < self.tempo_aberto_s:
+            return ABERTO
+        return MEIO_ABERTO
+
+    def permitir(self) -> bool:
+        """Indica se a chamada pode seguir; no meio-aberto só uma chamada de teste por vez"""
+        with self._lock:
+            estado = self.estado
+            if estado == FECHADO:
+                return True
+            if estado == MEIO_ABERTO and not self._teste_em_andamento:
+                self._teste_em_andamento = True
+                return True
+            return False
+
+    def registrar_sucesso(self):
+        """Fecha o disjuntor e zera as falhas"""
+        with self._lock:
+            self.falhas_consecutivas = 0
+            self._aberto_em = None
+            self._teste_em_andamento = False
+
+    def registrar_falha(self):
+        """Conta a falha e abre o disjuntor ao atingir o limite (ou se o teste falhou)"""
+        with self._lock:
+            self.falhas_consecutivas += 1
+            if self._teste_em_andamento or self.falhas_consecutivas >= self.falhas_para_abrir:
+                if self._aberto_em is None or self._teste_em_andamento:
+                    self.aberturas += 1
+                self._aberto_em = time.monotonic()
+            self._teste_em_andamento = False
+
+
+class ProtecaoLLM:
+    """Limita chamadas simultâneas, impõe prazo por chamada e abre o disjuntor quando o LLM falha ou demora"""
+
+    def __init__(self, max_simultaneas: int = 8, prazo_s: float = 10, limite_lentidao_s: float = 6,
+                 falhas_para_abrir: int = 5, tempo_aberto_s: float = 30):
+        self.prazo_s = prazo_s
+        self.limite_lentidao_s = limite_lentidao_s
+        self.disjuntor = Disjuntor(falhas_para_abrir, tempo_aberto_s)
+
+        self._vagas = threading.BoundedSemaphore(max_simultaneas)
+        self._executor = ThreadPoolExecutor(max_workers=max_simultaneas, thread_name_prefix='protecao-llm')
+        self._lock = threading.Lock()
+        self.em_andamento = 0
+        self.recusas = {}
+
+    def executar(self, funcao, *args):
+        """Executa a chamada síncrona com prazo; uma chamada abandonada só devolve a vaga quando termina de fato"""
+        self._entrar()
+        inicio = time.monotonic()
+        futuro = self._executor.submit(funcao, *args)
+        try:
+            resultado = futuro.result(timeout=self.prazo_s)
+        except PrazoEsgotado:
+            self._abandonar(futuro)
+            raise self._recusar('prazo') from None
+        except Exception as e:
+            self._sair(inicio, e)
+            raise
+        self._sair(inicio, None)
+        return resultado
+
+    async def aexecutar(self, funcao, *args):
+        """Versão assíncrona de executar: a corrotina é cancelada ao estourar o prazo"""
+        self._entrar()
+        inicio = time.monotonic()
+        erro = None
+        try:
+            return await asyncio.wait_for(funcao(*args), self.prazo_s)
+        except asyncio.TimeoutError:
+            erro = self._recusar('prazo')
+            raise erro from None
+        except Exception as e:
+            erro = e
+            raise
+        finally:
+            self._sair(inicio, erro)
+
+    def transmitir(self, partes):
+        """Itera um streaming ocupando uma vaga; cada parte tem prazo_s para chegar e só falhas contam"""
+        self._entrar()
+        iterador = iter(partes)
+        erro = None
+        abandonada = False
+        try:
+            while True:
+                futuro = self._executor.submit(next, iterador, _FIM)
+                try:
+                    parte = futuro.result(timeout=self.prazo_s)
+                except PrazoEsgotado:
+                    # O next() parado segura a vaga até terminar
+                    abandonada = True
+                    self._abandonar(futuro)
+                    raise self._recusar('prazo') from None
+                if parte is _FIM:
+                    break
+                yield parte
+        except Exception as e:
+            erro = e
+            raise
+        finally:
+            if not abandonada:
+                self._sair(None, erro)
+
+    async def atransmitir(self, partes):
+        """Versão assíncrona de transmitir: a espera pela próxima parte é cancelada ao estourar o prazo"""
+        self._entrar()
+        iterador = partes.__aiter__()
+        erro = None
+        try:
+            while True:
+                try:
+                    parte = await asyncio.wait_for(iterador.__anext__(), self.prazo_s)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    raise self._recusar('prazo') from None
+                yield parte
+        except Exception as e:
+            erro = e
+            raise
+        finally:
+            self._sair(None, erro)
+
+    def metricas(self) -> Dict[str, Any]:
+        """Estado do disjuntor, chamadas em andamento e recusas por motivo"""
+        return {
+            "estado": self.disjuntor.estado,
+            "falhas_consecutivas": self.disjuntor.falhas_consecutivas,
+            "aberturas": self.disjuntor.aberturas,
+            "em_andamento": self.em_andamento,
+            "recusas": dict(self.recusas),
+        }
+
+    def _entrar(self):
+        """Reserva uma vaga e consulta o disjuntor, recusando a chamada se não puder seguir"""
+        if not self._vagas.acquire(blocking=False):
+            raise self._recusar('limite_simultaneas')
+        if not self.disjuntor.permitir():
+            self._vagas.release()
+            raise self._recusar('disjuntor_aberto')
+        with self._lock:
+            self.em_andamento += 1
+
+    def _sair(self, inicio, erro, contar: bool = True):
+        """Devolve a vaga e informa o resultado ao disjuntor (chamadas lentas contam como falha)"""
+        with self._lock:
+            self.em_andamento -= 1
+        self._vagas.release()
+        if not contar:
+            return
+        lenta = inicio is not None and time.monotonic() - inicio > self.limite_lentidao_s
+        if erro is not None or lenta:
+            self.disjuntor.registrar_falha()
+        else:
+            self.disjuntor.registrar_sucesso()
+
+    def _abandonar(self, futuro):
+        """Conta o prazo esgotado como falha; a vaga volta quando a chamada abandonada terminar"""
+        self.disjuntor.registrar_falha()
+        futuro.add_done_callback(lambda _: self._sair(None, None, contar=False))
+
+    def _recusar(self, motivo: str) -> LLMIndisponivel:
+        """Contabiliza a recusa e retorna a exceção correspondente"""
+        with self._lock:
+            self.recusas[motivo] = self.recusas.get(motivo, 0) + 1
+        return LLMIndisponivel(motivo)
@@ -1,5 +1,13 @@
 # Base de conhecimento dos pratos típicos do Pará
 
+import re
+import json
+import hashlib
+import unicodedata
+import heapq
+from bisect import bisect_left, bisect_right
+from types import MappingProxyType
+
 PRATOS_PARAENSES = {
     "açaí": {
         "nome": "Açaí",
@@ -95,32 +103,272 @@ PRATOS_PARAENSES = {
 
 CATEGORIAS = ["prato principal", "sobremesa", "aperitivo", "acompanhamento"]
 
+def normalizar_texto(texto):
+    """Remove acentos, converte para minúsculas e compacta os espaços"""
+    decomposto = unicodedata.normalize("NFKD", texto)
+    sem_acentos = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return " ".join(sem_acentos.lower().split())
+
+def _normalizar_categoria(categoria):
+    """Normaliza o nome da categoria ('prato_principal' e 'Prato Principal' são equivalentes)"""
+    return normalizar_texto(categoria.replace("_", " "))
+
+# Pesos dos campos na busca aproximada de pratos
+PESOS_CAMPOS_BUSCA = {"nome": 1.0, "chave": 1.0, "ingredientes": 0.6, "descricao": 0.4}
+
+# Similaridade mínima (Jaccard de trigramas) para uma palavra contar na busca
+SIMILARIDADE_MINIMA = 0.3
+
+# Palavras curtas e frequentes que não ajudam a diferenciar pratos
+PALAVRAS_IGNORADAS = {"de", "da", "do", "das", "dos", "com", "no", "na", "em", "e", "o", "a", "os", "as", "um", "uma"}
+
+def _trigramas(palavra):
+    """Retorna os trigramas de uma palavra, com as bordas marcadas por espaços"""
+    texto = f"  {palavra} "
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+def _palavras_busca(texto):
+    """Quebra o texto normalizado nas palavras relevantes para a busca"""
+    return [p for p in re.findall(r"\w+", normalizar_texto(texto)) if p not in PALAVRAS_IGNORADAS]
+
+def _trigramas_trecho(texto):
+    """Trigramas contidos no texto, sem bordas: todo trecho do texto tem os seus trigramas nele"""
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+def _indice_trechos(textos):
+    """Monta {trigrama: chaves} a partir de [(key, texto normalizado)]"""
+    indice = {}
+    for key, texto in textos:
+        for trigrama in _trigramas_trecho(texto):
+            indice.setdefault(trigrama, set()).add(key)
+    return {trigrama: frozenset(keys) for trigrama, keys in indice.items()}
+
+def _candidatos_trecho(indice, trecho):
+    """Chaves cujos textos têm todos os trigramas do trecho; None se o trecho tiver menos de 3 caracteres"""
+    trigramas = _trigramas_trecho(trecho)
+    if not trigramas:
+        return None
+    conjuntos = sorted((indice.get(trigrama, frozenset()) for trigrama in trigramas), key=len)
+    return conjuntos[0].intersection(*conjuntos[1:])
+
+class IndiceBusca:
+    """Índice de trigramas para busca aproximada de pratos, tolerante a erros de digitação"""
+
+    def __init__(self, pratos):
+        self._palavras = []
+        self._tamanhos = []
+        self._pratos_por_palavra = []
+        self._por_trigrama = {}
+        self._nomes = {}
+        self._ordem = {}
+
+        ids_palavras = {}
+        for key, prato in pratos.items():
+            self._nomes[key] = normalizar_texto(prato["nome"])
+            self._ordem[key] = len(self._ordem)
+            campos = {
+                "nome": prato["nome"],
+                "chave": key.replace("_", " "),
+                "ingredientes": " ".join(prato["ingredientes"]),
+                "descricao": prato["descricao"],
+            }
+            for campo, texto in campos.items():
+                for palavra in _palavras_busca(texto):
+                    id_palavra = ids_palavras.get(palavra)
+                    if id_palavra is None:
+                        id_palavra = ids_palavras[palavra] = len(self._palavras)
+                        trigramas = _trigramas(palavra)
+                        self._palavras.append(palavra)
+                        self._tamanhos.append(len(trigramas))
+                        self._pratos_por_palavra.append({})
+                        for trigrama in trigramas:
+                            self._por_trigrama.setdefault(trigrama, []).append(id_palavra)
+                    pesos = self._pratos_por_palavra[id_palavra]
+                    pesos[key] = max(pesos.get(key, 0.0), PESOS_CAMPOS_BUSCA[campo])
+
+    def _palavras_parecidas(self, palavra):
+        """Retorna (id, similaridade) das palavras do vocabulário parecidas com a informada"""
+        trigramas = _trigramas(palavra)
+        comuns = {}
+        for trigrama in trigramas:
+            for id_palavra in self._por_trigrama.get(trigrama, ()):
+                comuns[id_palavra] = comuns.get(id_palavra, 0) + 1
+
+        for id_palavra, quantidade in comuns.items():
+            similaridade = quantidade / (len(trigramas) + self._tamanhos[id_palavra] - quantidade)
+            if similaridade >= SIMILARIDADE_MINIMA:
+                yield id_palavra, similaridade
+
+    def buscar(self, texto, limite=None):
+        """Retorna [(key, pontuação)] ordenado da melhor para a pior correspondência"""
+        palavras = _palavras_busca(texto)
+        if not palavras:
+            return []
+
+        pontuacao = {}
+        for palavra in palavras:
+            # Cada palavra da busca contribui com a melhor palavra parecida de cada prato
+            melhores = {}
+            for id_palavra, similaridade in self._palavras_parecidas(palavra):
+                for key, peso in self._pratos_por_palavra[id_palavra].items():
+                    melhores[key] = max(melhores.get(key, 0.0), similaridade * peso)
+            for key, valor in melhores.items():
+                pontuacao[key] = pontuacao.get(key, 0.0) + valor
+
+        texto_normalizado = normalizar_texto(texto)
+        resultados = []
+        for key, valor in pontuacao.items():
+            valor /= len(palavras)
+            if texto_normalizado == self._nomes[key]:
+                valor = 1.0
+            resultados.append((round(valor, 3), key))
+
+        ordenar = lambda item: (-item[0], self._ordem[item[1]])
+        if limite is not None:
+            resultados = heapq.nsmallest(limite, resultados, key=ordenar)
+        else:
+            resultados.sort(key=ordenar)
+        return [(key, valor) for valor, key in resultados]
+
+class MenuCatalog:
+    """Catálogo imutável de pratos com índices montados uma única vez"""
+    # Consultas exatas e buscas parciais usam índices; só trechos com menos de 3 caracteres
+    # em por_nome e por_ingrediente ainda percorrem o cardápio inteiro.
+
+    def __init__(self, pratos, versao=0):
+        pratos = dict(pratos)
+        ordem = {key: posicao for posicao, key in enumerate(pratos)}
+
+        por_categoria = {}
+        por_nome = {}
+        ingredientes = {}
+        textos_nome = {}
+        for key, prato in pratos.items():
+            por_categoria.setdefault(_normalizar_categoria(prato["categoria"]), {})[key] = prato
+
+            nome_normalizado = normalizar_texto(prato["nome"])
+            key_normalizada = normalizar_texto(key)
+            for apelido in (nome_normalizado, key_normalizada, key_normalizada.replace("_", " ")):
+                por_nome.setdefault(apelido, key)
+            textos_nome[key] = (nome_normalizado, key_normalizada)
+
+            ingredientes[key] = tuple(normalizar_texto(ing) for ing in prato["ingredientes"])
+
+        precos = sorted((prato["preco"], ordem[key], key) for key, prato in pratos.items())
+
+        # Assinatura do conteúdo: igual em todos os processos que carregaram o mesmo cardápio
+        conteudo = json.dumps(pratos, sort_keys=True, ensure_ascii=False, default=str)
+
+        self.__dict__.update(
+            versao=versao,
+            assinatura=hashlib.sha1(conteudo.encode("utf-8")).hexdigest(),
+            pratos=MappingProxyType(pratos),
+            _ordem=ordem,
+            _por_categoria={cat: MappingProxyType(bucket) for cat, bucket in por_categoria.items()},
+            _por_nome=por_nome,
+            _textos_nome=textos_nome,
+            _trechos_nome=_indice_trechos(
+                (key, texto) for key, textos in textos_nome.items() for texto in textos
+            ),
+            _ingredientes=ingredientes,
+            _trechos_ingrediente=_indice_trechos(
+                (key, ing) for key, ings in ingredientes.items() for ing in ings
+            ),
+            _precos=tuple(preco for preco, _, _ in precos),
+            _chaves_por_preco=tuple(key for _, _, key in precos),
+            _indice_busca=IndiceBusca(pratos),
+        )
+
+    def __setattr__(self, nome, valor):
+        raise AttributeError("MenuCatalog é imutável")
+
+    def __len__(self):
+        return len(self.pratos)
+
+    def __contains__(self, key):
+        return key in self.pratos
+
+    def _em_ordem(self, keys):
+        """Monta um dicionário com as chaves na ordem original do cardápio"""
+        return {key: self.pratos[key] for key in sorted(keys, key=self._ordem.__getitem__)}
+
+    def por_categoria(self, categoria):
+        """Retorna pratos de uma categoria (visão somente leitura)"""
+        return self._por_categoria.get(_normalizar_categoria(categoria), MappingProxyType({}))
+
+    def categorias(self):
+        """Retorna as categorias presentes no catálogo"""
+        return list(self._por_categoria)
+
+    def por_nome(self, nome):
+        """Busca um prato pelo nome ou chave, ignorando acentos"""
+        nome_normalizado = normalizar_texto(nome)
+        key = self._por_nome.get(nome_normalizado)
+        if key is None:
+            # Busca parcial só quando o nome não bate exatamente: o índice de trigramas
+            # restringe os candidatos e vence o primeiro na ordem do cardápio
+            candidatos = _candidatos_trecho(self._trechos_nome, nome_normalizado)
+            if candidatos is None:
+                candidatos = self._textos_nome
+            for candidato in sorted(candidatos, key=self._ordem.__getitem__):
+                if any(nome_normalizado in texto for texto in self._textos_nome[candidato]):
+                    key = candidato
+                    break
+        return self.pratos[key] if key is not None else None
+
+    def por_ingrediente(self, ingrediente):
+        """Busca pratos que contenham um ingrediente específico"""
+        ingrediente_normalizado = normalizar_texto(ingrediente)
+
+        # O índice de trigramas restringe os candidatos, conferidos depois pelo trecho inteiro
+        candidatos = _candidatos_trecho(self._trechos_ingrediente, ingrediente_normalizado)
+        if candidatos is None:
+            candidatos = self._ingredientes
+
+        return self._em_ordem(
+            key for key in candidatos
+            if any(ingrediente_normalizado in ing for ing in self._ingredientes[key])
+        )
+
+    def por_faixa_preco(self, preco_min=None, preco_max=None):
+        """Retorna pratos com preço dentro da faixa (limites inclusivos)"""
+        inicio = 0 if preco_min is None else bisect_left(self._precos, preco_min)
+        fim = len(self._precos) if preco_max is None else bisect_right(self._precos, preco_max)
+        return self._em_ordem(self._chaves_por_preco[inicio:fim])
+
+    def buscar(self, texto, limite=None):
+        """Busca aproximada por nome, chave, ingredientes e descrição; retorna [(key, pontuação)]"""
+        return self._indice_busca.buscar(texto, limite)
+
+CATALOGO = MenuCatalog(PRATOS_PARAENSES)
+
+def _catalogo_estatico():
+    """Fornece o catálogo montado a partir de PRATOS_PARAENSES"""
+    return CATALOGO
+
+_provedor_catalogo = _catalogo_estatico
+
+def get_catalogo():
+    """Retorna o catálogo ativo (estático ou carregado do banco)"""
+    return _provedor_catalogo()
+
+def definir_provedor_catalogo(provedor):
+    """Define a função que fornece o catálogo ativo para os bots"""
+    global _provedor_catalogo
+    _provedor_catalogo = provedor or _catalogo_estatico
+
 def get_pratos_por_categoria(categoria):
     """Retorna pratos de uma categoria específica"""
-    return {k: v for k, v in PRATOS_PARAENSES.items() if v["categoria"] == categoria}
+    return get_catalogo().por_categoria(categoria)
 
 def get_prato_por_nome(nome):
     """Busca um prato pelo nome"""
-    nome_lower = nome.lower()
-    for key, prato in PRATOS_PARAENSES.items():
-        if nome_lower in prato["nome"].lower() or nome_lower in key:
-            return prato
-    return None
+    return get_catalogo().por_nome(nome)
 
 def get_pratos_por_ingrediente(ingrediente):
     """Busca pratos que contenham um ingrediente específico"""
-    pratos_encontrados = {}
-    ingrediente_lower = ingrediente.lower()
-    
-    for key, prato in PRATOS_PARAENSES.items():
-        for ing in prato["ingredientes"]:
-            if ingrediente_lower in ing.lower():
-                pratos_encontrados[key] = prato
-                break
-    
-    return pratos_encontrados
+    return get_catalogo().por_ingrediente(ingrediente)
 
 def get_pratos_por_preco(preco_max):
     """Retorna pratos até um preço máximo"""
-    return {k: v for k, v in PRATOS_PARAENSES.items() if v["preco"] <= preco_max}
-
+    return get_catalogo().por_faixa_preco(preco_max=preco_max)